@@ -1,18 +1,24 @@
 import pandas as pd
+from util.profile_data import ProfileCursor, load_profile, read_synpro
 
 class SynproElectricConsumption():
-    def __init__(self, name):
+    def __init__(self, name, start=None, end=None, margin=24*3600):
+        '''Electric consumption of a synPRO profile (only the simulated time range is loaded)
+
+        Parameters
+        ----------
+        name : str, name of the model
+        start : time (str or pd.Timestamp), first simulated time, only the data from start - margin is parsed and cached (None: from the beginning of the profile)
+        end : time (str or pd.Timestamp), last simulated time, only the data until end + margin is parsed and cached (None: to the end of the profile)
+        margin : int, s, data loaded before start and after end (e.g. for forecasts)'''
         self.name = name
         self.delta_t = 60  # s
 
-
-        self.df = pd.read_csv(r'data\synPro\synPRO_el_sum_H_3_1_App_9_Oc_18_MFHkl_MFH_5_Por_1_el_26026.dat', header=10, sep=';', index_col=2).drop(['YYYYMMDD', 'hhmmss'], axis=1)
-        self.df.index = pd.to_datetime(self.df.index, unit='s').tz_localize('utc').tz_convert('Europe/Berlin')
-        
-        self.df = (self.df.loc[:, ['P_el']])
+        self.df = load_profile(r'data\synPro\synPRO_el_sum_H_3_1_App_9_Oc_18_MFHkl_MFH_5_Por_1_el_26026.dat', read_synpro, header=10, columns=['P_el'], start=start, end=end, margin=margin).frame(['P_el'], start, end, margin)
 
         self.inputs = []
         self.outputs = list(self.df.columns)
+        self.cursor = ProfileCursor(self.df)
 
     def step(self, time):
-        return self.df.loc[time].to_dict()
\ No newline at end of file
+        return self.cursor.step(time)
\ No newline at end of file
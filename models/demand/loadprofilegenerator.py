@@ -1,32 +1,37 @@
 import pandas as pd
 from pathlib import Path
+from util.profile_data import ProfileCursor, load_profile, read_lpg
 
 class Household():
-    def __init__(self, name, lpg_dir):
+    def __init__(self, name, lpg_dir, start=None, end=None, margin=24*3600):
         '''
         Specifies a household/user from a LoadProfileGenerator results directory
-        '''
+        (only the simulated time range is loaded)
+
+        Parameters
+        ----------
+        name : str, name of the model
+        lpg_dir : str or Path, results directory of the LoadProfileGenerator
+        start : time (str or pd.Timestamp), first simulated time, only the data from start - margin is parsed and cached (None: from the beginning of the profile)
+        end : time (str or pd.Timestamp), last simulated time, only the data until end + margin is parsed and cached (None: to the end of the profile)
+        margin : int, s, data loaded before start and after end (e.g. for forecasts)'''
         self.name = name
         self.dir = Path(lpg_dir)
         self.delta_t = 60*15  # s
         
-        P_el = pd.read_csv(self.dir.joinpath(Path('SumProfiles_900s.Electricity.csv')), sep=';', header=0, index_col=1).drop(['Electricity.Timestep'], axis=1)
-        P_el.index = pd.to_datetime(P_el.index, format="%d.%m.%Y %H:%M").tz_localize(tz='Etc/GMT-1').tz_convert('Europe/Berlin')
-        P_el = P_el.rename({'Sum [kWh]': 'P_el'}, axis=1)/0.25*1000
+        # the profiles are shared with the other households of the same directory and time window (see load_profile)
+        P_el = load_profile(self.dir.joinpath(Path('SumProfiles_900s.Electricity.csv')), read_lpg, name='P_el', scale=1000/0.25, start=start, end=end, margin=margin).frame(['P_el'], start, end, margin)  # kWh/15min ~> W
 
-        dot_m_ww = pd.read_csv(self.dir.joinpath(Path('SumProfiles_900s.Warm Water.csv')), sep=';', header=0, index_col=1).drop(['Warm Water.Timestep'], axis=1)
-        dot_m_ww.index = pd.to_datetime(dot_m_ww.index, format="%d.%m.%Y %H:%M").tz_localize(tz='Etc/GMT-1').tz_convert('Europe/Berlin')
-        dot_m_ww = dot_m_ww.rename({'Sum [L]': 'dot_m_ww'}, axis=1)/900  # l/15min ~> kg/s
+        dot_m_ww = load_profile(self.dir.joinpath(Path('SumProfiles_900s.Warm Water.csv')), read_lpg, name='dot_m_ww', scale=1/900, start=start, end=end, margin=margin).frame(['dot_m_ww'], start, end, margin)  # l/15min ~> kg/s
 
-        dot_Q_gain_int = pd.read_csv(self.dir.joinpath(Path('SumProfiles_900s.Inner Device Heat Gains.csv')), sep=';', header=0, index_col=1).drop(['Inner Device Heat Gains.Timestep'], axis=1)
-        dot_Q_gain_int.index = pd.to_datetime(dot_Q_gain_int.index, format="%d.%m.%Y %H:%M").tz_localize(tz='Etc/GMT-1').tz_convert('Europe/Berlin')
-        dot_Q_gain_int = dot_Q_gain_int.rename({'Sum [kWh]': 'dot_Q_gain_int'}, axis=1)/0.25*1000  # kWh/15min ~> W
+        dot_Q_gain_int = load_profile(self.dir.joinpath(Path('SumProfiles_900s.Inner Device Heat Gains.csv')), read_lpg, name='dot_Q_gain_int', scale=1000/0.25, start=start, end=end, margin=margin).frame(['dot_Q_gain_int'], start, end, margin)  # kWh/15min ~> W
 
         
         self.df = pd.concat([P_el, dot_m_ww, dot_Q_gain_int], axis=1)
 
         self.inputs = []
         self.outputs = list(self.df.columns)
+        self.cursor = ProfileCursor(self.df)
 
     def step(self, time):
-        return self.df.loc[time].to_dict()
\ No newline at end of file
+        return self.cursor.step(time)
\ No newline at end of file
@@ -1,11 +1,16 @@
+import numpy as np
 import pandas as pd
 
 class GridOperator():
     def __init__(self, name, delta_t=60*60*24):
-        '''Grid operator. 
-        The model mimics the daily retrieval of the data from the smart meters 
-        and provides the data to the registerd parties/(i.e. energy communities) 
+        '''Grid operator.
+        The model mimics the daily retrieval of the data from the smart meters
+        and provides the data to the registerd parties/(i.e. energy communities)
         behaviour is similar to the sustrian EDA platform.
+        The data of all meters is collected into one (meters x quarter hours) array (MeterData, kept as meter_data),
+        the meters keep the order of their registration (a SmartMeterFleet adds one row per connection).
+        The callbacks get the MeterData (read-only, the pandas.DataFrame is built lazily by MeterData.frame),
+        the output df_P_day is the DataFrame (quarter hours x meters).
         '''
         self.name = name
         self.delta_t = delta_t
@@ -13,6 +18,7 @@ class GridOperator():
         self.outputs = ['df_P_day']
         self._smart_meter_models = []
         self.callbacks = []
+        self.meter_data = None # MeterData of the last step
 
     def register_smartmeter(self, smart_meter_model):
         self._smart_meter_models += [smart_meter_model]
@@ -21,15 +27,100 @@ class GridOperator():
         # register a callback, which can recieve updated ec data
         self.callbacks.append(callback)
 
+    @property
+    def meter_names(self) -> list:
+        '''names of the rows of the meter data'''
+        return [name for sm in self._smart_meter_models for name in getattr(sm, 'meter_names', [sm.name])]
+
+    def _rows(self, sm) -> int:
+        return len(getattr(sm, 'meter_names', [sm.name]))
+
+    def _retrieve_series(self, sm):
+        '''(times in ns, values, time zone) of a smart meter that only provides retrieve_data'''
+        ser = sm.retrieve_data()
+        index = pd.DatetimeIndex(ser.index)
+        return index.as_unit('ns').asi8, np.asarray(ser.values, dtype=float), index.tz
+
     def step(self, time):
-        # recieve data from smart meters
-        pd.Series([]).rename()
-        df_P_day = pd.concat(
-            objs=[sm.retrieve_data() for sm in self._smart_meter_models], 
-            axis=1
-            )
+        # recieve data from smart meters: the (meters x quarter hours) array of the day is allocated once
+        # from the pending quarter hours and the meters write their data directly into their rows
+        series = {i: self._retrieve_series(sm) for i, sm in enumerate(self._smart_meter_models)
+                  if not hasattr(sm, 'retrieve_intervals')}
+        n_times = max([len(t) for t, _, _ in series.values()] +
+                      [sm.pending for sm in self._smart_meter_models if hasattr(sm, 'retrieve_intervals')], default=0)
+        values = np.full((sum(self._rows(sm) for sm in self._smart_meter_models), n_times), np.nan)
+
+        retrieved = [] # (rows, times) per meter
+        tz, row = None, 0
+        for i, sm in enumerate(self._smart_meter_models):
+            rows = slice(row, row + self._rows(sm))
+            if i in series:
+                t, v, sm_tz = series[i]
+                values[rows, :len(t)] = v
+            else:
+                t, _ = sm.retrieve_intervals(out=values[rows])
+                sm_tz = sm.tz
+            tz = tz if tz is not None else sm_tz
+            retrieved.append((rows, t))
+            row = rows.stop
+
+        times = next((t for _, t in retrieved if len(t) == n_times), np.zeros(0, dtype=np.int64))
+        if any(len(t) != n_times or np.any(t != times) for _, t in retrieved):
+            # align the meters, missing quarter hours are nan
+            times = np.unique(np.concatenate([t for _, t in retrieved]))
+            aligned = np.full((len(values), len(times)), np.nan)
+            for rows, t in retrieved:
+                aligned[rows, np.searchsorted(times, t)] = values[rows, :len(t)]
+            values = aligned
+
+        self.meter_data = MeterData(times, values, self.meter_names, tz)
         # call callbacks (controller(s))
         for cb in self.callbacks:
-            cb(df_P_day)
+            cb(self.meter_data)
+
+        return {'df_P_day': self.meter_data.frame}
+
+
+class MeterData():
+    def __init__(self, times, values, meter_names:list, tz=None):
+        '''Quarter hourly mean power of the meters retrieved by the GridOperator in one step as read-only arrays.
+
+        Parameters
+        ----------
+        times : np.ndarray, int64, start of the quarter hours in ns
+        values : np.ndarray, (meters x quarter hours) mean power in W (nan: no data of the meter)
+        meter_names : list of str, names of the meters (rows of values)
+        tz : time zone of the times (None: naive)'''
+        self.times       = times
+        self.values      = values
+        self.meter_names = meter_names
+        self.tz          = tz
+        self.times.flags.writeable  = False
+        self.values.flags.writeable = False
+        self._frame      = None
+
+    @property
+    def empty(self) -> bool:
+        return not self.values.size
+
+    @property
+    def index(self) -> pd.DatetimeIndex:
+        index = pd.to_datetime(self.times, unit='ns', utc=self.tz is not None)
+        return index.tz_convert(self.tz) if self.tz is not None else index
+
+    def total(self) -> np.ndarray:
+        '''sum of all meters per quarter hour (meters without data are skipped)'''
+        return np.nansum(self.values, axis=0)
+
+    def to_frame(self) -> pd.DataFrame:
+        '''the data as pandas.DataFrame (quarter hours x meters)'''
+        if self.empty:
+            return pd.DataFrame([])
+        return pd.DataFrame(self.values.T, index=self.index, columns=self.meter_names)
 
-        return {'df_P_day': df_P_day}
\ No newline at end of file
+    @property
+    def frame(self) -> pd.DataFrame:
+        '''the data as pandas.DataFrame, built on the first access and shared by all users (do not modify it)'''
+        if self._frame is None:
+            self._frame = self.to_frame()
+        return self._frame
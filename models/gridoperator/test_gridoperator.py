@@ -1,6 +1,8 @@
 import numpy as np
 import pandas as pd
+import pytest
 from models.gridoperator.gridoperator import GridOperator
+from models.smart_meter.smart_meter import SmartMeter, SmartMeterFleet
 
 # class SmartMeterMock():
 #     def __init__(self, name, mul, start_dt="2020-01-01 00:00"):
@@ -101,7 +103,7 @@ def test_gridoperator_step_w_ec():
 
     outputs = gridoperator.step(1)
 
-    assert outputs['df_P_day'].equals(ec.df_P_day)
+    assert outputs['df_P_day'] is ec.df_P_day.frame
 
 def test_gridoperator_multi_step():
     class SmartMeterMock():
@@ -135,7 +137,7 @@ def test_gridoperator_multi_step():
     outputs = gridoperator.step(2)
     outputs = gridoperator.step(2)
 
-    assert outputs['df_P_day'].equals(ec.df_P_day)
+    assert outputs['df_P_day'] is ec.df_P_day.frame
 
 def test_gridoperator_faulty_data():
     class SmartMeterMock():
@@ -156,4 +158,40 @@ def test_gridoperator_faulty_data():
 
     outputs = gridoperator.step(1)
     assert np.isnan(outputs['df_P_day'].iloc[0, 0]) 
-    assert np.isnan(outputs['df_P_day'].loc["2020-01-01 11:45", 'sm1']) 
\ No newline at end of file
+    assert np.isnan(outputs['df_P_day'].loc["2020-01-01 11:45", 'sm1']) 
+
+def test_gridoperator_meter_data_array():
+    gridoperator = GridOperator('name')
+    smartmeter = SmartMeter('sm1')
+    fleet = SmartMeterFleet('fleet', ['sm2', 'sm3'])
+    gridoperator.register_smartmeter(smartmeter)
+    gridoperator.register_smartmeter(fleet)
+    received = []
+    gridoperator.register_callback_new_data(received.append)
+
+    times = pd.date_range('2022-01-01 00:00', periods=30, freq='1min', tz='Europe/Berlin')
+    for i, t in enumerate(times):
+        smartmeter.step(t, P_=[float(i)])
+        fleet.step(t, P_=[np.array([1., 2.])*i])
+    assert fleet.pending == 2 and smartmeter.pending == 2 # the running quarter hour is complete
+    df = gridoperator.step(times[-1])['df_P_day']
+    data = gridoperator.meter_data
+
+    assert isinstance(df, pd.DataFrame)
+    assert data is received[0]
+    assert df is data.frame # built once, shared
+    assert gridoperator.meter_names == ['sm1', 'sm2', 'sm3']
+    assert data.values.shape == (3, 2) # meters x quarter hours, in the order of the registration
+    assert np.allclose(data.values[:, 0], np.array([1., 1., 2.])*np.arange(15).mean())
+    assert np.allclose(data.total(), 4*np.array([np.arange(15).mean(), np.arange(15, 30).mean()]))
+    with pytest.raises(ValueError):
+        data.values[0, 0] = 0. # read-only
+
+    assert df.loc[pd.Timestamp('2022-01-01 00:15', tz='Europe/Berlin'), 'sm2'] == np.arange(15, 30).mean()
+    assert df.columns.tolist() == ['sm1', 'sm2', 'sm3']
+    assert df.equals(data.to_frame())
+
+def test_gridoperator_no_data():
+    gridoperator = GridOperator('name')
+    gridoperator.register_smartmeter(SmartMeter('sm1'))
+    assert gridoperator.step(1)['df_P_day'].empty
@@ -0,0 +1,342 @@
+import numpy as np
+import weakref
+import multiprocessing as mp
+import highspy
+from .mp_controller import MPController
+from .matrix_backend import MatrixModel, MatrixBlock
+from .opt_models.MILP_model_proto import MILPModelProto
+from time import perf_counter
+
+
+class ADMMSubproblem():
+    def __init__(self, component:MILPModelProto, n_periods, delta_t, period_durations, rho, breakpoints, options={}):
+        '''The MILP of a single component plus the proximal term of the exchange ADMM.
+        The quadratic proximal term rho/2 (x - v)^2 of every shared variable x is approximated by its tangents
+        at the breakpoints (deviations x - v), so the subproblem stays a MILP that HiGHS can solve.
+
+        Parameters
+        ----------
+        component : MILPModelProto, component with a matrix_block_rule
+        n_periods : int, length of optimization horizon
+        delta_t : int, timedelta of the periods in s
+        period_durations : array, duration of every period in s
+        rho : float, ADMM penalty parameter
+        breakpoints : list of floats, deviations at which the proximal term is linearized
+        options : dict, HiGHS options (e.g. mip_rel_gap, threads)'''
+        self.name  = component.name
+        self.model = MatrixModel(n_periods, delta_t, period_durations)
+        self.block = MatrixBlock(self.model, component.name)
+        component.matrix_block_rule(self.block)
+
+        self.v = {} # centers of the proximal terms
+        prox = [] # columns of the proximal terms
+        for shared in component.shares:
+            x = self.block.vars[shared]
+            t = self.block.var('prox_'+shared, 'periods', lb=0.)
+            v = self.block.param('prox_v_'+shared, 'periods')
+            for d in breakpoints:
+                # t >= rho*(d*(x - v) - d^2/2)
+                self.block.constraint([(t, 1.), (x, -rho*d)], lb=-rho*d**2/2, ub=np.inf, rhs=[(v, -rho*d)])
+            self.block.objective(t, 1.)
+            self.v[shared] = v
+            prox += [t]
+        self._prox = np.concatenate(prox) if prox else np.zeros(0, dtype=int)
+        self._fixed = set() # variables whose first period is fixed
+
+        self.highs = highspy.Highs()
+        self.highs.setOptionValue('output_flag', False)
+        for option, value in options.items():
+            self.highs.setOptionValue(option, value)
+        self.model.load(self.highs)
+
+    def solve(self, params:dict, v:dict, fixed:dict) -> tuple:
+        '''solves the subproblem and returns the values of all variables of the component and its objective value (without the proximal terms)
+
+        Parameters
+        ----------
+        params : dict, values of the parameters of the component (states and forecasts)
+        v : dict, centers of the proximal terms of the shared variables
+        fixed : dict, values of the first period of variables (e.g. control outputs), the others are released'''
+        for name, value in params.items():
+            self.model.param_values[self.block.params[name]] = value
+        for shared, values in v.items():
+            self.model.param_values[self.v[shared]] = values
+        self.model.update(self.highs)
+        for name in self._fixed - fixed.keys():
+            col = self.block.vars[name][0]
+            self.highs.changeColBounds(col, self.model.col_lb[col], self.model.col_ub[col])
+        for name, value in fixed.items():
+            self.highs.changeColBounds(self.block.vars[name][0], value, value)
+        self._fixed = set(fixed)
+        self.model.run(self.highs)
+        x = self.model.col_values
+        objective = float(self.model.cost @ x - x[self._prox].sum())
+        return {name: x[cols] for name, cols in self.block.vars.items()}, objective
+
+
+def _worker(conn):
+    '''worker process, holds the subproblems assigned to it and solves them on request,
+    every request is answered (exceptions are sent back to the controller, which raises them)'''
+    subproblems = {}
+    while True:
+        msg, payload = conn.recv()
+        match msg:
+            case 'add':
+                try:
+                    subproblem = ADMMSubproblem(*payload)
+                    subproblems[subproblem.name] = subproblem
+                    conn.send(None)
+                except Exception as e:
+                    conn.send(e)
+            case 'solve':
+                try:
+                    conn.send({name: subproblems[name].solve(*args) for name, args in payload.items()})
+                except Exception as e:
+                    conn.send(e)
+            case 'close':
+                break
+
+
+def _stop_workers(workers:list) -> None:
+    '''stop the worker processes (called by DistributedMPController.close or when the controller is garbage collected)'''
+    for process, conn, _ in workers:
+        if process.is_alive():
+            conn.send(('close', None))
+            process.join()
+    workers.clear()
+
+
+class _DictBinding():
+    def __init__(self, store:dict, key):
+        '''binding of a value in a dict, counterpart of IndexedBinding'''
+        self.store = store
+        self.key   = key
+
+    def set_value(self, value) -> None:
+        self.store[self.key] = value
+
+    def set_values(self, values) -> None:
+        self.store[self.key] = np.asarray(values, dtype=float)
+
+    def get_values(self) -> np.ndarray:
+        return self.store[self.key]
+
+
+class DistributedMPController(MPController):
+    def __init__(self, name, n_periods, delta_t, sep='.', return_forcast=False, return_future_control_output=False, return_future_state=False, warm_start=True, replan_on_event=False, state_tolerance=0., forecast_tolerance=0., max_replan_interval=None, time_limit=None, gap_limit=None, threads=None, safe_outputs=0., return_telemetry=False, telemetry_capacity=100_000, rho=1e-2, max_iter=200, tol=1., prox_scale=10_000., n_breakpoints=12, n_workers=0, period_durations=None):
+        '''A model predictive controller with the same interface as MPController, that decomposes the problem.
+        Every component is solved as its own subproblem (see ADMMSubproblem), the sum constraints
+        of the shared variables are coordinated with the exchange ADMM (Boyd et al. 2011, ch. 7.3.2).
+        The subproblems are distributed round robin to n_workers worker processes and solved in parallel.
+        The components need a matrix_block_rule (see MatrixBlock).
+
+        Note: the worker processes are started with the 'spawn' method, scenarios that use more than 0 workers
+        need to be guarded by if __name__ == '__main__'. Call close() or use the controller as context manager (with ...) to stop the workers,
+        they are also stopped when the controller is garbage collected.
+
+        Parameters
+        ----------
+        see MPController
+        time_limit : float, time budget of the ADMM in s, if it is hit the last iterate is used (counted as incumbent)
+        gap_limit : float, relative MIP gap of the subproblems
+        threads : int, number of threads of HiGHS per subproblem
+        warm_start : bool, initialize the ADMM with the shifted solution and duals of the previous step
+        rho : float, ADMM penalty parameter in 1/(unit of the shared variables)
+        max_iter : int, maximum number of ADMM iterations per solve
+        tol : float, convergence tolerance of the primal residual (violation of the sum constraints) and of the change of the mean of the shared variables, in the unit of the shared variables (e.g. W)
+        prox_scale : float, largest deviation at which the proximal term is linearized (breakpoints are prox_scale*2^-j)
+        n_breakpoints : int, number of breakpoints per sign
+        n_workers : int, number of worker processes, 0 solves the subproblems in the controller process'''
+        super().__init__(name, n_periods, delta_t, sep=sep,
+                         return_forcast=return_forcast,
+                         return_future_control_output=return_future_control_output,
+                         return_future_state=return_future_state,
+                         warm_start=warm_start,
+                         replan_on_event=replan_on_event,
+                         state_tolerance=state_tolerance,
+                         forecast_tolerance=forecast_tolerance,
+                         max_replan_interval=max_replan_interval,
+                         safe_outputs=safe_outputs,
+                         return_telemetry=return_telemetry,
+                         telemetry_capacity=telemetry_capacity,
+                         period_durations=period_durations)
+        self.time_limit  = time_limit
+        self.gap_limit   = gap_limit
+        self.threads     = threads
+        self.rho         = rho
+        self.max_iter    = max_iter
+        self.tol         = tol
+        self.breakpoints = [0.] + [sign*prox_scale*2.**-j for j in range(n_breakpoints) for sign in (1, -1)]
+        self.n_workers   = n_workers
+
+        self._params      = {} # component name: {parameter name: value(s)}
+        self._solution    = {} # component name: {variable name: values}
+        self._subproblems = {} # component name: ADMMSubproblem (n_workers = 0)
+        self._workers     = None # [(process, connection, [component names])]
+        self._finalizer   = None # stops the workers, see _start_workers
+        self._fixed       = {} # component name: {variable name: value of the first period}, see _fix_first_outputs
+
+        self.n_iterations = 0
+        self.residuals    = [] # primal residual of every iteration of the last solve
+
+    def _setup_backend(self, pyo_solver_name):
+        '''the problem is only assembled per component, see ADMMSubproblem'''
+        self.model  = None
+        self.solver = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _add_block(self, component:MILPModelProto):
+        if not hasattr(component, 'matrix_block_rule'):
+            raise TypeError(f'Model "{component.name}" has no matrix_block_rule and can not be used with the DistributedMPController')
+        if self._workers is not None:
+            raise RuntimeError('Models can not be added after the first solve')
+
+        self._params[component.name]   = {}
+        self._solution[component.name] = {}
+        for state_name in component.state_inputs:
+            self._state_bindings += [(component.name+self.sep+state_name, _DictBinding(self._params[component.name], state_name))]
+        for out_name in component.controll_outputs:
+            self._output_bindings[component.name+self.sep+out_name] = _DictBinding(self._solution[component.name], out_name)
+        for state in getattr(component, 'states', []):
+            self._trajectory_bindings[component.name+self.sep+state] = _DictBinding(self._solution[component.name], state)
+        for shared in component.shares:
+            self.shared_vars.add(shared)
+
+    def _bind_forecast(self, for_model:MILPModelProto, for_var:str):
+        return _DictBinding(self._params[for_model.name], for_var)
+
+    def _start_workers(self):
+        options = {}
+        if self.gap_limit is not None:
+            options['mip_rel_gap'] = float(self.gap_limit)
+        if self.threads is not None:
+            options['threads'] = int(self.threads)
+        settings = (self.n_periods, self.delta_t, self.period_durations, self.rho, self.breakpoints, options)
+        if self.n_workers == 0:
+            self._subproblems = {comp.name: ADMMSubproblem(comp, *settings) for comp in self.components}
+            self._workers = []
+            return
+
+        ctx = mp.get_context('spawn')
+        self._workers = []
+        for i in range(min(self.n_workers, len(self.components))):
+            conn, child_conn = ctx.Pipe()
+            process = ctx.Process(target=_worker, args=(child_conn,), daemon=True)
+            process.start()
+            self._workers += [(process, conn, [])]
+        self._finalizer = weakref.finalize(self, _stop_workers, self._workers)
+        for i, comp in enumerate(self.components):
+            _, conn, names = self._workers[i % len(self._workers)]
+            conn.send(('add', (comp, *settings)))
+            names += [comp.name]
+        errors = [conn.recv() for _, conn, names in self._workers for _ in names]
+        errors = [error for error in errors if error is not None]
+        if errors:
+            self.close()
+            raise errors[0]
+
+    def close(self):
+        '''stop the worker processes'''
+        if self._finalizer is not None:
+            self._finalizer()
+        self._workers = None
+
+    def _solve_subproblems(self, requests:dict) -> dict:
+        if self.n_workers == 0:
+            return {name: self._subproblems[name].solve(*args) for name, args in requests.items()}
+
+        for _, conn, names in self._workers:
+            conn.send(('solve', {name: requests[name] for name in names}))
+        results = {}
+        for _, conn, _ in self._workers:
+            result = conn.recv()
+            if isinstance(result, Exception):
+                raise result
+            results.update(result)
+        return results
+
+    def _solve(self):
+        '''exchange ADMM: x_i = argmin f_i(x_i) + rho/2 ||x_i - x_i^k + xbar^k + u^k||^2, u = u + xbar'''
+        start = perf_counter()
+        if self._workers is None:
+            self._start_workers()
+
+        sharing = {s: [comp.name for comp in self.components if s in comp.shares] for s in self.shared_vars}
+        if self.warm_start and self._has_solution:
+            self._shift_solution()
+        else:
+            self._u = {s: np.zeros(self.n_periods) for s in self.shared_vars}
+            self._x = {comp.name: {s: np.zeros(self.n_periods) for s in comp.shares} for comp in self.components}
+        xbar = {s: sum(self._x[name][s] for name in names) / len(names) for s, names in sharing.items()}
+
+        self.residuals = []
+        converged = False
+        for k in range(1, self.max_iter+1):
+            requests = {}
+            for comp in self.components:
+                v = {s: self._x[comp.name][s] - xbar[s] - self._u[s] for s in comp.shares}
+                requests[comp.name] = (self._params[comp.name], v, self._fixed.get(comp.name, {}))
+            results = self._solve_subproblems(requests)
+
+            for comp in self.components:
+                values, _ = results[comp.name]
+                self._solution[comp.name].update(values)
+                self._x[comp.name] = {s: values[s] for s in comp.shares}
+
+            primal_residual, change = 0., 0.
+            for s, names in sharing.items():
+                x_sum = sum(self._x[name][s] for name in names)
+                xbar_new = x_sum / len(names)
+                self._u[s] = self._u[s] + xbar_new
+                primal_residual = max(primal_residual, np.abs(x_sum).max())
+                change = max(change, np.abs(xbar_new - xbar[s]).max())
+                xbar[s] = xbar_new
+            self.residuals += [primal_residual]
+
+            if primal_residual <= self.tol and change <= self.tol:
+                converged = True
+                break
+            if self.time_limit is not None and perf_counter() - start >= self.time_limit:
+                break
+
+        self.n_iterations = k
+        self._has_solution = True
+        objective = sum(objective for _, objective in results.values())
+        return {'iterations': k, 'primal_residual': primal_residual, 'converged': converged, 'objective': objective}
+
+    def _fix_first_outputs(self, values:dict) -> None:
+        '''the outputs are fixed in the subproblems of their components (see ADMMSubproblem.solve)'''
+        self._fixed = {}
+        for comp in self.components:
+            for out_name in comp.controll_outputs:
+                if comp.name+self.sep+out_name in values:
+                    self._fixed.setdefault(comp.name, {})[out_name] = values[comp.name+self.sep+out_name]
+
+    def _solve_verified(self):
+        '''the binaries are not relaxed, the proximal term of the subproblems (see ADMMSubproblem) does not penalize losses'''
+        return self._solve()
+
+    def _solve_outcome(self, results):
+        '''a not converged ADMM returns the last iterate, which is feasible for every component but violates the sum constraints by the primal residual'''
+        return 'optimal' if results['converged'] else 'incumbent'
+
+    def _solve_info(self, results) -> dict:
+        '''the status reflects the convergence of the ADMM, node_count is the number of ADMM iterations,
+        objective is the sum of the objectives of the subproblems (without the proximal terms)'''
+        return {
+            'status': 'converged' if results['converged'] else 'max_iter',
+            'node_count': results['iterations'],
+            'objective': results['objective'],
+            }
+
+    def _shift_solution(self):
+        for s in self._u:
+            self._u[s] = np.append(self._u[s][1:], self._u[s][-1])
+        for name in self._x:
+            for s in self._x[name]:
+                self._x[name][s] = np.append(self._x[name][s][1:], self._x[name][s][-1])
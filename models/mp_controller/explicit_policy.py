@@ -0,0 +1,144 @@
+import os
+import time
+import numpy as np
+import multiprocessing as mp
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+from sklearn.neighbors import KNeighborsRegressor
+
+
+def sample_problems(n_samples, state_ranges:dict, forecast_sampler, seed=None) -> list:
+    '''samples problems of a controller: uniformly distributed state inputs and forecasts of forecast_sampler
+
+    Parameters
+    ----------
+    n_samples : int, number of problems
+    state_ranges : dict, (min, max) of every state input (e.g. {'bes.E_BES_0': (0, 20_000*3600)})
+    forecast_sampler : callable, forecast_sampler(rng) returns a dict of forecasts over the horizon (e.g. {'EC.forecast.P_resid_ec': [...]})
+    seed : int, seed of the random number generator
+
+    Returns
+    -------
+    list of (states, forecasts)'''
+    rng = np.random.default_rng(seed)
+    return [({name: rng.uniform(lo, hi) for name, (lo, hi) in state_ranges.items()}, forecast_sampler(rng)) for _ in range(n_samples)]
+
+
+def _solve_chunk(make_controller, samples, fixed_outputs):
+    ctr = make_controller()
+    return [ctr.solve_for(states, forecasts, fixed) for (states, forecasts), fixed in zip(samples, fixed_outputs)]
+
+
+def solve_offline(make_controller, samples:list, fixed_outputs=None, n_workers=None) -> list:
+    '''solves the problems of the controller for all samples in n_workers processes (see MPController.solve_for)
+
+    Parameters
+    ----------
+    make_controller : callable, returns a new controller with all models and forecasters, needs to be picklable (module level function)
+    samples : list of (states, forecasts), see sample_problems
+    fixed_outputs : list of dict, control outputs of the first period that are fixed for every sample (None: free)
+    n_workers : int, number of processes, 0 solves in this process (None: os.cpu_count()), needs an if __name__ == '__main__' guard
+
+    Returns
+    -------
+    list of the solutions (dict of the control outputs of the first period and the objective, None if infeasible)'''
+    fixed_outputs = fixed_outputs or [None]*len(samples)
+    if n_workers == 0:
+        return _solve_chunk(make_controller, samples, fixed_outputs)
+
+    n_workers = os.cpu_count() if n_workers is None else n_workers
+    with ProcessPoolExecutor(n_workers, mp_context=mp.get_context('spawn')) as executor:
+        chunks = [chunk for chunk in np.array_split(np.arange(len(samples)), 4*n_workers) if len(chunk)]
+        results = executor.map(_solve_chunk,
+                               repeat(make_controller),
+                               [[samples[i] for i in chunk] for chunk in chunks],
+                               [[fixed_outputs[i] for i in chunk] for chunk in chunks])
+        return [solution for chunk in results for solution in chunk]
+
+
+class ExplicitPolicy():
+    def __init__(self, name, make_controller, estimator=None, action_names=None):
+        '''An explicit control policy that maps the state inputs and forecasts of an MPController to its first control outputs
+        with a regression model fitted to offline solves (see sample_problems, solve_offline and fit).
+        As simulation model it has the same inputs and the same (first period) outputs as the controller,
+        the forecasts are created with the forecasters of the controller. Future outputs and telemetry are not returned.
+
+        Parameters
+        ----------
+        name : str, name of the simulation model
+        make_controller : callable, returns a new controller with all models and forecasters, needs to be picklable (module level function)
+        estimator : sklearn regressor (None: standardized k-nearest neighbors, distance weighted)
+        action_names : list of str, outputs that act on the plant and are fixed in evaluate (None: the outputs of the models with state inputs)'''
+        self.name            = name
+        self.make_controller = make_controller
+        self.controller      = make_controller() # provides the inputs, outputs and forecasters, is not solved
+        self.delta_t         = self.controller.delta_t
+
+        self.state_names    = self.controller.state_names()
+        self.forecast_names = self.controller.forecast_names()
+        self.output_names   = self.controller.output_names()
+        if action_names is None:
+            sep = self.controller.sep
+            action_names = [comp.name+sep+out for comp in self.controller.components if comp.state_inputs for out in comp.controll_outputs]
+        self.action_names   = action_names
+
+        self.inputs  = self.controller.inputs
+        self.outputs = self.output_names + (self.forecast_names if self.controller.return_forcast else [])
+
+        self.estimator = estimator if estimator is not None else make_pipeline(StandardScaler(), KNeighborsRegressor(n_neighbors=5, weights='distance'))
+
+    def features(self, states:dict, forecasts:dict) -> np.ndarray:
+        '''feature vector of one problem: state inputs followed by the forecasts over the horizon'''
+        return np.concatenate(
+            [np.array([states[name] for name in self.state_names], dtype=float)] +
+            [np.asarray(forecasts[name], dtype=float)[:self.controller.horizon] for name in self.forecast_names])
+
+    def fit(self, samples:list, solutions:list):
+        '''fit the estimator to the solutions of the samples (infeasible samples are skipped)'''
+        pairs = [(sample, solution) for sample, solution in zip(samples, solutions) if solution is not None]
+        X = np.array([self.features(*sample) for sample, _ in pairs])
+        Y = np.array([[solution[name] for name in self.output_names] for _, solution in pairs])
+        self.estimator.fit(X, Y)
+        return self
+
+    def predict(self, states:dict, forecasts:dict) -> dict:
+        '''control outputs of the first period'''
+        y = np.atleast_1d(self.estimator.predict(self.features(states, forecasts)[np.newaxis, :])[0])
+        return {name: float(value) for name, value in zip(self.output_names, y)}
+
+    def step(self, time, **inputs):
+        forecasts = self.controller.forecast(time, inputs)
+        outputs = self.predict({name: inputs[name] for name in self.state_names}, forecasts)
+        if self.controller.return_forcast:
+            outputs.update({name: np.asarray(values, dtype=float).tolist() for name, values in forecasts.items()})
+        return outputs
+
+    def evaluate(self, samples:list, n_workers=None) -> dict:
+        '''evaluation latency of the policy and its optimality gap against the exact MPC on (held out) samples.
+        The gap is the increase of the objective if the actions (action_names) of the first period are fixed to the policy outputs.
+
+        Returns
+        -------
+        dict with latency (mean, p50, p95, max in s), gap_mean (absolute, mean of the feasible samples),
+        gap_relative (sum of the gaps / sum of the absolute optimal objectives) and infeasible (share of samples the policy outputs are infeasible for)'''
+        actions, latency = [], np.zeros(len(samples))
+        for i, (states, forecasts) in enumerate(samples):
+            start = time.perf_counter()
+            outputs = self.predict(states, forecasts)
+            latency[i] = time.perf_counter() - start
+            actions += [{name: outputs[name] for name in self.action_names}]
+
+        exact  = solve_offline(self.make_controller, samples, n_workers=n_workers)
+        policy = solve_offline(self.make_controller, samples, fixed_outputs=actions, n_workers=n_workers)
+
+        optimal = np.array([e['objective'] for e, p in zip(exact, policy) if e is not None and p is not None])
+        gaps    = np.array([p['objective'] - e['objective'] for e, p in zip(exact, policy) if e is not None and p is not None])
+        n_exact = sum(e is not None for e in exact)
+        return {
+            'latency': {'mean': latency.mean(), 'p50': np.percentile(latency, 50), 'p95': np.percentile(latency, 95), 'max': latency.max()},
+            'gap_mean': gaps.mean() if len(gaps) else np.nan,
+            'gap_relative': gaps.sum() / np.abs(optimal).sum() if np.abs(optimal).sum() else np.nan,
+            'infeasible': 1 - len(gaps) / n_exact if n_exact else np.nan,
+            }
@@ -43,6 +43,37 @@ class Forcasting:
         return decorator
 
 
+class RingBuffer():
+    def __init__(self, size:int, init_val=np.nan):
+        '''Preallocated buffer of the last size values with O(1) appends.
+        Every value is stored twice (at i and i+size), so the last size values are always a contiguous view.
+
+        Parameters
+        ----------
+        size : int, number of values that are kept
+        init_val : float, initial values'''
+        self.size  = size
+        self._data = np.full(2*size, init_val, dtype=float)
+        self._view = self._data.view() # read-only handle for the windows
+        self._view.flags.writeable = False
+        self._next = 0 # position of the oldest value
+
+    def append(self, value) -> None:
+        '''overwrite the oldest value'''
+        i = self._next
+        self._data[i] = self._data[i+self.size] = value
+        self._next = i+1 if i+1 < self.size else 0
+
+    def replace(self, value) -> None:
+        '''overwrite the newest value'''
+        i = self._next-1 if self._next else self.size-1
+        self._data[i] = self._data[i+self.size] = value
+
+    def window(self) -> np.ndarray:
+        '''the last size values, oldest first (read-only view, changes with the next append)'''
+        return self._view[self._next:self._next+self.size]
+
+
 @Forcasting.register('generic_single_var_persistence')
 class GenericPersistenceForcasting():
     def __init__(self, inpt:str, init_val=np.nan, delay=1):
@@ -51,18 +82,22 @@ class GenericPersistenceForcasting():
         self.init_val = init_val
         self.delay = delay
 
-    def get_forcast(self, time) -> list:
-        return self.ser.loc[:self.periods-1].values.tolist()
+    def get_forcast(self, time, copy=True):
+        '''the values delay+periods to delay steps ago, as list (copy=False: read-only numpy view, valid until the next set_data)'''
+        forcast = self.buffer.window()[:self.periods]
+        return forcast.tolist() if copy else forcast
 
     def set_data(self, time, **values) -> None:
-        value = values[self.inpt]
-        self.ser = self.ser.shift(-1)
-        self.ser.loc[self.last_index] = value
-    
+        self.buffer.append(values[self.inpt])
+
     def set_forcast_length(self, n:int) -> None:
         self.periods = n
-        self.ser = pd.Series(data=np.full(self.delay+self.periods, self.init_val), index=range(self.delay+self.periods))
-        self.last_index = self.delay+self.periods-1
+        self.buffer = RingBuffer(self.delay+self.periods, self.init_val)
+
+    @property
+    def ser(self) -> pd.Series:
+        '''the stored values, oldest first (a copy)'''
+        return pd.Series(self.buffer.window().copy())
 
 
 @Forcasting.register('persistence_residual_load')
@@ -72,79 +107,372 @@ class PersistenceResidualLoadForcasting():
         self.init_val = init_val
         self.delay = delay
 
-    def get_forcast(self, time) -> list:
-        return self.ser.loc[:self.periods-1].values.tolist()
+    def get_forcast(self, time, copy=True):
+        '''the residual loads delay+periods to delay steps ago, as list (copy=False: read-only numpy view, valid until the next set_data)'''
+        forcast = self.buffer.window()[:self.periods]
+        return forcast.tolist() if copy else forcast
 
     def set_data(self, time, P_tot, P_flex_) -> None:
         P_flex = sum(P_flex_)
         P_resid = P_tot - P_flex   # signs!!!?????????????????????????
-        self.ser = self.ser.shift(-1)
-        self.ser.loc[self.last_index] = P_resid
-    
+        self.buffer.append(P_resid)
+
+    def replace_data(self, time, P_tot, P_flex_) -> None:
+        '''replace the data of the last set_data (e.g. with the merged inputs of the subscribers of a ForecastService)'''
+        self.buffer.replace(P_tot - sum(P_flex_))
+
     def set_forcast_length(self, n:int) -> None:
         self.periods = n
-        self.ser = pd.Series(data=np.full(self.delay+self.periods, self.init_val), index=range(self.delay+self.periods))
-        self.last_index = self.delay+self.periods-1
+        self.buffer = RingBuffer(self.delay+self.periods, self.init_val)
+
+    @property
+    def ser(self) -> pd.Series:
+        '''the stored residual loads, oldest first (a copy)'''
+        return pd.Series(self.buffer.window().copy())
+
+
+class HistoryStore():
+    def __init__(self, columns:list, resolution:int, retention:int):
+        '''Columnar store of time series on a regular time grid with bounded retention.
+        Every column is a preallocated numpy array that is used as ring over the slots (slot = (time - origin) / resolution),
+        only the values of the last retention slots (up to the newest written slot) are kept, older writes are dropped.
+
+        Parameters
+        ----------
+        columns : list of str, names of the columns
+        resolution : int, time between two slots in s
+        retention : int, number of slots that are kept'''
+        self.columns    = columns
+        self.resolution = resolution # s
+        self.retention  = retention
+        self.values     = {column: np.full(retention, np.nan) for column in columns}
+        self.head       = None # newest slot
+        self._res_ns    = int(resolution*1e9) # ns
+        self._origin    = None # ns, time of slot 0
+        self._tz        = None
+
+    def slots(self, times) -> np.ndarray:
+        '''slots of the times (pd.Timestamp or pd.DatetimeIndex), times between two slots are floored to the earlier slot.
+        The grid is aligned to the local wall clock (e.g. quarter hours), slot 0 is the first time floored to the grid'''
+        if isinstance(times, pd.Timestamp):
+            ns, tz = np.array([times.value]), times.tz # ns
+        else:
+            times = pd.DatetimeIndex(times)
+            ns, tz = times.as_unit('ns').asi8, times.tz
+        if self._origin is None:
+            first = int(ns[0])
+            wall  = first if tz is None else first + int(pd.Timestamp(first, tz='utc').tz_convert(tz).utcoffset().total_seconds())*10**9 # ns, local time
+            self._origin, self._tz = first - wall % self._res_ns, tz
+        return (ns - self._origin) // self._res_ns
+
+    def times(self, slots) -> pd.DatetimeIndex:
+        times = pd.to_datetime(self._origin + np.asarray(slots, dtype=np.int64)*self._res_ns, unit='ns', utc=self._tz is not None)
+        return times.tz_convert(self._tz) if self._tz is not None else times
+
+    @property
+    def oldest(self):
+        '''oldest slot that is kept'''
+        return None if self.head is None else self.head - self.retention + 1
+
+    def write(self, column, slots, values) -> np.ndarray:
+        '''write the values (array or scalar) of the slots, returns the slots that are kept'''
+        slots  = np.asarray(slots, dtype=np.int64)
+        values = np.asarray(values, dtype=float)
+        newest = int(slots.max())
+        if self.head is None:
+            self.head = newest
+        elif newest > self.head:
+            # clear the slots that are reused
+            cleared = np.arange(max(self.head+1, newest-self.retention+1), newest+1) % self.retention
+            for array in self.values.values():
+                array[cleared] = np.nan
+            self.head = newest
+        kept = slots >= self.oldest
+        if not kept.all():
+            slots, values = slots[kept], values if values.ndim == 0 else values[kept]
+        self.values[column][slots % self.retention] = values
+        return slots
+
+    def read(self, column, start, n) -> np.ndarray:
+        '''values of the slots start to start+n-1 (nan if not kept)'''
+        slots  = np.arange(start, start+n)
+        values = self.values[column][slots % self.retention]
+        values[(slots < self.oldest) | (slots > self.head)] = np.nan
+        return values
+
+    def to_frame(self, columns=None) -> pd.DataFrame:
+        '''the kept slots that have at least one value as pandas.DataFrame indexed by time'''
+        columns = columns or self.columns
+        if self.head is None:
+            return pd.DataFrame([], columns=columns)
+        slots  = np.arange(self.oldest, self.head+1)
+        frame  = pd.DataFrame({column: self.values[column][slots % self.retention] for column in columns}, index=self.times(slots))
+        return frame[frame.notna().any(axis=1)]
 
 
 @Forcasting.register('persistence_residual_load_smartmeter')
 class PersistenceResidualSmartmeterLoadForcasting():
     def __init__(self, default_val=np.nan, delay_periods=1):
+        '''Forecast of the residual load of the EC (smart meter load minus the flexible loads) with the values of the day before
+        or the same weekday one week before. The history is kept in a HistoryStore with the resolution delta_t
+        (default: 15 min, the resolution of the smart meter data) that only retains the lookback of one week.'''
         self.inputs = ['P_flex_']
 
         self.default_val = default_val # returnd in case no forcast can be made (eg strart of simulation)
         self.delay_periods = delay_periods # delay between call and start of prediction horizon (usually one, as optimization start there)
 
-        self.data = pd.DataFrame([], columns=['P_tot','P_flex', 'P_resid'])
-        self.last_valid_index = pd.to_datetime('1990-01-01 00:00').tz_localize(tz='Europe/Berlin')
-        self.last_valid_index = pd.to_datetime('1990-01-01 00:00').tz_localize(tz='Europe/Berlin')
+        self.delta_t = 15*60 # s, until set by set_delta_t
+        self.periods = 0
+        self.store   = None # HistoryStore, created with the first data
+        self._first_valid = None # slots with P_tot and P_flex
+        self._last_valid  = None
+
+    def _get_store(self) -> HistoryStore:
+        if self.store is None:
+            lookback = 7*24*3600 // self.delta_t
+            self.store = HistoryStore(['P_tot', 'P_flex', 'P_resid'], self.delta_t, lookback + self.delay_periods + self.periods + 1)
+        return self.store
 
     def get_forcast(self, time) -> list:
-        # get last day if exists in data
-        start_dt = time + self.timedelta_delay - pd.Timedelta(1, 'day') 
-        end_dt = start_dt + self.timedelta_periods
-        if end_dt <= self.last_valid_index and start_dt >= self.first_valid_index:
-            return self.data.loc[start_dt:end_dt, 'P_resid'].to_list()
-
-        # get last same weekday if exists in data
-        start_dt = time + self.timedelta_delay - pd.Timedelta(7, 'day') 
-        end_dt = start_dt + self.timedelta_periods
-        if end_dt <= self.last_valid_index and start_dt >= self.first_valid_index:
-            return self.data.loc[start_dt:end_dt, 'P_resid'].to_list()
+        if self._last_valid is not None:
+            slot = self.store.slots(pd.Timestamp(time))[0] + self.delay_periods
+            first_valid = max(self._first_valid, self.store.oldest)
+            # get last day if exists in data, otherwise the last same weekday
+            for days in [1, 7]:
+                start = slot - days*24*3600 // self.delta_t
+                if start + self.periods - 1 <= self._last_valid and start >= first_valid:
+                    return self.store.read('P_resid', start, self.periods).tolist()
 
         # Otherwise return default
         return [self.default_val] * self.periods
 
     def set_data(self, time, P_flex_) -> None:
         P_flex = sum(P_flex_)
-        self.data.at[time, 'P_flex'] = P_flex
-        df_usefull = self.data.dropna()
-        if not df_usefull.empty:
-            self.first_valid_index = df_usefull.index[0] 
-            self.last_valid_index = df_usefull.index[-1]
+        store = self._get_store()
+        self._update(store.write('P_flex', store.slots(pd.Timestamp(time)), P_flex))
+
+    def _update(self, slots) -> None:
+        '''residual load and valid range of the written slots'''
+        store = self.store
+        pos = slots % store.retention
+        store.values['P_resid'][pos] = store.values['P_tot'][pos] - store.values['P_flex'][pos] # signs!!!?????????????????????????
+        valid = slots[~np.isnan(store.values['P_resid'][pos])]
+        if len(valid):
+            self._first_valid = valid.min() if self._first_valid is None else min(self._first_valid, valid.min())
+            self._last_valid  = valid.max() if self._last_valid is None else max(self._last_valid, valid.max())
+
+    def _check_unset(self, setting) -> None:
+        if self.store is not None:
+            raise ValueError(f'{setting} needs to be set before data is stored')
 
     def set_delta_t(self, delta_t:int) -> None:
+        if delta_t != self.delta_t:
+            self._check_unset('delta_t')
         self.delta_t = delta_t
-        self.timedelta_delay = pd.to_timedelta(self.delay_periods*delta_t, unit='s')
-        if hasattr(self, 'periods'):
-            self.timedelta_periods = pd.Timedelta((self.periods-1)*self.delta_t, unit='s')
 
-    def set_forcast_length(self, n:int) -> None:  # TODO: add delta t to the atributes that are added by the controller!
+    def set_forcast_length(self, n:int) -> None:
+        if n > self.periods:
+            self._check_unset('The forecast length')
         self.periods = n
-        if hasattr(self, 'delta_t'):
-            self.timedelta_periods = pd.Timedelta((n-1)*self.delta_t, unit='s')
 
     def set_smart_meter_data(self, df_P_daily):
+        '''df_P_daily: pd.DataFrame (quarter hours x meters) or the MeterData of the GridOperator'''
         if not df_P_daily.empty:
-            P_tot = df_P_daily.sum(axis=1).squeeze()
-            self.data = self.data.reindex(self.data.index.union(P_tot.index)) # TODO: make nicer!
-            self.data.loc[P_tot.index, 'P_tot'] = P_tot.values
-            self.data['P_resid'] = self.data['P_tot'] - self.data['P_flex'] # signs!!!?????????????????????????
-            # self.last_valid_index = df_P_daily.index[-1]
-            
-            # get first valid index  # TODO: improve!
-            df_usefull = self.data.dropna()
-            if not df_usefull.empty:
-                self.first_valid_index = df_usefull.index[0] 
-                self.last_valid_index = df_usefull.index[-1]
+            if isinstance(df_P_daily, pd.DataFrame):
+                P_tot = df_P_daily.sum(axis=1)
+                index, P_tot = P_tot.index, P_tot.values
+            else:
+                index, P_tot = df_P_daily.index, df_P_daily.total()
+            store = self._get_store()
+            self._update(store.write('P_tot', store.slots(index), P_tot))
+
+    @property
+    def data(self) -> pd.DataFrame:
+        '''the retained history (P_tot, P_flex, P_resid) as pandas.DataFrame indexed by time (a copy)'''
+        if self.store is None:
+            return pd.DataFrame([], columns=['P_tot', 'P_flex', 'P_resid'])
+        return self.store.to_frame()
+
+    @property
+    def first_valid_index(self):
+        return None if self._first_valid is None else self.store.times([max(self._first_valid, self.store.oldest)])[0]
+
+    @property
+    def last_valid_index(self):
+        return None if self._last_valid is None else self.store.times([self._last_valid])[0]
+
+
+@Forcasting.register('online_regression')
+class OnlineRegressionForcasting():
+    def __init__(self, inpt:str, lags=(24*3600, 7*24*3600), harmonics=2, weekday=True, forgetting=0.999, init_val=np.nan, delay=1, p0=1e4):
+        '''Linear regression forecast of a single variable (e.g. P_resid_ec or dot_m_demand), updated online with
+        recursive least squares (RLS, O(features^2) per step, the history is never refitted).
+        The features of a value at time t are: a constant, the lagged values y(t-lag), sin/cos of the time of day (harmonics)
+        and the weekday (dummies). The whole horizon is predicted with one matrix product.
+        Until there are as many updates as features, init_val is returned.
+
+        Parameters
+        ----------
+        inpt : str, name of the input
+        lags : tuple of int, lags of the lagged values in s (multiples of delta_t, at least (delay + forecast length - 1)*delta_t)
+        harmonics : int, number of harmonics of the time of day
+        weekday : bool, add weekday dummies
+        forgetting : float (0, 1], forgetting factor of the RLS (1: no forgetting)
+        init_val : float, forecast value until the regression is initialized
+        delay : int, periods between the call and the start of the forecast horizon
+        p0 : float, initial covariance (inverse regularization) of the RLS'''
+        self.inputs     = [inpt]
+        self.inpt       = inpt
+        self.lags       = lags # s
+        self.harmonics  = harmonics
+        self.weekday    = weekday
+        self.forgetting = forgetting
+        self.init_val   = init_val
+        self.delay      = delay
+        self.p0         = p0
+
+        self.delta_t  = 15*60 # s, until set by set_delta_t
+        self.periods  = 0
+        self.buffer   = None # RingBuffer of the history, created with the first data
+        self.n_features = 1 + len(lags) + 2*harmonics + (6 if weekday else 0)
+        self.theta    = np.zeros(self.n_features) # coefficients
+        self.P        = np.eye(self.n_features) * p0 # covariance
+        self.n_updates = 0
+
+    def set_delta_t(self, delta_t:int) -> None:
+        self.delta_t = delta_t
+        self.buffer  = None
+
+    def set_forcast_length(self, n:int) -> None:
+        self.periods = n
+        self.buffer  = None
+
+    def _init_buffer(self) -> None:
+        lag_steps = np.array(self.lags) // self.delta_t
+        if np.any(np.array(self.lags) % self.delta_t):
+            raise ValueError(f'The lags need to be multiples of delta_t ({self.delta_t} s)')
+        if np.any(lag_steps < self.delay + self.periods - 1):
+            raise ValueError(f'The lags need to cover the forecast horizon and the delay (at least {(self.delay + self.periods - 1)*self.delta_t} s)')
+        self._lag_steps = lag_steps
+        self.buffer = RingBuffer(int(lag_steps.max()) + 1)
+        # positions of the lagged values of the horizon in the window (the newest value is at -1)
+        horizon = self.delay + np.arange(self.periods)
+        self._lag_index = self.buffer.size - 1 - (lag_steps[np.newaxis, :] - horizon[:, np.newaxis])
+        self._horizon_s = horizon * self.delta_t
+
+    def _time_features(self, seconds, weekdays) -> np.ndarray:
+        '''sin/cos of the time of day and weekday dummies, one row per time'''
+        columns = []
+        for k in range(1, self.harmonics+1):
+            angle = 2*np.pi*k*seconds/86400
+            columns += [np.sin(angle), np.cos(angle)]
+        if self.weekday:
+            columns += [weekdays == d for d in range(1, 7)]
+        return np.column_stack(columns) if columns else np.zeros((len(seconds), 0))
+
+    def _features(self, time, lagged, offsets) -> np.ndarray:
+        '''feature matrix of the times time+offsets (s), lagged: lagged values (one row per time)'''
+        time = pd.Timestamp(time, unit='s') if not isinstance(time, pd.Timestamp) else time
+        seconds = time.hour*3600 + time.minute*60 + time.second + offsets
+        weekdays = (time.dayofweek + seconds // 86400) % 7
+        return np.column_stack([np.ones(len(offsets)), lagged, self._time_features(seconds % 86400, weekdays)])
+
+    def set_data(self, time, **values) -> None:
+        if self.buffer is None:
+            self._init_buffer()
+        y = float(values[self.inpt])
+        window = self.buffer.window()
+        phi = self._features(time, window[self.buffer.size - self._lag_steps][np.newaxis, :], np.zeros(1))[0]
+        self.buffer.append(y)
+        if np.isnan(y) or np.isnan(phi).any():
+            return
+
+        # RLS update
+        Pphi = self.P @ phi
+        gain = Pphi / (self.forgetting + phi @ Pphi)
+        self.theta += gain * (y - phi @ self.theta)
+        self.P -= np.outer(gain, Pphi)
+        self.P += self.P.T # keep P symmetric (numerical stability)
+        self.P *= 0.5 / self.forgetting
+        self.n_updates += 1
+
+    def get_forcast(self, time, copy=True):
+        '''forecast of the horizon, as list (copy=False: numpy array)'''
+        if self.buffer is None:
+            self._init_buffer()
+        if self.n_updates < self.n_features:
+            forcast = np.full(self.periods, self.init_val, dtype=float)
+        else:
+            Phi = self._features(time, self.buffer.window()[self._lag_index], self._horizon_s)
+            forcast = Phi @ self.theta
+        return forcast.tolist() if copy else forcast
+
+
+@Forcasting.register('perfect_foresight')
+class PerfectForesightForcasting():
+    def __init__(self, data:pd.Series, delay=1):
+        '''Perfect forecast that serves the windows of a known time series (e.g. a column of Household.df or SynproPV.df),
+        to benchmark controllers without forecast errors. The values are not copied, the position of a time is computed
+        from the (regular) index and the forecast is a strided numpy view (one value every delta_t, no per step pandas slicing).
+        Windows that exceed the series hold its first/last value (copy).
+
+        Parameters
+        ----------
+        data : pd.Series with a DatetimeIndex (float values are referenced, not copied)
+        delay : int, periods between the call and the start of the forecast horizon'''
+        self.inputs = []
+        self.delay  = delay
+
+        self.values = data.to_numpy(dtype=float).view() # read-only reference
+        self.values.flags.writeable = False
+        self._ns = pd.DatetimeIndex(data.index).as_unit('ns').asi8
+        self._tz = pd.DatetimeIndex(data.index).tz
+        diffs = np.diff(self._ns)
+        self._regular = len(diffs) > 0 and bool(np.all(diffs == diffs[0]))
+        self._res_ns  = int(diffs[0]) if self._regular else None # ns
+
+        self.periods = 0
+        self.set_delta_t(int(diffs[0] // 10**9) if len(diffs) else 1)
+
+    def set_delta_t(self, delta_t:int) -> None:
+        self.delta_t = delta_t
+        self._stride = 1
+        if self._regular:
+            stride, rest = divmod(delta_t*10**9, self._res_ns)
+            if rest or not stride:
+                raise ValueError(f'delta_t ({delta_t} s) needs to be a multiple of the resolution of the data ({self._res_ns/1e9} s)')
+            self._stride = int(stride)
+
+    def set_forcast_length(self, n:int) -> None:
+        self.periods = n
+
+    def set_data(self, time, **values) -> None:
+        pass
+
+    def _value(self, time) -> int:
+        '''epoch ns of the time, naive times are in the time zone of the data'''
+        time = pd.Timestamp(time)
+        if time.tz is None and self._tz is not None:
+            time = time.tz_localize(self._tz)
+        return time.value
+
+    def _position(self, time) -> int:
+        '''position of the last value at or before time'''
+        ns = self._value(time)
+        if self._regular:
+            return (ns - int(self._ns[0])) // self._res_ns
+        return int(np.searchsorted(self._ns, ns, side='right')) - 1
 
+    def get_forcast(self, time, copy=True):
+        '''the values of the horizon, as list (copy=False: read-only numpy view)'''
+        start = self._position(time) + self.delay*self._stride
+        stop  = start + self.periods*self._stride
+        if self._regular and start >= 0 and stop <= len(self.values):
+            forcast = self.values[start:stop:self._stride]
+        elif self._regular:
+            forcast = self.values[np.clip(np.arange(start, stop, self._stride), 0, len(self.values)-1)]
+        else:
+            # irregular index: the positions of the times of the horizon
+            ns = self._value(time) + (self.delay + np.arange(self.periods)) * self.delta_t * 10**9
+            forcast = self.values[np.clip(np.searchsorted(self._ns, ns, side='right') - 1, 0, len(self.values)-1)]
+        return forcast.tolist() if copy else forcast
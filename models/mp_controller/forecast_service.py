@@ -0,0 +1,159 @@
+import numpy as np
+from .forcasting import Forcasting
+
+
+class ForecastService():
+    def __init__(self):
+        '''Shares forecasters between several add_forcaster calls and controllers.
+        Subscribers of the same data stream (name) get a SharedForcaster each, which all use one forecaster
+        per forecast length and delta_t: the data of a time step is ingested once (set_data, set_smart_meter_data),
+        list inputs of the subscribers (e.g. the flexible loads P_flex_ of every controller) are merged, and the forecast of a time step is computed once and handed out as read-only array (or list) to all subscribers.
+
+        Example
+        -------
+        service = ForecastService()
+        ec_forcast = service.forcaster('P_ec', 'persistence_residual_load_smartmeter', default_val=0)
+        gridoperator.register_callback_new_data(ec_forcast.set_smart_meter_data)
+        mp_contr.add_forcaster(ec_forcast, milp_ec, 'P_resid_ec') # and the same for further controllers'''
+        self._streams   = {} # name: (method, args, kwargs)
+        self._inputs    = {} # name: inputs of the forecaster
+        self._shared    = {} # (name, forecast length, delta_t): _SharedEntry
+        self.ingested   = 0 # set_data calls passed to the forecasters
+        self.computed   = 0 # forecasts computed
+        self.served     = 0 # forecasts handed out
+
+    def forcaster(self, name, method, *args, **kwargs) -> 'SharedForcaster':
+        '''a new subscriber of the data stream name, forecasted with the registered Forcasting method (args and kwargs are passed to it).
+        All subscribers of a stream need the same method and arguments'''
+        config = (method, args, kwargs)
+        if name not in self._streams:
+            self._streams[name] = config
+            self._inputs[name]  = Forcasting(method, *args, **kwargs).inputs
+        elif not _same_config(self._streams[name], config):
+            raise ValueError(f'The data stream "{name}" is already forecasted with a different method or arguments')
+        return SharedForcaster(self, name)
+
+    def _entry(self, name, periods, delta_t) -> '_SharedEntry':
+        key = (name, periods, delta_t)
+        if key not in self._shared:
+            method, args, kwargs = self._streams[name]
+            forcaster = Forcasting(method, *args, **kwargs)
+            if delta_t is not None and hasattr(forcaster, 'set_delta_t'):
+                forcaster.set_delta_t(delta_t)
+            forcaster.set_forcast_length(periods)
+            self._shared[key] = _SharedEntry(forcaster)
+        return self._shared[key]
+
+    def statistics(self) -> dict:
+        return {
+            'streams': len(self._streams),
+            'forcasters': len(self._shared),
+            'ingested': self.ingested,
+            'computed': self.computed,
+            'served': self.served,
+            }
+
+
+def _merge_inputs(contributions:list) -> dict:
+    '''inputs of the subscribers of a time step: list inputs (name ends with '_') are concatenated,
+    the other inputs are the same measurement for all subscribers (the value of the first one is used)'''
+    merged = dict(contributions[0])
+    for inputs in contributions[1:]:
+        for name, value in inputs.items():
+            if name.endswith('_'):
+                merged[name] = list(merged[name]) + list(value)
+    return merged
+
+
+def _same_inputs(a:dict, b:dict) -> bool:
+    try:
+        return bool(a == b)
+    except (ValueError, TypeError): # e.g. arrays
+        return False
+
+
+def _same_config(a, b) -> bool:
+    '''compares (method, args, kwargs), arguments that are not comparable (e.g. arrays, pd.Series) need to be the same object'''
+    try:
+        return bool(a == b)
+    except (ValueError, TypeError):
+        (m_a, args_a, kw_a), (m_b, args_b, kw_b) = a, b
+        return (m_a == m_b and len(args_a) == len(args_b) and kw_a.keys() == kw_b.keys()
+                and all(x is y for x, y in zip(args_a, args_b)) and all(kw_a[k] is kw_b[k] for k in kw_a))
+
+
+class _SharedEntry():
+    def __init__(self, forcaster):
+        '''one forecaster and the time of the last ingested data and computed forecast'''
+        self.forcaster    = forcaster
+        self.data_time    = None
+        self.inputs       = {} # subscriber: inputs of the time step data_time
+        self.merged       = None # inputs passed to the forecaster for data_time
+        self.sm_data      = None # last smart meter data (identity)
+        self.forcast_time = None
+        self.forcast      = None # read-only array
+
+
+class SharedForcaster():
+    def __init__(self, service:ForecastService, name):
+        '''subscriber of a data stream of a ForecastService, follows the forecasting protocol (see ForcastingProto)'''
+        self.service = service
+        self.name    = name
+        self.inputs  = list(service._inputs[name])
+        self.periods = None
+        self.delta_t = None
+        self._shared = None
+
+    def set_forcast_length(self, n:int) -> None:
+        self.periods = n
+        self._shared = None
+
+    def set_delta_t(self, delta_t:int) -> None:
+        self.delta_t = delta_t
+        self._shared = None
+
+    def _entry(self) -> _SharedEntry:
+        if self._shared is None:
+            self._shared = self.service._entry(self.name, self.periods, self.delta_t)
+        return self._shared
+
+    def set_data(self, time, **inputs) -> None:
+        '''the inputs of a time step are merged over the subscribers (see _merge_inputs) and passed to the forecaster
+        by the first subscriber, a later subscriber only passes the time step again if it changes the merged inputs
+        (e.g. its own flexible loads): with replace_data if the forecaster appends the data of every call, otherwise with set_data
+        (e.g. the smart meter forecaster overwrites the slot of the time)'''
+        entry = self._entry()
+        if entry.data_time is None or entry.data_time != time:
+            entry.data_time, entry.inputs, entry.merged = time, {}, None
+        entry.inputs[self] = inputs
+        merged = _merge_inputs(list(entry.inputs.values()))
+        if entry.merged is not None and _same_inputs(entry.merged, merged):
+            return
+        if entry.merged is None:
+            entry.forcaster.set_data(time, **merged)
+        else:
+            getattr(entry.forcaster, 'replace_data', entry.forcaster.set_data)(time, **merged)
+        entry.merged       = merged
+        entry.forcast_time = None
+        self.service.ingested += 1
+
+    def set_smart_meter_data(self, df_P_daily) -> None:
+        '''callback of the GridOperator, the data is passed once to the forecasters of the stream (of all forecast lengths)'''
+        self._entry()
+        for (name, _, _), entry in self.service._shared.items():
+            if name != self.name or entry.sm_data is df_P_daily:
+                continue
+            entry.forcaster.set_smart_meter_data(df_P_daily)
+            entry.sm_data      = df_P_daily
+            entry.forcast_time = None
+
+    def get_forcast(self, time, copy=True):
+        '''the forecast of the time step, as list (copy=False: read-only numpy array shared with the other subscribers)'''
+        entry = self._entry()
+        if entry.forcast is None or entry.forcast_time is None or entry.forcast_time != time:
+            forcast = np.array(entry.forcaster.get_forcast(time), dtype=float)
+            forcast.flags.writeable = False
+            entry.forcast, entry.forcast_time = forcast, time
+            self.service.computed += 1
+        self.service.served += 1
+        return entry.forcast.tolist() if copy else entry.forcast
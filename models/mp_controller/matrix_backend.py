@@ -0,0 +1,403 @@
+import numpy as np
+import scipy.sparse as sp
+import highspy
+from .mp_controller import MPController
+from .opt_models.MILP_model_proto import MILPModelProto
+
+# HiGHS statuses of a solve that was stopped by a limit, the best incumbent (if any) can be used
+LIMIT_STATUSES = {highspy.HighsModelStatus.kTimeLimit, highspy.HighsModelStatus.kIterationLimit, highspy.HighsModelStatus.kSolutionLimit}
+
+
+class MatrixModel():
+    def __init__(self, n_periods, delta_t, period_durations=None):
+        '''A (MI)LP in matrix form: min c x, s.t. row_lb <= A x <= row_ub, col_lb <= x <= col_ub.
+        Parameters enter linearly into the row bounds, the column bounds (fixed columns) and single coefficients of A.
+        Everything else is assembled once into a scipy.sparse CSR matrix, see MatrixBlock for how components add to it.
+
+        Parameters
+        ----------
+        n_periods : int, length of optimization horizon
+        delta_t : int, timedelta of the periods in s
+        period_durations : array, duration of every period in s (None: delta_t)'''
+        self.n_periods  = n_periods
+        self.delta_t    = delta_t
+        self.dt         = np.full(n_periods, float(delta_t)) if period_durations is None else np.asarray(period_durations, dtype=float) # s, per period
+        self.periods    = np.arange(n_periods)
+        self.timepoints = np.arange(n_periods+1)
+        self.blocks     = {}
+
+        # columns
+        self.n_cols       = 0
+        self._col_lb      = []
+        self._col_ub      = []
+        self._col_int     = []
+        self._cost        = ([], []) # cols, values
+        self._fix         = ([], []) # cols, params (col_lb = col_ub = param)
+        self.indexed_cols = [] # columns of variables indexed by periods or timepoints
+
+        # parameters
+        self.n_params     = 0
+        self.param_values = np.zeros(0)
+
+        # rows
+        self.n_rows  = 0
+        self._row_lb = []
+        self._row_ub = []
+        self._A      = ([], [], []) # rows, cols, values
+        self._rhs    = ([], [], []) # rows, params, factors (added to row_lb and row_ub)
+        self._coef   = ([], [], [], []) # rows, cols, params, factors (added to the value in A)
+
+        self.col_values = None # solution
+
+    def add_cols(self, n, lb=-np.inf, ub=np.inf, integer=False) -> np.ndarray:
+        cols = np.arange(self.n_cols, self.n_cols+n)
+        self.n_cols += n
+        self._col_lb += [np.broadcast_to(np.asarray(lb, dtype=float), (n,))]
+        self._col_ub += [np.broadcast_to(np.asarray(ub, dtype=float), (n,))]
+        self._col_int += [np.full(n, integer)]
+        return cols
+
+    def add_params(self, n) -> np.ndarray:
+        params = np.arange(self.n_params, self.n_params+n)
+        self.n_params += n
+        self.param_values = np.append(self.param_values, np.full(n, np.nan))
+        return params
+
+    def add_rows(self, n, lb=0., ub=0.) -> np.ndarray:
+        rows = np.arange(self.n_rows, self.n_rows+n)
+        self.n_rows += n
+        self._row_lb += [np.broadcast_to(np.asarray(lb, dtype=float), (n,))]
+        self._row_ub += [np.broadcast_to(np.asarray(ub, dtype=float), (n,))]
+        return rows
+
+    def add_entries(self, rows, cols, values, params=None, factor=0.) -> None:
+        '''add the coefficients values (+ factor*param if params are given) of cols in rows'''
+        values = np.broadcast_to(np.asarray(values, dtype=float), np.shape(rows))
+        self._A[0].append(rows)
+        self._A[1].append(cols)
+        self._A[2].append(values)
+        if params is not None:
+            self._coef[0].append(rows)
+            self._coef[1].append(cols)
+            self._coef[2].append(params)
+            self._coef[3].append(np.broadcast_to(np.asarray(factor, dtype=float), np.shape(rows)))
+
+    def add_rhs(self, rows, params, factor=1.) -> None:
+        '''add factor*param to the lower and upper bound of the rows'''
+        self._rhs[0].append(rows)
+        self._rhs[1].append(params)
+        self._rhs[2].append(np.broadcast_to(np.asarray(factor, dtype=float), np.shape(rows)))
+
+    def add_cost(self, cols, values) -> None:
+        self._cost[0].append(cols)
+        self._cost[1].append(np.broadcast_to(np.asarray(values, dtype=float), np.shape(cols)))
+
+    def fix(self, cols, params) -> None:
+        '''fix the columns to the value of the params (col_lb = col_ub = param)'''
+        self._fix[0].append(cols)
+        self._fix[1].append(params)
+
+    def finalize(self) -> None:
+        '''assemble the constraint matrix and the vectors'''
+        cat = lambda arrays, dtype: np.concatenate(arrays).astype(dtype) if arrays else np.zeros(0, dtype=dtype)
+
+        self.col_lb  = cat(self._col_lb, float)
+        self.col_ub  = cat(self._col_ub, float)
+        self.col_int = cat(self._col_int, bool)
+        self.cost    = np.zeros(self.n_cols)
+        np.add.at(self.cost, cat(self._cost[0], int), cat(self._cost[1], float))
+        self.fix_cols   = cat(self._fix[0], int)
+        self.fix_params = cat(self._fix[1], int)
+
+        self.row_lb = cat(self._row_lb, float)
+        self.row_ub = cat(self._row_ub, float)
+        self.A = sp.csr_matrix(
+            (cat(self._A[2], float), (cat(self._A[0], int), cat(self._A[1], int))),
+            shape=(self.n_rows, self.n_cols))
+        self.A.sum_duplicates()
+
+        # parameter dependent row bounds: B @ param_values
+        rhs_rows = cat(self._rhs[0], int)
+        self.B = sp.csr_matrix((cat(self._rhs[2], float), (rhs_rows, cat(self._rhs[1], int))), shape=(self.n_rows, self.n_params))
+        self.rhs_rows = np.unique(rhs_rows)
+
+        # parameter dependent coefficients
+        self.coef_rows    = cat(self._coef[0], int)
+        self.coef_cols    = cat(self._coef[1], int)
+        self.coef_params  = cat(self._coef[2], int)
+        self.coef_factors = cat(self._coef[3], float)
+        self.coef_base    = np.asarray(self.A[self.coef_rows, self.coef_cols]).ravel() if len(self.coef_rows) else np.zeros(0)
+
+    def row_bounds(self):
+        '''lower and upper bounds of the parameter dependent rows (rhs_rows)'''
+        offset = (self.B @ self.param_values)[self.rhs_rows]
+        return self.row_lb[self.rhs_rows] + offset, self.row_ub[self.rhs_rows] + offset
+
+    def coefficients(self) -> np.ndarray:
+        '''values of the parameter dependent coefficients'''
+        return self.coef_base + self.coef_factors * self.param_values[self.coef_params]
+
+    def load(self, highs:highspy.Highs) -> None:
+        '''assemble the model and pass it to HiGHS'''
+        self.finalize()
+        highs.clearModel()
+        highs.addVars(self.n_cols, self.col_lb, self.col_ub)
+        integer = np.flatnonzero(self.col_int)
+        if len(integer):
+            highs.changeColsIntegrality(len(integer), integer, np.full(len(integer), highspy.HighsVarType.kInteger))
+        highs.changeColsCost(self.n_cols, np.arange(self.n_cols), self.cost)
+        highs.addRows(self.n_rows, self.row_lb, self.row_ub, self.A.nnz, self.A.indptr, self.A.indices, self.A.data)
+        self._loaded_coefs = self.coef_base.copy() # parameter dependent coefficients in HiGHS
+
+    def update(self, highs:highspy.Highs) -> None:
+        '''push the parameter dependent bounds and coefficients to HiGHS.
+        The bounds are changed with one call per kind (index arrays), HiGHS has no call for several coefficients of A,
+        so only the coefficients whose value changed since the last update are changed one by one'''
+        if len(self.rhs_rows):
+            lb, ub = self.row_bounds()
+            highs.changeRowsBounds(len(self.rhs_rows), self.rhs_rows, lb, ub)
+        if len(self.fix_cols):
+            values = self.param_values[self.fix_params]
+            highs.changeColsBounds(len(self.fix_cols), self.fix_cols, values, values)
+        if len(self.coef_rows):
+            coefs = self.coefficients()
+            changed = np.flatnonzero(coefs != self._loaded_coefs)
+            for row, col, val in zip(self.coef_rows[changed].tolist(), self.coef_cols[changed].tolist(), coefs[changed].tolist()):
+                highs.changeCoeff(row, col, val)
+            self._loaded_coefs = coefs
+
+    def run(self, highs:highspy.Highs):
+        '''solve with HiGHS and store the solution in col_values,
+        a solve that is stopped by a limit keeps the best incumbent (col_values are unchanged if there is none)'''
+        highs.run()
+        status = highs.getModelStatus()
+        if status != highspy.HighsModelStatus.kOptimal and status not in LIMIT_STATUSES:
+            raise RuntimeError(f'HiGHS did not find an optimal solution: {highs.modelStatusToString(status)}')
+        solution = highs.getSolution()
+        if solution.value_valid:
+            self.col_values = np.array(solution.col_value)
+        return status
+
+    def pprint(self) -> None:
+        print(f'MatrixModel: {self.n_cols} columns ({int(sum(c.sum() for c in self._col_int))} integer), {self.n_rows} rows, {self.n_params} parameters')
+        for block in self.blocks.values():
+            print(f'  {block.name}: vars {list(block.vars)}, params {list(block.params)}')
+
+
+class MatrixBlock():
+    def __init__(self, model:MatrixModel, name):
+        '''The variables, parameters and constraints of one component in a MatrixModel
+        (the counterpart of the pyo.Block for components with a matrix_block_rule).
+        Variables and parameters are numpy arrays of column/parameter indices,
+        constraints are added row wise for all entries of these arrays at once.'''
+        self.model  = model
+        self.name   = name
+        self.vars   = {}
+        self.params = {}
+
+    def _length(self, index) -> int:
+        match index:
+            case 'periods':
+                return self.model.n_periods
+            case 'timepoints':
+                return self.model.n_periods+1
+            case None:
+                return 1
+            case _:
+                raise ValueError(f"'{index}' not a valid index")
+
+    def var(self, name, index='periods', lb=-np.inf, ub=np.inf, integer=False) -> np.ndarray:
+        '''add a variable, index : 'periods', 'timepoints' or None (scalar)'''
+        cols = self.model.add_cols(self._length(index), lb, ub, integer)
+        if index is not None:
+            self.model.indexed_cols += [cols]
+        self.vars[name] = cols
+        return cols
+
+    def param(self, name, index=None) -> np.ndarray:
+        '''add a (mutable) parameter, index : 'periods', 'timepoints' or None (scalar)'''
+        params = self.model.add_params(self._length(index))
+        self.params[name] = params
+        return params
+
+    def fix(self, cols, params) -> None:
+        self.model.fix(cols, params)
+
+    def constraint(self, terms, lb=0., ub=0., rhs=()) -> np.ndarray:
+        '''add one row per entry of the column arrays in terms: lb + rhs <= sum of terms <= ub + rhs
+
+        Parameters
+        ----------
+        terms : list of (cols, coeff) or (cols, coeff, params, factor), the coefficient of a term is coeff (+ factor*param)
+        lb : float or array, constant lower bound of the rows (-np.inf for <=)
+        ub : float or array, constant upper bound of the rows (np.inf for >=)
+        rhs : list of (params, factor), parameter dependent part of the bounds'''
+        rows = self.model.add_rows(len(terms[0][0]), lb, ub)
+        for term in terms:
+            self.model.add_entries(rows, *term)
+        for params, factor in rhs:
+            self.model.add_rhs(rows, params, factor)
+        return rows
+
+    def objective(self, cols, coeffs) -> None:
+        '''add coeffs*cols to the (minimized) objective'''
+        self.model.add_cost(cols, coeffs)
+
+
+class ParamBinding():
+    def __init__(self, model:MatrixModel, params):
+        '''binding of (indexed) parameters of a MatrixModel, counterpart of IndexedBinding'''
+        self.model  = model
+        self.params = params
+
+    def set_value(self, value) -> None:
+        self.model.param_values[self.params] = value
+
+    def set_values(self, values) -> None:
+        values = np.asarray(values, dtype=float)
+        if values.shape != self.params.shape:
+            raise ValueError(f'Expected {len(self.params)} values, got shape {values.shape}')
+        self.model.param_values[self.params] = values
+
+
+class ColumnBinding():
+    def __init__(self, model:MatrixModel, cols):
+        '''binding of the solution values of a variable of a MatrixModel, counterpart of IndexedBinding'''
+        self.model = model
+        self.cols  = cols
+
+    def get_values(self) -> np.ndarray:
+        return self.model.col_values[self.cols]
+
+
+class MatrixMPController(MPController):
+    def __init__(self, name, n_periods, delta_t, sep='.', return_forcast=False, return_future_control_output=False, return_future_state=False, warm_start=False, replan_on_event=False, state_tolerance=0., forecast_tolerance=0., max_replan_interval=None, time_limit=None, gap_limit=None, threads=None, safe_outputs=0., return_telemetry=False, telemetry_capacity=100_000, tee=False, print_model=False, period_durations=None, solution_cache=None):
+        '''A model predictive controller with the same interface as MPController,
+        which bypasses pyomo and calls HiGHS (highspy) directly.
+        The components need a matrix_block_rule (see MatrixBlock), the constraint matrix is assembled once
+        as scipy.sparse CSR matrix and only the parameter dependent bounds and coefficients are updated every step.
+
+        Parameters
+        ----------
+        see MPController'''
+        super().__init__(name, n_periods, delta_t, sep=sep,
+                         return_forcast=return_forcast,
+                         return_future_control_output=return_future_control_output,
+                         return_future_state=return_future_state,
+                         warm_start=warm_start,
+                         replan_on_event=replan_on_event,
+                         state_tolerance=state_tolerance,
+                         forecast_tolerance=forecast_tolerance,
+                         max_replan_interval=max_replan_interval,
+                         time_limit=time_limit,
+                         gap_limit=gap_limit,
+                         threads=threads,
+                         safe_outputs=safe_outputs,
+                         return_telemetry=return_telemetry,
+                         telemetry_capacity=telemetry_capacity,
+                         tee=tee,
+                         print_model=print_model,
+                         period_durations=period_durations,
+                         solution_cache=solution_cache)
+        self._shared_rows = {}
+
+    def _setup_backend(self, pyo_solver_name):
+        '''a MatrixModel and a HiGHS instance instead of the pyomo model and solver'''
+        self.model  = MatrixModel(self.n_periods, self.delta_t, self.period_durations)
+        self.solver = highspy.Highs()
+        self.solver.setOptionValue('output_flag', self.tee)
+        if self.time_limit is not None:
+            self.solver.setOptionValue('time_limit', float(self.time_limit))
+        if self.gap_limit is not None:
+            self.solver.setOptionValue('mip_rel_gap', float(self.gap_limit))
+        if self.threads is not None:
+            self.solver.setOptionValue('threads', int(self.threads))
+
+    def _add_block(self, component:MILPModelProto):
+        if not hasattr(component, 'matrix_block_rule'):
+            raise TypeError(f'Model "{component.name}" has no matrix_block_rule and can not be used with the MatrixMPController')
+        self._instance_loaded = False
+
+        block = MatrixBlock(self.model, component.name)
+        component.matrix_block_rule(block)
+        self.model.blocks[component.name] = block
+
+        # bind the inputs and outputs of the block
+        for state_name in component.state_inputs:
+            self._state_bindings += [(component.name+self.sep+state_name, ParamBinding(self.model, block.params[state_name]))]
+        for out_name in component.controll_outputs:
+            self._output_bindings[component.name+self.sep+out_name] = ColumnBinding(self.model, block.vars[out_name])
+        for state in getattr(component, 'states', []):
+            self._trajectory_bindings[component.name+self.sep+state] = ColumnBinding(self.model, block.vars[state])
+
+        # sum constraints of the shared variables
+        for shared in component.shares:
+            if shared not in self._shared_rows:
+                self.shared_vars.add(shared)
+                self._shared_rows[shared] = self.model.add_rows(self.n_periods)
+            self.model.add_entries(self._shared_rows[shared], block.vars[shared], 1.)
+
+    def _bind_forecast(self, for_model:MILPModelProto, for_var:str):
+        return ParamBinding(self.model, self.model.blocks[for_model.name].params[for_var])
+
+    def _solve(self):
+        if not self._instance_loaded:
+            self.model.load(self.solver)
+            self._instance_loaded = True
+        self.model.update(self.solver)
+
+        if self.warm_start and self._has_solution and self.model.col_values is not None: # no incumbent if a limit stopped the first solve
+            self._shift_solution()
+            solution = highspy.HighsSolution()
+            solution.col_value = self.model.col_values.tolist()
+            solution.value_valid = True
+            self.solver.setSolution(solution)
+
+        status = self.model.run(self.solver)
+        self._has_solution = True
+        return status
+
+    def _fix_first_outputs(self, values:dict) -> None:
+        if not self._instance_loaded:
+            self.model.load(self.solver)
+            self._instance_loaded = True
+        for name, binding in self._output_bindings.items():
+            col = binding.cols[0]
+            if name in values:
+                self.solver.changeColBounds(col, values[name], values[name])
+            else:
+                self.solver.changeColBounds(col, self.model.col_lb[col], self.model.col_ub[col])
+
+    def _block_accessors(self, component):
+        block = self.model.blocks[component.name]
+        def set_values(name, values):
+            self.model.col_values[block.vars[name]] = values
+        return lambda name: self.model.col_values[block.vars[name]], set_values
+
+    def _set_integrality(self, components, integer) -> None:
+        if not self._instance_loaded:
+            self.model.load(self.solver)
+            self._instance_loaded = True
+        cols = np.concatenate([self.model.blocks[comp.name].vars[name] for comp in components for name in comp.relaxed_binaries])
+        integrality = highspy.HighsVarType.kInteger if integer else highspy.HighsVarType.kContinuous
+        self.solver.changeColsIntegrality(len(cols), cols, np.full(len(cols), integrality))
+
+    def _solve_outcome(self, status):
+        if status == highspy.HighsModelStatus.kOptimal:
+            return 'optimal'
+        return 'incumbent' if self.solver.getSolution().value_valid else None
+
+    def _solve_info(self, status) -> dict:
+        # HiGHS reports a node count of -1 and an infinite gap for LPs
+        info = self.solver.getInfo()
+        return {
+            'status': self.solver.modelStatusToString(status).lower(),
+            'mip_gap': info.mip_gap if info.mip_node_count >= 0 else 0.,
+            'node_count': max(info.mip_node_count, 0),
+            'objective': info.objective_function_value,
+            }
+
+    def _shift_solution(self):
+        x = self.model.col_values
+        for cols in self.model.indexed_cols:
+            x[cols[:-1]] = x[cols[1:]]
@@ -1,12 +1,24 @@
 import pyomo.environ as pyo
+import numpy as np
+import inspect
+from time import perf_counter
 from .forcasting import ForcastingProto
 from .opt_models.MILP_model_proto import MILPModelProto
+from .pyo_helpers import IndexedBinding
+from .telemetry import SolverTelemetry, TELEMETRY_FIELDS, mip_gap
 from pyomo.contrib.appsi.solvers.highs import Highs
 from pyomo.contrib.appsi.solvers.gurobi import Gurobi
 
+# persistent (appsi) solvers that keep the model loaded between the steps
+PERSISTENT_SOLVERS = {'appsi_highs': Highs, 'appsi_gurobi': Gurobi}
+# solver specific option for the number of threads of the appsi solvers (options attribute, key)
+THREAD_OPTIONS = {'appsi_highs': ('highs_options', 'threads'), 'appsi_gurobi': ('gurobi_options', 'Threads')}
+# terminations of a solve that was stopped by a budget (time_limit, gap_limit), the best incumbent can be used
+BUDGET_TERMINATIONS = {'maxTimeLimit', 'maxIterations', 'objectiveLimit'}
+
 
 class MPController():
-    def __init__(self, name, n_periods, delta_t, pyo_solver_name='appsi_highs', sep='.', return_forcast=False, return_future_control_output=False, return_future_state=False):
+    def __init__(self, name, n_periods, delta_t, pyo_solver_name='appsi_highs', sep='.', return_forcast=False, return_future_control_output=False, return_future_state=False, persistent=False, warm_start=False, replan_on_event=False, state_tolerance=0., forecast_tolerance=0., max_replan_interval=None, time_limit=None, gap_limit=None, threads=None, safe_outputs=0., return_telemetry=False, telemetry_capacity=100_000, tee=False, print_model=False, period_durations=None, solution_cache=None):
         '''A model predicteve Controller utilizing MILP with pyomo. 
         MILP Models can be added to the model via the add_model() method. Added models need to follow a given structure. 
         Please find examples for reference.
@@ -18,10 +30,38 @@ class MPController():
         delta_t : int, timedelta of the controller in s
         pyo_solver_name : str, name of a pyomo solver (passed to pyo.SolverFactory)
         return_forcast : bool, return the forcast values as outputs of the controller model
+        persistent : bool, load the model structure once into a long-lived solver instance and only push the changed mutable parameters between the steps (pyo_solver_name needs to be one of PERSISTENT_SOLVERS)
+        warm_start : bool, shift the previous solution one period forward (the new tail period repeats the last value) and pass it to the solver as MIP start
+        replan_on_event : bool, replay the last optimal plan and only solve again if a measured state drifts from the planned trajectory, a forecast changes or max_replan_interval elapsed (the controller needs to be stepped every delta_t)
+        state_tolerance : float or dict, allowed absolute deviation of the state inputs from the planned states (dict: per state input, e.g. {'bes.E_BES_0': 3600})
+        forecast_tolerance : float or dict, allowed absolute deviation of a new forecast from the forecast of the plan (dict: per forecast, e.g. {'EC.forecast.P_resid_ec': 100})
+        max_replan_interval : int, maximum number of steps a plan is replayed (None: only limited by the horizon)
+        time_limit : float, time budget of a solve in s (None: unlimited)
+        gap_limit : float, relative MIP gap at which a solve is stopped (None: solver default)
+        threads : int, number of threads of the solver (None: solver default)
+        safe_outputs : float or dict, control outputs that are returned if a solve hits the budget without a feasible solution and no previous plan is left (dict: per output, e.g. {'bes.P_el': 0})
+            If a budget is hit the best incumbent is used, otherwise the previous plan is shifted, otherwise the safe outputs are returned. The paths are counted in self.fallback_counts.
+            Budgets are only supported for the appsi solvers (PERSISTENT_SOLVERS)
+        return_telemetry : bool, return the solver telemetry of the step (update_time, solve_time, status, mip_gap, node_count, objective) as outputs 'telemetry'+sep+field
+        telemetry_capacity : int, number of steps kept in the telemetry buffer (self.telemetry, see SolverTelemetry)
+        tee : bool, stream the solver log to stdout
+        print_model : bool, pprint the pyomo model before every solve (debugging)
+        period_durations : list of int, duration of every period in s (move blocking, e.g. [900]*16 + [3600]*20), multiples of delta_t (None: n_periods periods of delta_t).
+            The forecasts are averaged over the periods, the plan is returned with the resolution delta_t (outputs are held, states interpolated)
+        solution_cache : SolutionCache, reuse the plans of earlier solves with the same (quantized) state inputs and forecasts, only optimal plans are stored
         '''
         self.name       = name
         self.n_periods  = n_periods
         self.delta_t    = delta_t
+
+        self.period_durations = np.full(n_periods, delta_t) if period_durations is None else np.asarray(period_durations)
+        if len(self.period_durations) != n_periods:
+            raise ValueError(f'Expected {n_periods} period durations, got {len(self.period_durations)}')
+        if np.any(self.period_durations % delta_t) or np.any(self.period_durations <= 0):
+            raise ValueError(f'The period durations need to be positive multiples of delta_t ({delta_t} s)')
+        self._steps_per_period = (self.period_durations // delta_t).astype(int) # controller steps of every period
+        self._blocked = bool(np.any(self._steps_per_period > 1))
+        self.horizon  = int(self._steps_per_period.sum()) # number of controller steps covered by the periods
         self.inputs = []
         self.outputs = []
         
@@ -33,44 +73,104 @@ class MPController():
         self.return_future_state = return_future_state
         self.return_future_control_output = return_future_control_output
 
-        # self.solver = Highs() # 
-        self.solver = pyo.SolverFactory(pyo_solver_name)
-        # self.solver = Gurobi()
+        self.tee = tee
+        self.print_model = print_model
 
-        # make Energy Community model
-        self.model      = pyo.ConcreteModel()
+        self.warm_start = warm_start
+
+        self.replan_on_event     = replan_on_event
+        self.state_tolerance     = state_tolerance
+        self.forecast_tolerance  = forecast_tolerance
+        self.max_replan_interval = max_replan_interval
+        self._plan     = None
+        self._plan_age = 0
+        self.n_steps   = 0
+        self.n_solves  = 0
+        self.n_cache_hits = 0 # steps that used a plan of the solution cache
+        self._has_solution = False
+
+        self.time_limit   = time_limit
+        self.gap_limit    = gap_limit
+        self.threads      = threads
+        self.safe_outputs = safe_outputs
+        self.fallback_counts = {'optimal': 0, 'incumbent': 0, 'previous_plan': 0, 'safe_default': 0}
+        self.relaxation_counts = {'valid': 0, 'repaired': 0, 'milp': 0} # solves with relaxed binaries, see _solve_verified
 
-        self.model.timepoints = pyo.RangeSet(0, n_periods) # Range of timepoints
-        self.model.periods    = pyo.RangeSet(0, n_periods-1) # Range of periods
-        self.model.delta_t    = pyo.Param(initialize=delta_t) # s
+        self.return_telemetry = return_telemetry
+        self.telemetry = SolverTelemetry(telemetry_capacity)
+        if return_telemetry:
+            self.outputs += ['telemetry'+sep+field for field in TELEMETRY_FIELDS]
+
+        self.persistent = persistent
+        self._instance_loaded = False
+        self._setup_backend(pyo_solver_name)
 
         self.components = [] # list of components that get added via add_model (they need to follow a specific syntax! see examples)
         self.forcasters = [] # list of forcasters that get added via add_model (they need to follow a specific syntax! see examples)    
 
+        # handles of the pyomo components, resolved once in add_model/add_forcaster
+        self._state_bindings      = [] # (input name, scalar pyo.Param)
+        self._forecast_bindings   = [] # (forecast name, IndexedBinding of the pyo.Param)
+        self._forecast_views      = {} # forecast name: the forecaster returns numpy views (get_forcast(time, copy=False))
+        self._output_bindings     = {} # output name: IndexedBinding of the pyo.Var
+        self._trajectory_bindings = {} # state name: IndexedBinding of the pyo.Var
+
+        self._shared_blocks = {} # shared variable: [pyo.Block], see finalize
+        self._stale_shares  = set() # shared variables whose sum constraint needs to be (re)built
+
+        self.solution_cache = solution_cache
+        self._signature     = None # see _cache_signature
+
+    def _setup_backend(self, pyo_solver_name):
+        '''create the solver and the (empty) model, subclasses with another backend override this'''
+        if self.persistent:
+            if pyo_solver_name not in PERSISTENT_SOLVERS:
+                raise ValueError(f'No persistent solver available for "{pyo_solver_name}", use one of {list(PERSISTENT_SOLVERS)}')
+            self.solver = PERSISTENT_SOLVERS[pyo_solver_name]()
+            self.solver.config.stream_solver = self.tee
+            self.solver.config.warmstart = self.warm_start
+            # after the instance is loaded only the mutable parameters (states, forecasts) change
+            self.solver.update_config.check_for_new_or_removed_constraints = False
+            self.solver.update_config.check_for_new_or_removed_vars = False
+            self.solver.update_config.check_for_new_or_removed_params = False
+            self.solver.update_config.check_for_new_objective = False
+            self.solver.update_config.update_constraints = False
+            self.solver.update_config.update_vars = False
+            self.solver.update_config.update_named_expressions = False
+            self.solver.update_config.update_objective = False
+        else:
+            self.solver = pyo.SolverFactory(pyo_solver_name)
+
+        self._budgeted = self.time_limit is not None or self.gap_limit is not None or self.threads is not None
+        if self._budgeted:
+            if pyo_solver_name not in PERSISTENT_SOLVERS:
+                raise ValueError(f'Solve budgets are not supported for "{pyo_solver_name}", use one of {list(PERSISTENT_SOLVERS)}')
+            self.solver.config.time_limit = self.time_limit
+            self.solver.config.mip_gap = self.gap_limit
+            if self.threads is not None:
+                options, key = THREAD_OPTIONS[pyo_solver_name]
+                getattr(self.solver, options)[key] = self.threads
+            # a solve that hits the budget without a feasible solution must not raise, solutions are loaded in _solve
+            self.solver.config.load_solution = False
+
+        # make Energy Community model
+        self.model      = pyo.ConcreteModel()
+
+        self.model.timepoints = pyo.RangeSet(0, self.n_periods) # Range of timepoints
+        self.model.periods    = pyo.RangeSet(0, self.n_periods-1) # Range of periods
+        self.model.delta_t    = pyo.Param(initialize=self.delta_t) # s
+        self.model.dt         = pyo.Param(self.model.periods, initialize=dict(enumerate(self.period_durations.tolist()))) # s, per period
+
     def add_model(self, component:MILPModelProto):
         '''add a model which needs to follow the given structure, see the examples'''
         # add components to the list of components
         self.components += [component]
-        # Add constraints as a block to the EC model:
-        self.model.add_component(component.name, pyo.Block(rule=component.pyo_block_rule))
-
+        self._signature = None
         # append model inputs, outputs and shared values 
         self.inputs += [component.name+self.sep+si for si in component.state_inputs]
         self.outputs += [component.name+self.sep+o for o in component.controll_outputs]
 
-        for shared in component.shares:
-            if shared not in self.shared_vars:
-                # Add expression and Constraint for shared variable to the model
-                self.shared_vars.add(shared)
-                self.model.add_component('sum_expr_'+shared, pyo.Expression(self.model.periods, rule=0))
-                rule = lambda m, p: m.find_component('sum_expr_'+shared)[p] == 0
-                self.model.add_component('sum_constraint_'+shared, 
-                                         pyo.Constraint(self.model.periods, rule=rule))
-            # Add the shared variable to the corresponding Expression
-            comp = self.model.find_component(component.name)
-            shared_attr = comp.find_component(shared)
-            for p in self.model.periods:
-                self.model.find_component('sum_expr_'+shared)[p] += shared_attr[p]
+        self._add_block(component)
 
         # modify output
         if self.return_future_control_output:
@@ -80,6 +180,45 @@ class MPController():
             if hasattr(component, 'states'):
                 self.outputs += [component.name+self.sep+state+'_future' for state in component.states]
 
+    def _add_block(self, component:MILPModelProto):
+        '''add the pyomo block of the component, bind its inputs and outputs and add its shared variables to the sum constraints'''
+        # the structure of the model changes, a persistent solver has to reload it
+        self._instance_loaded = False
+        # Add constraints as a block to the EC model:
+        self.model.add_component(component.name, pyo.Block(rule=component.pyo_block_rule))
+
+        # bind the inputs and outputs of the block
+        block = self.model.find_component(component.name)
+        for state_name in component.state_inputs:
+            self._state_bindings += [(component.name+self.sep+state_name, block.find_component(state_name))]
+        for out_name in component.controll_outputs:
+            self._output_bindings[component.name+self.sep+out_name] = IndexedBinding(block.find_component(out_name))
+        for state in getattr(component, 'states', []):
+            self._trajectory_bindings[component.name+self.sep+state] = IndexedBinding(block.find_component(state))
+
+        # the sum constraints are built once in finalize
+        for shared in component.shares:
+            self.shared_vars.add(shared)
+            self._shared_blocks.setdefault(shared, []).append(block)
+            self._stale_shares.add(shared)
+
+    def finalize(self):
+        '''build the sum expressions and constraints of the shared variables (sum over all blocks == 0),
+        called before every solve, only the sums of shared variables of models added since the last call are (re)built'''
+        for shared in [shared for shared in self._shared_blocks if shared in self._stale_shares]:
+            for name in ['sum_constraint_'+shared, 'sum_expr_'+shared]:
+                if self.model.component(name) is not None:
+                    self.model.del_component(name)
+            variables = [block.find_component(shared) for block in self._shared_blocks[shared]]
+            expr = pyo.Expression(self.model.periods, rule=lambda m, p: pyo.quicksum(var[p] for var in variables))
+            self.model.add_component('sum_expr_'+shared, expr)
+            self.model.add_component('sum_constraint_'+shared, pyo.Constraint(self.model.periods, rule=lambda m, p: expr[p] == 0))
+        self._stale_shares = set()
+
+    def _bind_forecast(self, for_model:MILPModelProto, for_var:str):
+        '''returns the binding of the forecast input for_var of the block of for_model'''
+        return IndexedBinding(self.model.find_component(for_model.name).find_component(for_var))
+
     def add_forcaster(self, forcaster:ForcastingProto, for_model:MILPModelProto, for_var:str):
         '''Adds a forcasting objct to the controller for a model input of the MILP model
         Parameters
@@ -101,8 +240,10 @@ class MPController():
             self.inputs += [pre+inp]
         
         self.forcasters += [(pre, for_var, forcaster)]
+        self._forecast_bindings += [(complete_for_var, self._bind_forecast(for_model, for_var))]
+        self._forecast_views[complete_for_var] = 'copy' in inspect.signature(forcaster.get_forcast).parameters
 
-        forcaster.set_forcast_length(self.n_periods)
+        forcaster.set_forcast_length(self.horizon)
         if hasattr(forcaster, 'set_delta_t'):
             forcaster.set_delta_t(self.delta_t)
 
@@ -111,7 +252,42 @@ class MPController():
             self.outputs += [complete_for_var]
 
     def step(self, time, **inputs):      
-        # update forecasters with input data
+        forecasts = self.forecast(time, inputs)
+
+        self.n_steps += 1
+        if not self.replan_on_event or self._replan_required(inputs, forecasts):
+            self._update_plan(inputs, forecasts)
+        else:
+            # replay the cached plan
+            self._plan_age += 1
+            self.telemetry.record(False)
+
+        outputs = self._plan_outputs(self._plan, self._plan_age)
+
+        if self.return_forcast:
+            outputs.update({name: np.asarray(values, dtype=float).tolist() for name, values in forecasts.items()})
+
+        if self.return_telemetry:
+            for field, value in self.telemetry.last().items():
+                outputs['telemetry'+self.sep+field] = value
+
+        return outputs
+
+    def state_names(self) -> list:
+        '''names of the state inputs of the components (e.g. 'bes.E_BES_0'), keys of the states of solve_for'''
+        return [name for name, _ in self._state_bindings]
+
+    def forecast_names(self) -> list:
+        '''names of the forecasts (e.g. 'EC.forecast.P_resid_ec'), keys of the forecasts of forecast and solve_for'''
+        return [name for name, _ in self._forecast_bindings]
+
+    def output_names(self) -> list:
+        '''names of the control outputs of the first period (without future outputs, forecasts and telemetry)'''
+        return list(self._output_bindings)
+
+    def forecast(self, time, inputs) -> dict:
+        '''update the forecasters with the input data (inputs of step) and return the forecasts
+        (read-only numpy views of the forecasters that support get_forcast(time, copy=False), valid until the next forecast)'''
         for pre, _, forecaster in self.forcasters:
             # map inputs for forcasters
             forc_inputs = {inp: inputs[pre+inp] for inp in forecaster.inputs}
@@ -120,53 +296,354 @@ class MPController():
         # create forecasts
         forecasts = {}
         for pre, for_var, forecaster in self.forcasters:
-            forecasts[pre+for_var] = forecaster.get_forcast(time)
+            if self._forecast_views[pre+for_var]:
+                forecasts[pre+for_var] = forecaster.get_forcast(time, copy=False)
+            else:
+                forecasts[pre+for_var] = forecaster.get_forcast(time)
+        return forecasts
+
+    def solve_for(self, states:dict, forecasts:dict, fixed_outputs=None):
+        '''solve the problem for given state inputs and forecasts without the forecasters and the plan of step (e.g. offline)
+
+        Parameters
+        ----------
+        states : dict, value of every state input (e.g. {'bes.E_BES_0': 3600})
+        forecasts : dict, values of every forecast over the horizon (e.g. {'EC.forecast.P_resid_ec': [...]})
+        fixed_outputs : dict, fix the control outputs of the first period (output name: value)
+
+        Returns
+        -------
+        dict of the control outputs of the first period and the objective value ('objective'), None if there is no solution'''
+        self.finalize()
+        for name, param in self._state_bindings:
+            param.set_value(states[name])
+        for name, binding in self._forecast_bindings:
+            binding.set_values(self._to_periods(forecasts[name][:self.horizon]))
+
+        self._fix_first_outputs(fixed_outputs or {})
+        try:
+            results = self._solve_verified()
+            outcome = self._solve_outcome(results)
+        except RuntimeError: # infeasible
+            outcome = None
+        finally:
+            self._fix_first_outputs({})
+        if outcome is None:
+            return None
+
+        solution = {name: float(binding.get_values()[0]) for name, binding in self._output_bindings.items()}
+        solution['objective'] = self._solve_info(results)['objective']
+        return solution
+
+    def _fix_first_outputs(self, values:dict) -> None:
+        '''fix the control outputs of the first period to the values, the others are released'''
+        for name, binding in self._output_bindings.items():
+            var = binding[0]
+            if name in values:
+                var.fix(values[name])
+            else:
+                var.unfix()
+            if self.persistent and self._instance_loaded:
+                self.solver.update_variables([var])
+
+    def _update_plan(self, inputs, forecasts) -> None:
+        '''set a new plan for the inputs and forecasts: from the solution cache or by solving the model (see the fallback policy for solves that hit the budget)'''
+        cache_key = None
+        if self.solution_cache is not None:
+            states = {name: inputs[name] for name, _ in self._state_bindings}
+            cache_key = self.solution_cache.key(self._cache_signature(), states, {name: values[:self.horizon] for name, values in forecasts.items()})
+            plan = self.solution_cache.get(cache_key)
+            if plan is not None:
+                self._plan = plan
+                self._plan_age = 0
+                self.n_cache_hits += 1
+                self.telemetry.record(False, status='cached')
+                return
 
+        self.finalize()
+        start = perf_counter()
         # initialize component states
-        for comp in self.components:
-            for state_name in comp.state_inputs:
-                self.model.find_component(comp.name).__setattr__(state_name, inputs[comp.name+self.sep+state_name])
+        for name, param in self._state_bindings:
+            param.set_value(inputs[name])
 
         # initialize component with forecasts
-        for comp in self.components:
-            opt_comp = self.model.find_component(comp.name)
-            for for_var in comp.forcast_inputs:
-                opt_forc_attr = opt_comp.__getattribute__(for_var)
-                
-                pre = comp.name + self.sep + 'forecast' + self.sep
-                forec_values = forecasts[pre+for_var]
+        for name, binding in self._forecast_bindings:
+            binding.set_values(self._to_periods(forecasts[name][:self.horizon]))
+        update_time = perf_counter() - start
+
+        if self.print_model:
+            self.model.pprint()
+        start = perf_counter()
+        solver_outpt = self._solve_verified()
+        solve_time = perf_counter() - start
+        self.n_solves += 1
+        self.telemetry.record(True, update_time, solve_time, **self._solve_info(solver_outpt))
+
+        outcome = self._solve_outcome(solver_outpt)
+        if outcome is not None:
+            self._plan = self._read_plan(forecasts)
+            self._plan_age = 0
+        elif self._plan is not None and self._plan_age+1 < self.horizon:
+            # budget hit without a feasible solution, continue with the shifted previous plan
+            outcome = 'previous_plan'
+            self._plan_age += 1
+        else:
+            outcome = 'safe_default'
+            self._plan = self._safe_plan(forecasts)
+            self._plan_age = 0
+        self.fallback_counts[outcome] += 1
+
+        if outcome == 'optimal' and cache_key is not None:
+            self.solution_cache.put(cache_key, self._plan)
 
-                for p in self.model.periods:
-                    opt_forc_attr.__setitem__(p, forec_values[p])
+    def _cache_signature(self) -> str:
+        '''identifies the optimization problem apart from the inputs: horizon and the parameters of the components
+        (cache_signature() of a component if it has one, otherwise all its plain attributes, see _component_parameters)'''
+        if self._signature is None:
+            components = [(type(comp).__name__, comp.cache_signature() if hasattr(comp, 'cache_signature') else self._component_parameters(comp)) for comp in self.components]
+            self._signature = repr((self.delta_t, self.period_durations.tolist(), components))
+        return self._signature
 
-        self.model.pprint()
-        solver_outpt = self.solver.solve(self.model, tee=True)
+    @staticmethod
+    def _component_parameters(component) -> list:
+        '''(name, value) of all public attributes of a component that are numbers, strings, None or sequences and arrays of them,
+        bound methods (e.g. a block rule selected in __init__) are identified by their name, other objects are skipped'''
+        plain = (int, float, str, bool, np.number, np.bool_, type(None))
+        parameters = []
+        for name, value in sorted(vars(component).items()):
+            if name.startswith('_'):
+                continue
+            if isinstance(value, np.ndarray):
+                value = value.tolist()
+            if isinstance(value, (list, tuple)) and all(isinstance(v, plain) for v in value):
+                parameters += [(name, list(value))]
+            elif isinstance(value, plain):
+                parameters += [(name, value)]
+            elif inspect.ismethod(value):
+                parameters += [(name, value.__func__.__qualname__)]
+        return parameters
 
-        # get outputs from models
+    def replan_statistics(self) -> dict:
+        '''returns the number of steps, solves, plans taken from the solution cache and the share of steps that replayed the current plan'''
+        skipped = self.n_steps - self.n_solves - self.n_cache_hits
+        return {
+            'steps': self.n_steps,
+            'solves': self.n_solves,
+            'cache_hits': self.n_cache_hits,
+            'skipped': skipped,
+            'skip_ratio': skipped / self.n_steps if self.n_steps else 0.,
+            }
+
+    def _read_plan(self, forecasts) -> dict:
+        '''read the optimal trajectories of the control outputs and states (and the forecasts they are based on) from the solved model'''
+        plan = {'outputs': {}, 'states': {}, 'forecasts': {}}
+        for name, binding in self._output_bindings.items():
+            plan['outputs'][name] = self._to_steps(binding.get_values())
+        for name, binding in self._trajectory_bindings.items():
+            plan['states'][name] = self._to_steps(binding.get_values(), timepoints=True)
+        for name, values in forecasts.items():
+            plan['forecasts'][name] = np.array(values, dtype=float)
+        return plan
+
+    def _safe_plan(self, forecasts) -> dict:
+        '''plan that holds the safe outputs, the state trajectories are unknown (nan), which triggers a replan in the next step'''
+        plan = {'outputs': {}, 'states': {}, 'forecasts': {}}
+        for name in self._output_bindings:
+            plan['outputs'][name] = np.full(self.horizon, float(self._per_name(self.safe_outputs, name)))
+        for name in self._trajectory_bindings:
+            plan['states'][name] = np.full(self.horizon+1, np.nan)
+        for name, values in forecasts.items():
+            plan['forecasts'][name] = np.array(values, dtype=float)
+        return plan
+
+    def _to_periods(self, values) -> np.ndarray:
+        '''average values with the resolution delta_t over the (blocked) periods (a copy, the forecasts are views of the forecasters)'''
+        values = np.array(values, dtype=float)
+        if not self._blocked:
+            return values
+        return np.add.reduceat(values, np.cumsum(self._steps_per_period) - self._steps_per_period) / self._steps_per_period
+
+    def _to_steps(self, values, timepoints=False) -> np.ndarray:
+        '''values of the (blocked) periods with the resolution delta_t, period values are held, timepoint values are interpolated'''
+        if not self._blocked:
+            return values
+        if timepoints:
+            return np.interp(np.arange(self.horizon+1), np.append(0, np.cumsum(self._steps_per_period)), values)
+        return np.repeat(values, self._steps_per_period)
+
+    def _plan_outputs(self, plan, age) -> dict:
+        '''outputs of a plan that was computed age steps ago, future values beyond the horizon repeat the last value'''
         outputs = {}
+        for name, values in plan['outputs'].items():
+            outputs[name] = float(values[age])
+
+        if self.return_future_control_output:
+            for name, values in plan['outputs'].items():
+                outputs[name+'_future'] = np.append(values[age:], np.full(age, values[-1])).tolist()
+
+        if self.return_future_state:
+            for name, values in plan['states'].items():
+                outputs[name+'_future'] = np.append(values[age:], np.full(age, values[-1])).tolist()
+        return outputs
+
+    def _replan_required(self, inputs, forecasts) -> bool:
+        '''checks if the cached plan can be replayed for another step or if a new solve is triggered
+        (no plan, plan exhausted, max_replan_interval elapsed, state drift or forecast change beyond the tolerance)'''
+        if self._plan is None:
+            return True
+
+        age = self._plan_age + 1
+        if age >= self.horizon:
+            return True
+        if self.max_replan_interval is not None and age >= self.max_replan_interval:
+            return True
+
+        # measured states vs. planned state trajectory (state_inputs[i] initializes states[i])
         for comp in self.components:
-            pyo_comp = self.model.find_component(comp.name)
-            for out_name in comp.controll_outputs:
-                outputs[comp.name+self.sep+out_name] = pyo.value(pyo_comp.__getattribute__(out_name)[0])
-                # outputs[out_name+'_of_'+comp.name] = pyo.value(pyo_comp.__getattribute__(out_name)[0])
+            for state_input, state in zip(comp.state_inputs, getattr(comp, 'states', [])):
+                name = comp.name+self.sep+state_input
+                planned = self._plan['states'][comp.name+self.sep+state][age]
+                if not abs(inputs[name] - planned) <= self._per_name(self.state_tolerance, name):
+                    return True
 
-        if self.return_forcast:
-            outputs.update(forecasts)
+        # new forecasts vs. the forecasts the plan is based on (overlapping periods)
+        for name, values in forecasts.items():
+            deviation = np.abs(np.asarray(values, dtype=float)[:self.horizon-age] - self._plan['forecasts'][name][age:])
+            if not np.all(deviation <= self._per_name(self.forecast_tolerance, name)):
+                return True
 
-        if self.return_future_control_output: 
-            for comp in self.components:
-                pyo_comp = self.model.find_component(comp.name)
-                for out_name in comp.controll_outputs:
-                    # outputs[out_name+'_of_'+comp.name+ '_future'] = [pyo.value(pyo_comp.__getattribute__(out_name)[i]) for i in self.model.periods]
-                    outputs[comp.name+self.sep+out_name+'_future'] = [pyo.value(pyo_comp.__getattribute__(out_name)[i]) for i in self.model.periods]
+        return False
 
-        if self.return_future_state:
-            for comp in self.components:
-                pyo_comp = self.model.find_component(comp.name)
-                if hasattr(comp, 'states'):
-                    for states in comp.states:
-                        outputs[comp.name+self.sep+states+'_future'] = [pyo.value(pyo_comp.__getattribute__(states)[i]) for i in self.model.timepoints]
-                        # outputs[states+'_of_'+comp.name + '_future'] = [pyo.value(pyo_comp.__getattribute__(states)[i]) for i in self.model.timepoints]
+    @staticmethod
+    def _per_name(setting, name) -> float:
+        '''value of a setting that is either given for all names or as dict per name (default 0)'''
+        if isinstance(setting, dict):
+            return setting.get(name, 0.)
+        return setting
 
-        return outputs
-    
+    def _solve_verified(self):
+        '''_solve with the binaries that the components allow to relax (relaxed_binaries) relaxed to [0, 1],
+        then the components verify and repair their solution (repair_relaxation).
+        If a component can not repair its solution, the model is solved again as MILP (counted in self.relaxation_counts).
+        The binaries are only relaxed during this solve, the model keeps them as integers otherwise'''
+        relaxed = [comp for comp in self.components if getattr(comp, 'relaxed_binaries', None)]
+        if not relaxed:
+            return self._solve()
+
+        self._set_integrality(relaxed, False)
+        try:
+            results = self._solve()
+            try:
+                if self._solve_outcome(results) is None:
+                    return results
+            except RuntimeError: # raised again by the caller
+                return results
+
+            checks = {}
+            for comp in relaxed:
+                checks[comp.name] = comp.repair_relaxation(*self._block_accessors(comp), self.period_durations)
+            invalid = [comp for comp in relaxed if checks[comp.name] is None]
+            if not invalid:
+                self.relaxation_counts['repaired' if 'repaired' in checks.values() else 'valid'] += 1
+                return results
+
+            self.relaxation_counts['milp'] += 1
+            self._set_integrality(invalid, True)
+            self._has_solution = False # the relaxed solution is not shifted
+            return self._solve()
+        finally:
+            self._set_integrality(relaxed, True)
+
+    def _block_accessors(self, component):
+        '''get_values(var_name) and set_values(var_name, values) of the solution of the variables of the block of a component'''
+        block = self.model.find_component(component.name)
+        get_values = lambda name: IndexedBinding(block.find_component(name)).get_values()
+        def set_values(name, values):
+            for var, value in zip(block.find_component(name).values(), values):
+                var.set_value(float(value), skip_validation=True)
+        return get_values, set_values
+
+    def _set_integrality(self, components, integer) -> None:
+        '''restore (integer=True) or relax the relaxed_binaries of the components'''
+        for comp in components:
+            block = self.model.find_component(comp.name)
+            for name in comp.relaxed_binaries:
+                variables = list(block.find_component(name).values())
+                for var in variables:
+                    var.domain = pyo.Binary if integer else pyo.UnitInterval
+                if self.persistent and self._instance_loaded:
+                    self.solver.update_variables(variables)
+
+    def _solve(self):
+        '''solve the model, a persistent solver only gets the updated parameter values once the instance is loaded'''
+        if self.warm_start and self._has_solution:
+            self._shift_solution()
+
+        if not self.persistent:
+            kwargs = {'tee': self.tee}
+            if self.warm_start:
+                kwargs['warmstart'] = True
+            if self._budgeted:
+                # the legacy interface overwrites the time limit and load_solution of the solver config
+                kwargs.update(timelimit=self.time_limit, load_solutions=False)
+            results = self.solver.solve(self.model, **kwargs)
+        else:
+            if not self._instance_loaded:
+                self.solver.set_instance(self.model)
+                self._instance_loaded = True
+            results = self.solver.solve(self.model)
+
+        if self._budgeted and self._feasible_objective(results) is not None:
+            self.solver.load_vars()
+
+        self._has_solution = True
+        return results
+
+    def _feasible_objective(self, results):
+        '''objective value of the best feasible solution (None if there is none)'''
+        objective = results.best_feasible_objective if self.persistent else results.problem.upper_bound
+        if objective is None or not np.isfinite(objective):
+            return None
+        return objective
+
+    def _solve_outcome(self, results):
+        '''optimal, incumbent (a budget was hit, the best feasible solution is used) or None (a budget was hit without a feasible solution)'''
+        status = results.termination_condition.name if self.persistent else str(results.solver.termination_condition)
+        if status == 'optimal':
+            return 'optimal'
+        if status not in BUDGET_TERMINATIONS:
+            raise RuntimeError(f'The solver did not find an optimal solution: {status}')
+        return 'incumbent' if self._feasible_objective(results) is not None else None
+
+    def _solve_info(self, results) -> dict:
+        '''status, mip gap, node count and objective value of the results of _solve (for SolverTelemetry)'''
+        if self.persistent:
+            status = results.termination_condition.name
+            bound  = results.best_objective_bound
+        else:
+            status = str(results.solver.termination_condition)
+            bound  = results.problem.lower_bound
+        objective = self._feasible_objective(results)
+        objective = np.nan if objective is None else float(objective)
+        bound     = np.nan if bound is None else float(bound)
+
+        # the appsi solvers keep a handle of the underlying solver model
+        node_count = np.nan
+        solver_model = getattr(self.solver, '_solver_model', None)
+        if hasattr(solver_model, 'getInfo'): # highspy
+            node_count = solver_model.getInfo().mip_node_count
+        elif hasattr(solver_model, 'NodeCount'): # gurobipy
+            node_count = solver_model.NodeCount
+
+        return {'status': status, 'mip_gap': mip_gap(objective, bound), 'node_count': node_count, 'objective': objective}
+
+    def _shift_solution(self):
+        '''shift the values of all variables indexed by periods or timepoints one period forward (receding horizon),
+        the new tail period repeats the last value. The shifted values serve as MIP start for the next solve
+        (with blocked periods the shift is only an approximation of the next solution).'''
+        for var in self.model.component_objects(pyo.Var, descend_into=True):
+            if var.index_set() is not self.model.periods and var.index_set() is not self.model.timepoints:
+                continue
+            values = [v.value for v in var.values()]
+            for v, val in zip(var.values(), values[1:]):
+                v.set_value(val, skip_validation=True)
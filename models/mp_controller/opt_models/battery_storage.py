@@ -1,7 +1,8 @@
 import pyomo.environ as pyo
+import numpy as np
 
 class BES_MILP_model():
-    def __init__(self, name, E_min=0., E_max=20_000.*3600, P_max_cha=20_000., P_max_dis=20_000., eta_cha=0.95, eta_dis=0.95):
+    def __init__(self, name, E_min=0., E_max=20_000.*3600, P_max_cha=20_000., P_max_dis=20_000., eta_cha=0.95, eta_dis=0.95, relax_binary=False):
         '''
         A battery energy storag model with charging and discharging efficiencies.
         The model needs to be used in an parent model to function correctly!
@@ -9,6 +10,7 @@ class BES_MILP_model():
         - model.timepoints : pyo.RangeSet, timepoints of the simulation
         - model.periods : pyo.RangeSet, eriods of the simulation
         - model.delta_t : pyo.Param, timedelta of the simulation
+        - model.dt : pyo.Param indexed by model.periods, duration of the periods in s
         
         Parameter:
         ---------
@@ -17,7 +19,10 @@ class BES_MILP_model():
         P_max_cha : maximum charging power in W
         P_max_dis : maximum discharging powre in W
         eta_cha : float [0, 1] charging efficiency (no unit)
-        eta_dis : float [0, 1] discharging efficiency (no unit)'''
+        eta_dis : float [0, 1] discharging efficiency (no unit)
+        relax_binary : bool, allow a controller to relax the binary that prevents simultaneous charging and discharging to [0, 1] (pure LP).
+            The block is always built with the binary, only a controller that verifies the relaxed solution (see MPController._solve_verified
+            and repair_relaxation) relaxes it and solves the MILP if the solution can not be repaired'''
 
         # Parameters
         self.name      = name
@@ -27,6 +32,7 @@ class BES_MILP_model():
         self.P_max_dis = P_max_dis # W
         self.eta_cha   = eta_cha # 1
         self.eta_dis   = eta_dis # 1
+        self.relax_binary = relax_binary
 
         # config info
         self.state_inputs     = ['E_BES_0'] # inputs to the state, needs to be a Parameter of the pyo.Block
@@ -34,6 +40,7 @@ class BES_MILP_model():
         self.forcast_inputs   = [] # inputs for forecast values, needs to be a Parameter of the pyo.Block with index model.periods
         self.controll_outputs = ['P_el'] # outputs to the controller, needs to be a Variable of the pyo.Block with index model.periods
         self.shares           = ['P_el'] # connection to other variables (following egoistic sign logic, + is consumption, -is feedin) needs to be a pyo.Variable with index model.periods
+        self.relaxed_binaries = ['bool'] if relax_binary else [] # binaries that a verifying controller may relax to [0, 1], see repair_relaxation
 
     def pyo_block_rule(self, block):
         model = block.model()
@@ -48,11 +55,11 @@ class BES_MILP_model():
         # helper Variables
         block.P_el_cha  = pyo.Var(model.periods, domain=pyo.NonNegativeReals) # Electrical charging Power in W (helper)
         block.P_el_dis  = pyo.Var(model.periods, domain=pyo.NonNegativeReals) # Electrical discharging Power in W (helper)
-        block.bool      = pyo.Var(model.periods, domain=pyo.Boolean) # prevent same time charging and discharging
+        block.bool      = pyo.Var(model.periods, domain=pyo.Boolean) # prevent same time charging and discharging (1: charging, 0: discharging)
 
         @block.Constraint(model.periods)
         def energy_balance(block, p):
-            return block.E[p+1] == block.E[p] + (block.P_el_cha[p] * self.eta_cha - block.P_el_dis[p] / self.eta_dis) * model.delta_t
+            return block.E[p+1] == block.E[p] + (block.P_el_cha[p] * self.eta_cha - block.P_el_dis[p] / self.eta_dis) * model.dt[p]
         
         @block.Constraint(model.periods)
         def output_power(block, p):
@@ -64,8 +71,64 @@ class BES_MILP_model():
         
         @block.Constraint(model.periods)
         def power_limit_bool_dis(block, p):
-            return block.P_el_dis[p] <= block.bool[p] * self.P_max_dis
+            return block.P_el_dis[p] <= (1 - block.bool[p]) * self.P_max_dis
 
         @block.Constraint()
         def initial_condition(block):
-            return block.E[0] == block.E_BES_0
\ No newline at end of file
+            return block.E[0] == block.E_BES_0
+
+    def matrix_block_rule(self, block):
+        model = block.model
+        dt = model.dt # s, per period
+
+        # Inputs
+        E_BES_0   = block.param('E_BES_0') # J
+
+        # Variables / Outputs
+        E         = block.var('E', 'timepoints', lb=self.E_min, ub=self.E_max) # J
+        P_el      = block.var('P_el', 'periods') # W
+
+        # helper Variables
+        P_el_cha  = block.var('P_el_cha', 'periods', lb=0) # W
+        P_el_dis  = block.var('P_el_dis', 'periods', lb=0) # W
+        bool_     = block.var('bool', 'periods', lb=0, ub=1, integer=True) # 1: charging, 0: discharging
+
+        # energy balance
+        block.constraint([(E[1:], 1.), (E[:-1], -1.), (P_el_cha, -self.eta_cha*dt), (P_el_dis, dt/self.eta_dis)])
+        # output power
+        block.constraint([(P_el, 1.), (P_el_cha, -1.), (P_el_dis, 1.)])
+        # power limits
+        block.constraint([(P_el_cha, 1.), (bool_, -self.P_max_cha)], lb=-np.inf, ub=0.)
+        block.constraint([(P_el_dis, 1.), (bool_, self.P_max_dis)], lb=-np.inf, ub=self.P_max_dis)
+        # initial condition
+        block.fix(E[:1], E_BES_0)
+
+    def repair_relaxation(self, get_values, set_values, dt):
+        '''verify the solution of the relaxed model: periods with simultaneous charging and discharging are netted
+        (P_el is kept, less energy is lost), which is valid if the energy stays within E_min and E_max
+
+        Parameters
+        ----------
+        get_values : callable, get_values(var_name) returns the solution values of a variable of the block
+        set_values : callable, set_values(var_name, values) sets the solution values of a variable of the block
+        dt : array, duration of the periods in s
+
+        Returns
+        -------
+        'valid', 'repaired' or None if the solution can not be repaired (the model needs to be solved with the binary)'''
+        P_el_cha, P_el_dis = get_values('P_el_cha'), get_values('P_el_dis')
+        tol = 1e-6 * max(self.P_max_cha, self.P_max_dis, 1.) # W
+        both = (P_el_cha > tol) & (P_el_dis > tol)
+        if both.any():
+            P_el = P_el_cha - P_el_dis
+            P_el_cha, P_el_dis = np.maximum(P_el, 0.), np.maximum(-P_el, 0.)
+            E = get_values('E')
+            E = E[0] + np.append(0., np.cumsum((P_el_cha * self.eta_cha - P_el_dis / self.eta_dis) * dt))
+            tol_E = 1e-6 * max(self.E_max, 1.) # J
+            if np.any(E < self.E_min - tol_E) or np.any(E > self.E_max + tol_E):
+                return None
+            set_values('P_el_cha', P_el_cha)
+            set_values('P_el_dis', P_el_dis)
+            set_values('E', np.clip(E, self.E_min, self.E_max))
+        set_values('bool', (P_el_cha > tol).astype(float))
+        return 'repaired' if both.any() else 'valid'
@@ -8,6 +8,7 @@ class DHW_MILP_model_Temp():
         - model.timepoints : pyo.RangeSet, timepoints of the simulation
         - model.periods : pyo.RangeSet, eriods of the simulation
         - model.delta_t : pyo.Param, timedelta of the simulation
+        - model.dt : pyo.Param indexed by model.periods, duration of the periods in s
         
         Parameter:
         ---------
@@ -49,12 +50,29 @@ class DHW_MILP_model_Temp():
 
         @block.Constraint(model.periods)
         def dhwh_tes_constraint_energy_balance(block, p):
-            return block.T_tes[p+1] == block.T_tes[p] + (block.P_el[p] * self.cop - block.dot_Q_demand[p]) * model.delta_t / self.C_tes
+            return block.T_tes[p+1] == block.T_tes[p] + (block.P_el[p] * self.cop - block.dot_Q_demand[p]) * model.dt[p] / self.C_tes
         
         block.tes_initial_condition = pyo.Constraint(rule=lambda block: block.T_tes[0] == block.T_tes_0)
 
         block.nominal_power         = pyo.Constraint(model.periods, rule=lambda block, p: block.P_el[p] == self.P_nom * block.on[p])
 
+    def matrix_block_rule(self, block):
+        dt = block.model.dt # s, per period
+
+        # parameters that change for every run
+        T_tes_0      = block.param('T_tes_0') # °C
+        dot_Q_demand = block.param('dot_Q_demand', 'periods') # W
+
+        # Variables
+        T_tes = block.var('T_tes', 'timepoints', lb=self.T_tes_min, ub=self.T_tes_max) # °C
+        on    = block.var('on', 'periods', lb=0, ub=1, integer=True) # 0/1
+        P_el  = block.var('P_el', 'periods', lb=0) # W
+
+        # Constraints
+        block.constraint([(T_tes[1:], 1.), (T_tes[:-1], -1.), (P_el, -self.cop*dt/self.C_tes)], rhs=[(dot_Q_demand, -dt/self.C_tes)])
+        block.fix(T_tes[:1], T_tes_0)
+        block.constraint([(P_el, 1.), (on, -self.P_nom)])
+
 
 class DHW_MILP_model(): 
     def __init__(self, name, eta=1, P_nom=7_000, E_tes_min=200*4200*10, E_tes_max=200*4200*40):
@@ -64,6 +82,7 @@ class DHW_MILP_model():
         - model.timepoints : pyo.RangeSet, timepoints of the simulation
         - model.periods : pyo.RangeSet, eriods of the simulation
         - model.delta_t : pyo.Param, timedelta of the simulation
+        - model.dt : pyo.Param indexed by model.periods, duration of the periods in s
         
         Parameter:
         ---------
@@ -104,12 +123,29 @@ class DHW_MILP_model():
 
         @block.Constraint(model.periods)
         def dhwh_tes_constraint_energy_balance(block, p):
-            return block.E_tes[p+1] == block.E_tes[p] + (block.P_el[p] * self.cop - block.dot_Q_demand[p]) * model.delta_t
+            return block.E_tes[p+1] == block.E_tes[p] + (block.P_el[p] * self.cop - block.dot_Q_demand[p]) * model.dt[p]
         
         block.tes_initial_condition = pyo.Constraint(rule=lambda block: block.E_tes[0] == block.E_tes_0)
 
         block.nominal_power         = pyo.Constraint(model.periods, rule=lambda block, p: block.P_el[p] == self.P_nom * block.on[p])
 
+    def matrix_block_rule(self, block):
+        dt = block.model.dt # s, per period
+
+        # parameters that change for every run
+        E_tes_0      = block.param('E_tes_0') # J
+        dot_Q_demand = block.param('dot_Q_demand', 'periods') # W
+
+        # Variables
+        E_tes = block.var('E_tes', 'timepoints', lb=self.E_tes_min, ub=self.E_tes_max) # J
+        on    = block.var('on', 'periods', lb=0, ub=1, integer=True) # 0/1
+        P_el  = block.var('P_el', 'periods', lb=0) # W
+
+        # Constraints
+        block.constraint([(E_tes[1:], 1.), (E_tes[:-1], -1.), (P_el, -self.cop*dt)], rhs=[(dot_Q_demand, -dt)])
+        block.fix(E_tes[:1], E_tes_0)
+        block.constraint([(P_el, 1.), (on, -self.P_nom)])
+
 
 class DHW_MILP_model_T_m(): 
     def __init__(self, name, P_nom=2_000, C_tes=4200*100, T_tes_min=10, T_tes_max=80, eta=1, T_out=50, T_in=12, c_p=4200):
@@ -119,6 +155,7 @@ class DHW_MILP_model_T_m():
         - model.timepoints : pyo.RangeSet, timepoints of the simulation
         - model.periods : pyo.RangeSet, eriods of the simulation
         - model.delta_t : pyo.Param, timedelta of the simulation
+        - model.dt : pyo.Param indexed by model.periods, duration of the periods in s
         
         Parameter:
         ---------
@@ -169,7 +206,7 @@ class DHW_MILP_model_T_m():
         # Constraints
         @block.Constraint(model.periods)
         def dhwh_tes_constraint_energy_balance(block, p):
-            return block.T_tes[p+1] == block.T_tes[p] + (block.P_el[p] * self.cop - (block.dot_m_demand[p] * self.c_p * (block.T_tes[p] - self.T_in))) * model.delta_t / self.C_tes
+            return block.T_tes[p+1] == block.T_tes[p] + (block.P_el[p] * self.cop - (block.dot_m_demand[p] * self.c_p * (block.T_tes[p] - self.T_in))) * model.dt[p] / self.C_tes
         
         @block.Constraint(model.periods)
         def dhwh_tes_constraint(block, p):
@@ -195,6 +232,7 @@ class DHW_MILP_model_T_m_slack():
         - model.timepoints : pyo.RangeSet, timepoints of the simulation
         - model.periods : pyo.RangeSet, eriods of the simulation
         - model.delta_t : pyo.Param, timedelta of the simulation
+        - model.dt : pyo.Param indexed by model.periods, duration of the periods in s
         
         Parameter:
         ---------
@@ -249,7 +287,7 @@ class DHW_MILP_model_T_m_slack():
         # Constraints
         @block.Constraint(model.periods)
         def dhwh_tes_constraint_energy_balance(block, p):
-            return block.T_tes[p+1] == block.T_tes[p] + (block.P_el[p] * self.cop - (block.dot_m_demand[p] * self.c_p * (block.T_tes[p] - self.T_in))) * model.delta_t / self.C_tes
+            return block.T_tes[p+1] == block.T_tes[p] + (block.P_el[p] * self.cop - (block.dot_m_demand[p] * self.c_p * (block.T_tes[p] - self.T_in))) * model.dt[p] / self.C_tes
         
         @block.Constraint(model.periods)
         def dhwh_tes_constraint(block, p):
@@ -276,6 +314,7 @@ class DHW_MILP_model_E_m():
         - model.timepoints : pyo.RangeSet, timepoints of the simulation
         - model.periods : pyo.RangeSet, eriods of the simulation
         - model.delta_t : pyo.Param, timedelta of the simulation
+        - model.dt : pyo.Param indexed by model.periods, duration of the periods in s
         
         Parameter:
         ---------
@@ -315,7 +354,7 @@ class DHW_MILP_model_E_m():
 
         @block.Constraint(model.periods)
         def dhwh_tes_constraint_energy_balance(block, p):
-            return block.E_tes[p+1] == block.E_tes[p] + (block.P_el[p] * self.cop - block.dot_Q_demand[p]) * model.delta_t
+            return block.E_tes[p+1] == block.E_tes[p] + (block.P_el[p] * self.cop - block.dot_Q_demand[p]) * model.dt[p]
         
         block.tes_initial_condition = pyo.Constraint(rule=lambda block: block.E_tes[0] == block.E_tes_0)
 
@@ -10,6 +10,7 @@ class DHW_MILP_model_Temp():
         - model.timepoints : pyo.RangeSet, timepoints of the simulation
         - model.periods : pyo.RangeSet, eriods of the simulation
         - model.delta_t : pyo.Param, timedelta of the simulation
+        - model.dt : pyo.Param indexed by model.periods, duration of the periods in s
         
         Parameter:
         ---------
@@ -62,7 +63,7 @@ class DHW_MILP_model_Temp():
 
         @block.Constraint(model.periods)
         def dhwh_tes_constraint_energy_balance(block, p):
-            return block.T_tes[p+1] == block.T_tes[p] + (self.P_nom * block.on[p] * self.cop - (block.dot_m_demand[p] * self.c_p * (block.T_tes[p] - self.T_in))) * model.delta_t / self.C_tes
+            return block.T_tes[p+1] == block.T_tes[p] + (self.P_nom * block.on[p] * self.cop - (block.dot_m_demand[p] * self.c_p * (block.T_tes[p] - self.T_in))) * model.dt[p] / self.C_tes
         
         @block.Constraint(model.periods)
         def dhwh_tes_constraint(block, p):
@@ -99,6 +100,31 @@ class DHW_MILP_model_Temp():
 
         block.nominal_power         = pyo.Constraint(model.periods, rule=lambda block, p: block.P_el[p] == self.P_nom * block.on[p] + block.slack_var[p]*1000)#+block.slack_var_up[p]*100000000000000)
 
+    def matrix_block_rule(self, block):
+        dt = block.model.dt # s, per period
+
+        # parameters that change for every run
+        T_tes_0        = block.param('T_tes_0') # °C
+        dot_m_demand   = block.param('dot_m_demand', 'periods') # kg/s
+        dot_m_demand_h = block.var('dot_m_demand_h', 'periods') # kg/s
+        slack_var      = block.var('slack_var', 'periods', lb=0)
+        dot_m_on       = block.var('dot_m_on', 'periods', lb=0, ub=1)
+
+        # Variables
+        T_tes = block.var('T_tes', 'timepoints', lb=self.T_tes_min, ub=self.T_tes_max) # °C
+        on    = block.var('on', 'periods', lb=0, ub=1, integer=True) # 0/1
+        P_el  = block.var('P_el', 'periods', lb=0) # W
+
+        # Constraints
+        k = self.c_p * dt / self.C_tes
+        # energy balance, the coefficient of T_tes[p] depends on dot_m_demand[p]
+        block.constraint([(T_tes[1:], 1.), (T_tes[:-1], -1., dot_m_demand, k), (on, -self.P_nom*self.cop*dt/self.C_tes)], rhs=[(dot_m_demand, k*self.T_in)])
+        block.constraint([(dot_m_demand_h, 1.), (dot_m_on, 0., dot_m_demand, -1.)])
+        block.constraint([(dot_m_demand_h, 1.)], rhs=[(dot_m_demand, 1.)])
+        block.constraint([(T_tes[:-1], 1.), (dot_m_on, -35.), (slack_var, 1.)], lb=0., ub=np.inf)
+        block.fix(T_tes[:1], T_tes_0)
+        block.constraint([(P_el, 1.), (on, -self.P_nom), (slack_var, -1000.)])
+
 
 class DHW_MILP_model(): 
     def __init__(self, name, eta=1, P_nom=7_000, E_tes_min=200*4200*10, E_tes_max=200*4200*40):
@@ -108,6 +134,7 @@ class DHW_MILP_model():
         - model.timepoints : pyo.RangeSet, timepoints of the simulation
         - model.periods : pyo.RangeSet, eriods of the simulation
         - model.delta_t : pyo.Param, timedelta of the simulation
+        - model.dt : pyo.Param indexed by model.periods, duration of the periods in s
         
         Parameter:
         ---------
@@ -147,9 +174,25 @@ class DHW_MILP_model():
 
         @block.Constraint(model.periods)
         def dhwh_tes_constraint_energy_balance(block, p):
-            return block.E_tes[p+1] == block.E_tes[p] + (block.P_el[p] * self.cop - block.dot_Q_demand[p]) * model.delta_t
+            return block.E_tes[p+1] == block.E_tes[p] + (block.P_el[p] * self.cop - block.dot_Q_demand[p]) * model.dt[p]
         
         block.tes_initial_condition = pyo.Constraint(rule=lambda block: block.E_tes[0] == block.E_tes_0)
 
         block.nominal_power         = pyo.Constraint(model.periods, rule=lambda block, p: block.P_el[p] == self.P_nom * block.on[p])
 
+    def matrix_block_rule(self, block):
+        dt = block.model.dt # s, per period
+
+        # parameters that change for every run
+        E_tes_0      = block.param('E_tes_0') # J
+        dot_Q_demand = block.param('dot_Q_demand', 'periods') # W
+
+        # Variables
+        E_tes = block.var('E_tes', 'timepoints', lb=self.E_tes_min, ub=self.E_tes_max) # J
+        on    = block.var('on', 'periods', lb=0, ub=1, integer=True) # 0/1
+        P_el  = block.var('P_el', 'periods', lb=0) # W
+
+        # Constraints
+        block.constraint([(E_tes[1:], 1.), (E_tes[:-1], -1.), (P_el, -self.cop*dt)], rhs=[(dot_Q_demand, -dt)])
+        block.fix(E_tes[:1], E_tes_0)
+        block.constraint([(P_el, 1.), (on, -self.P_nom)])
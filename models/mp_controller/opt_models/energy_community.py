@@ -8,6 +8,7 @@ class EC__Residual_Load_MILP_model():
         - model.timepoints : pyo.RangeSet, timepoints of the simulation
         - model.periods : pyo.RangeSet, eriods of the simulation
         - model.delta_t : pyo.Param, timedelta of the simulation
+        - model.dt : pyo.Param indexed by model.periods, duration of the periods in s
         
         Parameter:
         ---------
@@ -30,4 +31,11 @@ class EC__Residual_Load_MILP_model():
         # EC / Grid constraints:
         @block.Constraint(model.periods)
         def grid_constraint(b, p):
-            return (b.P_el[p] == b.P_resid_ec[p]) 
\ No newline at end of file
+            return (b.P_el[p] == b.P_resid_ec[p])
+
+    def matrix_block_rule(self, block):
+        P_el       = block.var('P_el', 'periods') # W
+        P_resid_ec = block.param('P_resid_ec', 'periods') # W
+
+        # EC / Grid constraints:
+        block.fix(P_el, P_resid_ec)
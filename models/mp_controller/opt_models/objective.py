@@ -9,6 +9,7 @@ class Objective():
         - model.timepoints : pyo.RangeSet, timepoints of the simulation
         - model.periods : pyo.RangeSet, eriods of the simulation
         - model.delta_t : pyo.Param, timedelta of the simulation
+        - model.dt : pyo.Param indexed by model.periods, duration of the periods in s
         
         Parameter:
         ---------
@@ -17,6 +18,7 @@ class Objective():
 
         # Parameters
         self.name      = name
+        self.objective = objective
 
         # config info
         self.state_inputs     = [] # inputs to the state, needs to be a Parameter of the pyo.Block
@@ -27,8 +29,10 @@ class Objective():
         match objective:
             case 'self-consumption':
                 self.pyo_block_rule = self._self_consumption_block_rule
+                self.matrix_block_rule = self._self_consumption_matrix_rule
             case 'self-consumption-slack':
                 self.pyo_block_rule = self._self_consumption_block_rule_w_slack
+                self.matrix_block_rule = self._self_consumption_matrix_rule_w_slack
                 self.shares = ['P_el', 'slack']
             case 'peak-power':
                 raise NotImplementedError('Not Yet Implemented')
@@ -65,4 +69,20 @@ class Objective():
         
         @block.Objective(sense=pyo.minimize)
         def objective_rule(b):
-            return pyo.quicksum(b.P_resid_plus[p]+b.P_resid_minus[p] - block.slack[p] for p in model.periods)
\ No newline at end of file
+            return pyo.quicksum(b.P_resid_plus[p]+b.P_resid_minus[p] - block.slack[p] for p in model.periods)
+
+    def _self_consumption_matrix_rule(self, block):
+        P_el          = block.var('P_el', 'periods') # W
+        P_resid_plus  = block.var('P_resid_plus', 'periods', lb=0) # W
+        P_resid_minus = block.var('P_resid_minus', 'periods', lb=0) # W
+
+        block.constraint([(P_resid_plus, 1.), (P_resid_minus, -1.), (P_el, -1.)])
+
+        block.objective(P_resid_plus, 1.)
+        block.objective(P_resid_minus, 1.)
+
+    def _self_consumption_matrix_rule_w_slack(self, block):
+        self._self_consumption_matrix_rule(block)
+        slack = block.var('slack', 'periods') # W
+
+        block.objective(slack, -1.)
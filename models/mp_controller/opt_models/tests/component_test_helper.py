@@ -7,6 +7,7 @@ def make_EC_test_model(n_periods=3, delta_t=60*15):
     model.timepoints = pyo.RangeSet(0, n_periods) # Range of timepoints
     model.periods    = pyo.RangeSet(0, n_periods-1) # Range of periods
     model.delta_t    = pyo.Param(initialize=delta_t) # s
+    model.dt         = pyo.Param(model.periods, initialize=delta_t) # s, per period
 
     model.P_resid_plus  = pyo.Var(model.periods, domain=pyo.NonNegativeReals) # Residual Grid load W 
     model.P_resid_minus = pyo.Var(model.periods, domain=pyo.NonNegativeReals) # Residual Grid load W
@@ -1,5 +1,6 @@
 from models.mp_controller.opt_models.battery_storage import BES_MILP_model
 import pyomo.environ as pyo
+import numpy as np
 from models.mp_controller import pyo_helpers as ph
 
 from component_test_helper import make_EC_test_model, component_test_setup
@@ -145,4 +146,32 @@ def test_bes_function_limits():
     assert P_comp ==   [0, 1, -1, -1, -1, 0]
     assert E_comp == [2, 2, 3,   2,  1,  0, 0]
     assert P_resid_p == [0, 0, 0, 0, 0, 0]
-    assert P_resid_m == [0, 0, 1, 0, 0, 1]
\ No newline at end of file
+    assert P_resid_m == [0, 0, 1, 0, 0, 1]
+
+
+def test_bes_relaxed_binary_repair():
+    bes = BES_MILP_model(name='bes', E_min=0., E_max=4, P_max_cha=1., P_max_dis=1., eta_cha=.5, eta_dis=.6, relax_binary=True)
+    assert bes.relaxed_binaries == ['bool']
+
+    model = component_test_setup(comp=bes, P_resid=[0, 1, -1], n_periods=3, delta_t=1)
+    assert all(var.is_binary() for var in model.comp.bool.values()) # only relaxed by the controller
+    for var in model.comp.bool.values():
+        var.domain = pyo.UnitInterval
+    ph.set_block_attribute_by_name(model, 'comp', 'E_BES_0', 2)
+    pyo.SolverFactory('appsi_highs').solve(model)
+
+    def set_values(name, values):
+        for var, value in zip(model.comp.find_component(name).values(), values):
+            var.set_value(float(value))
+    get_values = lambda name: np.array(ph.get_all_indexed_block_attributes_by_name(model, 'comp', name), dtype=float)
+
+    assert bes.repair_relaxation(get_values, set_values, np.ones(3)) in ('valid', 'repaired')
+    assert np.allclose(get_values('P_el'), [0, -1, 1])
+    assert np.allclose(get_values('E'), [2, 2, 2-1/0.6, 2-1/0.6+1*0.5])
+    assert not np.any((get_values('P_el_cha') > 0) & (get_values('P_el_dis') > 0))
+
+
+def test_bes_relax_binary_option():
+    assert BES_MILP_model(name='bes', eta_cha=1., eta_dis=1.).relaxed_binaries == []
+    assert BES_MILP_model(name='bes', eta_cha=.9, eta_dis=.9).relaxed_binaries == []
+    assert BES_MILP_model(name='bes', eta_cha=.9, eta_dis=.9, relax_binary=True).relaxed_binaries == ['bool']
@@ -1,4 +1,6 @@
 import pyomo.environ as pyo
+import numpy as np
+from operator import attrgetter
 
 def set_block_attribute_by_name(model, block_name, attr_name, value):
     pyo_comp = model.find_component(block_name)
@@ -8,8 +10,7 @@ def set_indexed_block_attribute_by_name(model, block_name, attr_name, values, in
     if not index:
         index = range(len(values))
     pyo_comp = model.find_component(block_name)
-    for i in index:
-        pyo_comp.__getattribute__(attr_name).__setitem__(i, values[i])
+    set_indexed_values(pyo_comp.__getattribute__(attr_name), values, index)
 
 def get_block_attribute_by_name(model, block_name, attr_name):
     pyo_comp = model.find_component(block_name)
@@ -22,3 +23,47 @@ def get_indexed_block_attribute_by_name(model, block_name, attr_name, index):
 def get_all_indexed_block_attributes_by_name(model, block_name, attr_name):
     pyo_comp = model.find_component(block_name)
     return pyo.value(pyo_comp.__getattribute__(attr_name)[:])
+
+def set_indexed_values(component, values, index):
+    '''set the values of an indexed mutable Param (or Var) for the given index'''
+    for i in index:
+        component[i].set_value(values[i])
+
+
+class IndexedBinding():
+    def __init__(self, component):
+        '''Binds an indexed pyo.Param or pyo.Var once (e.g. when a model is added to the controller), 
+        afterwards the values of all indices can be updated from or read to a numpy array without any lookups.
+        
+        Parameters
+        ----------
+        component : indexed pyo.Param (mutable) or pyo.Var'''
+        self.component = component
+        self._data = [component[i] for i in component.index_set()] # component data in the order of the index
+        self._set_value = [d.set_value for d in self._data]
+        self._get_value = attrgetter('value')
+        self.n = len(self._data)
+        # mutable Params without units and validation rule and with domain Reals (or Any) are updated in one call of
+        # store_values(check=False) after the domain of the array is checked at once (96 values: ~40 us instead of ~280 us with set_value)
+        self._index = list(component.index_set())
+        self._bulk = (component.ctype is pyo.Param and component.is_indexed() and component.mutable and component.get_units() is None
+                      and getattr(component, '_validate', None) is None and (component.domain is pyo.Reals or component.domain is pyo.Any))
+
+    def set_values(self, values) -> None:
+        '''set the values of all indices from an array like with length n (the values keep their type, numpy scalars are converted to python scalars)'''
+        if np.shape(values) != (self.n,):
+            raise ValueError(f'Expected {self.n} values for "{self.component.name}", got shape {np.shape(values)}')
+        if (self._bulk and isinstance(values, np.ndarray) and values.dtype.kind in 'iuf'
+                and (self.component.domain is pyo.Any or not np.isnan(values).any())):
+            self.component.store_values(dict(zip(self._index, values.tolist())), check=False)
+            return
+        for set_value, value in zip(self._set_value, values.tolist() if isinstance(values, np.ndarray) else values):
+            set_value(value)
+
+    def __getitem__(self, i):
+        '''component data of the i-th index'''
+        return self._data[i]
+
+    def get_values(self) -> np.ndarray:
+        '''get the values of all indices as numpy array (None is returned as nan)'''
+        return np.fromiter(map(self._get_value, self._data), dtype=float, count=self.n)
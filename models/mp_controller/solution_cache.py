@@ -0,0 +1,109 @@
+import os
+import json
+import hashlib
+import numpy as np
+from collections import OrderedDict
+
+
+class SolutionCache():
+    def __init__(self, max_size=1024, state_resolution=0., forecast_resolution=0., path=None):
+        '''LRU cache of the plans of an MPController, keyed on the quantized state inputs and forecasts.
+        Pass it to the controller (solution_cache=...), on a hit the stored plan is used instead of solving.
+        The key includes a signature of the controller (horizon and parameters of the components),
+        so a cache can be shared between controllers and scenario runs.
+
+        Parameters
+        ----------
+        max_size : int, maximum number of plans, the least recently used plan is evicted
+        state_resolution : float or dict, quantization step of the state inputs (dict: per state input, e.g. {'bes.E_BES_0': 3600}), 0: exact values
+        forecast_resolution : float or dict, quantization step of the forecast values (dict: per forecast), 0: exact values
+        path : str, file to persist the cache (.npz, arrays and a json layout, no pickle), loaded if it exists, written by save()'''
+        self.max_size            = max_size
+        self.state_resolution    = state_resolution
+        self.forecast_resolution = forecast_resolution
+        self.path                = path
+
+        self._plans    = OrderedDict() # key: plan
+        self.hits      = 0
+        self.misses    = 0
+        self.evictions = 0
+
+        if path is not None and os.path.exists(path):
+            self._load(path)
+            while len(self._plans) > max_size:
+                self._plans.popitem(last=False)
+
+    def __len__(self):
+        return len(self._plans)
+
+    @staticmethod
+    def _quantize(values, resolution) -> np.ndarray:
+        values = np.asarray(values, dtype=float)
+        if resolution:
+            values = np.round(values / resolution)
+        return values + 0. # -0. -> 0.
+
+    @staticmethod
+    def _resolution(resolution, name) -> float:
+        if isinstance(resolution, dict):
+            return resolution.get(name, 0.)
+        return resolution
+
+    def key(self, signature:str, states:dict, forecasts:dict) -> str:
+        '''hash of the controller signature, the quantized state inputs and the quantized forecasts'''
+        h = hashlib.blake2b(signature.encode(), digest_size=16)
+        for name in sorted(states):
+            h.update(name.encode())
+            h.update(self._quantize(states[name], self._resolution(self.state_resolution, name)).tobytes())
+        for name in sorted(forecasts):
+            h.update(name.encode())
+            h.update(self._quantize(forecasts[name], self._resolution(self.forecast_resolution, name)).tobytes())
+        return h.hexdigest()
+
+    def get(self, key):
+        '''the stored plan (None on a miss)'''
+        plan = self._plans.get(key)
+        if plan is None:
+            self.misses += 1
+            return None
+        self._plans.move_to_end(key)
+        self.hits += 1
+        return plan
+
+    def put(self, key, plan) -> None:
+        self._plans[key] = plan
+        self._plans.move_to_end(key)
+        if len(self._plans) > self.max_size:
+            self._plans.popitem(last=False)
+            self.evictions += 1
+
+    def save(self, path=None) -> None:
+        '''write the cache to path (default: the path given at init), the plans need to be dicts of dicts of arrays (see MPController._read_plan)'''
+        layout, arrays = [], [] # [key, {section: [names]}] in LRU order, the arrays in the order of the layout
+        for key, plan in self._plans.items():
+            layout += [[key, {section: list(values) for section, values in plan.items()}]]
+            arrays += [np.asarray(value) for values in plan.values() for value in values.values()]
+        with open(path or self.path, 'wb') as f:
+            np.savez(f, layout=np.array(json.dumps(layout)), **{f'a{i}': array for i, array in enumerate(arrays)})
+
+    def _load(self, path) -> None:
+        with np.load(path, allow_pickle=False) as data:
+            i = 0
+            for key, sections in json.loads(str(data['layout'])):
+                plan = {}
+                for section, names in sections.items():
+                    plan[section] = {}
+                    for name in names:
+                        plan[section][name] = data[f'a{i}']
+                        i += 1
+                self._plans[key] = plan
+
+    def statistics(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._plans),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': self.hits / lookups if lookups else 0.,
+            }
@@ -0,0 +1,96 @@
+import numpy as np
+
+# fields recorded per step of the controller
+TELEMETRY_FIELDS = ['update_time', 'solve_time', 'status', 'mip_gap', 'node_count', 'objective']
+
+_dtype = np.dtype([
+    ('step',        np.int64),
+    ('solved',      np.bool_),
+    ('update_time', np.float64), # s
+    ('solve_time',  np.float64), # s
+    ('status',      np.int16),   # index into SolverTelemetry.statuses
+    ('mip_gap',     np.float64), # relative
+    ('node_count',  np.float64), # nan if unknown
+    ('objective',   np.float64),
+    ])
+
+
+class SolverTelemetry():
+    def __init__(self, capacity=100_000):
+        '''Compact in-memory buffer of the solver telemetry of every step of a controller.
+        The records are kept in a preallocated numpy structured array, if the capacity is exceeded
+        the oldest records are overwritten (ring buffer). Status strings are stored as indices into self.statuses.
+
+        Parameters
+        ----------
+        capacity : int, maximum number of steps that are kept'''
+        self.capacity  = capacity
+        self._buffer   = np.zeros(capacity, dtype=_dtype)
+        self._n        = 0 # total number of recorded steps
+        self.statuses  = [] # distinct status strings
+        self._status_index = {}
+
+    def __len__(self):
+        return min(self._n, self.capacity)
+
+    def _status_code(self, status) -> int:
+        status = str(status)
+        if status not in self._status_index:
+            self._status_index[status] = len(self.statuses)
+            self.statuses += [status]
+        return self._status_index[status]
+
+    def record(self, solved, update_time=0., solve_time=0., status='replayed', mip_gap=np.nan, node_count=np.nan, objective=np.nan) -> None:
+        '''record the telemetry of one step'''
+        self._buffer[self._n % self.capacity] = (self._n, solved, update_time, solve_time, self._status_code(status), mip_gap, node_count, objective)
+        self._n += 1
+
+    def last(self) -> dict:
+        '''telemetry of the last step, the status as string'''
+        if not self._n:
+            return {field: np.nan for field in TELEMETRY_FIELDS}
+        rec = self._buffer[(self._n-1) % self.capacity]
+        last = {field: float(rec[field]) for field in TELEMETRY_FIELDS}
+        last['status'] = self.statuses[rec['status']]
+        return last
+
+    def records(self) -> np.ndarray:
+        '''the kept records in chronological order (structured array, a copy)'''
+        if self._n <= self.capacity:
+            return self._buffer[:self._n].copy()
+        start = self._n % self.capacity
+        return np.concatenate([self._buffer[start:], self._buffer[:start]])
+
+    def to_frame(self):
+        '''the kept records as pandas.DataFrame indexed by step, the status as string'''
+        import pandas as pd
+        df = pd.DataFrame(self.records()).set_index('step')
+        df['status'] = [self.statuses[s] for s in df['status']]
+        return df
+
+    def summary(self) -> dict:
+        '''p50/p95/max of the solve and parameter update times (of the steps that were solved) and the count of every status'''
+        rec = self.records()
+        solved = rec[rec['solved']]
+        summary = {'steps': len(rec), 'solves': len(solved)}
+        for field in ['solve_time', 'update_time']:
+            values = solved[field] if len(solved) else np.full(1, np.nan)
+            summary[field] = {
+                'mean': float(values.mean()),
+                'p50': float(np.percentile(values, 50)),
+                'p95': float(np.percentile(values, 95)),
+                'max': float(values.max()),
+                }
+        summary['status'] = {status: int((rec['status'] == code).sum()) for code, status in enumerate(self.statuses)}
+        return summary
+
+
+def mip_gap(objective, bound) -> float:
+    '''relative gap between the best feasible objective value and the best bound (as defined by HiGHS and Gurobi)'''
+    if np.isnan(objective) or np.isnan(bound):
+        return np.nan
+    if objective == bound:
+        return 0.
+    if objective == 0.:
+        return np.inf
+    return abs(objective - bound) / abs(objective)
@@ -0,0 +1,78 @@
+from models.mp_controller.matrix_backend import MatrixMPController
+from models.mp_controller.distributed import DistributedMPController
+from models.mp_controller.opt_models.battery_storage import BES_MILP_model
+from models.mp_controller.opt_models.energy_community import EC__Residual_Load_MILP_model
+from models.mp_controller.opt_models.objective import Objective
+import numpy as np
+import pytest
+
+class ForcastingMock():
+    def __init__(self, profile):
+        self.inputs = []
+        self.profile = profile
+
+    def get_forcast(self, time) -> list:
+        return self.profile[time:time+4]
+
+    def set_data(self, time):
+        pass
+
+    def set_forcast_length(self, n):
+        pass
+
+def setup_controller(ctr_class, **kwargs):
+    ctr = ctr_class('mpc', n_periods=4, delta_t=1, return_future_control_output=True, **kwargs)
+    ctr.add_model(Objective('objective', objective='self-consumption'))
+    ec = EC__Residual_Load_MILP_model()
+    ctr.add_model(ec)
+    ctr.add_forcaster(ForcastingMock([2, -2, -1, 2, -2, 1, 2, 0, 0, 0]), ec, 'P_resid_ec')
+    for name in ['BES1', 'BES2']:
+        ctr.add_model(BES_MILP_model(name, E_min=0, E_max=2, P_max_cha=1, P_max_dis=1, eta_cha=1, eta_dis=1))
+    return ctr
+
+@pytest.mark.parametrize('n_workers', [0, 2])
+def test_distributed_equals_monolithic(n_workers):
+    ctr_mat = setup_controller(MatrixMPController)
+    ctr_dis = setup_controller(DistributedMPController, n_workers=n_workers, rho=1., tol=1e-4, prox_scale=4., n_breakpoints=16)
+    try:
+        for t in range(3):
+            inputs = {'BES1.E_BES_0': 1, 'BES2.E_BES_0': 0.5}
+            out_mat = ctr_mat.step(t, **inputs)
+            out_dis = ctr_dis.step(t, **inputs)
+            assert out_mat.keys() == out_dis.keys()
+            assert ctr_dis.n_iterations < ctr_dis.max_iter
+            # the sum constraints hold within the tolerance
+            P_sum = sum(ctr_dis._solution[name]['P_el'] for name in ['objective', 'EC', 'BES1', 'BES2'])
+            assert np.abs(P_sum).max() <= 1e-4
+            # the optimal objective value is unique, compare the resulting residual load
+            assert np.abs(ctr_dis._plan['outputs']['objective.P_el']).sum() == pytest.approx(np.abs(ctr_mat._plan['outputs']['objective.P_el']).sum(), abs=1e-2)
+    finally:
+        ctr_dis.close()
+
+def test_distributed_missing_matrix_rule():
+    class NoMatrix():
+        name = 'nomatrix'
+        state_inputs = []
+        controll_outputs = []
+        shares = []
+    ctr = DistributedMPController('mpc', n_periods=4, delta_t=1, n_workers=0)
+    with pytest.raises(TypeError):
+        ctr.add_model(NoMatrix())
+
+def test_distributed_fixed_outputs():
+    states = {'BES1.E_BES_0': 1, 'BES2.E_BES_0': 0.5}
+    forecasts = {'EC.forecast.P_resid_ec': [2, -2, -1, 2]}
+    with setup_controller(DistributedMPController, rho=1., tol=1e-4, prox_scale=4., n_breakpoints=16) as ctr:
+        solution = ctr.solve_for(states, forecasts, fixed_outputs={'BES1.P_el': 1., 'BES2.P_el': 0.})
+        assert solution['BES1.P_el'] == pytest.approx(1., abs=1e-4)
+        assert solution['BES2.P_el'] == pytest.approx(0., abs=1e-4)
+        # the outputs are released again
+        free = ctr.solve_for(states, forecasts)
+        assert free['BES1.P_el'] + free['BES2.P_el'] == pytest.approx(-1.5, abs=1e-2)
+
+def test_distributed_worker_add_error():
+    ctr = setup_controller(DistributedMPController, n_workers=1)
+    ctr.components[-1].P_max_dis = 'x' # the subproblem can not be built in the worker
+    with pytest.raises(ValueError):
+        ctr.step(0, **{'BES1.E_BES_0': 1, 'BES2.E_BES_0': 0.5})
+    assert ctr._workers is None # stopped
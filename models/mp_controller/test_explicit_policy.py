@@ -0,0 +1,54 @@
+from models.mp_controller.mp_controller import MPController
+from models.mp_controller.explicit_policy import ExplicitPolicy, sample_problems, solve_offline
+from models.mp_controller.opt_models.battery_storage import BES_MILP_model
+from models.mp_controller.opt_models.energy_community import EC__Residual_Load_MILP_model
+from models.mp_controller.opt_models.objective import Objective
+from models.mp_controller.forcasting import Forcasting
+import numpy as np
+import pytest
+
+def make_controller():
+    ctr = MPController('mpc', n_periods=4, delta_t=900)
+    ctr.add_model(Objective('objective', objective='self-consumption'))
+    ec = EC__Residual_Load_MILP_model()
+    ctr.add_model(ec)
+    ctr.add_forcaster(Forcasting('generic_single_var_persistence', 'P_ec', init_val=0), ec, 'P_resid_ec')
+    ctr.add_model(BES_MILP_model('BES', E_min=0, E_max=3600*1000, P_max_cha=1000, P_max_dis=1000, eta_cha=1, eta_dis=1))
+    return ctr
+
+def forecast_sampler(rng):
+    return {'EC.forecast.P_resid_ec': rng.uniform(-2000, 2000, 4)}
+
+def test_solve_for_fixed_outputs():
+    ctr = make_controller()
+    states, forecasts = {'BES.E_BES_0': 1800*1000}, {'EC.forecast.P_resid_ec': [500, 500, 0, 0]}
+    solution = ctr.solve_for(states, forecasts)
+    assert solution == {'BES.P_el': -500., 'objective.P_el': 0., 'objective': 0.}
+
+    fixed = ctr.solve_for(states, forecasts, fixed_outputs={'BES.P_el': 0.})
+    assert fixed['BES.P_el'] == 0.
+    assert fixed['objective'] == pytest.approx(500.)
+    # outputs are released again
+    assert ctr.solve_for(states, forecasts) == solution
+    # infeasible fixed outputs
+    assert ctr.solve_for({'BES.E_BES_0': 0.}, forecasts, fixed_outputs={'BES.P_el': -500.}) is None
+
+def test_explicit_policy():
+    samples = sample_problems(200, {'BES.E_BES_0': (0, 3600*1000)}, forecast_sampler, seed=1)
+    solutions = solve_offline(make_controller, samples, n_workers=0)
+    policy = ExplicitPolicy('policy', make_controller).fit(samples, solutions)
+
+    assert policy.inputs == ['EC.forecast.P_ec', 'BES.E_BES_0']
+    assert policy.action_names == ['BES.P_el']
+    assert policy.outputs == ['objective.P_el', 'BES.P_el']
+    # the solved samples are reproduced
+    states, forecasts = samples[0]
+    assert policy.predict(states, forecasts)['BES.P_el'] == pytest.approx(solutions[0]['BES.P_el'])
+
+    outputs = policy.step(0, **{'BES.E_BES_0': 1800*1000, 'EC.forecast.P_ec': 500})
+    assert set(outputs) == {'objective.P_el', 'BES.P_el'}
+
+    report = policy.evaluate(sample_problems(10, {'BES.E_BES_0': (0, 3600*1000)}, forecast_sampler, seed=2), n_workers=0)
+    assert report['latency']['max'] > 0
+    assert report['gap_mean'] >= -1e-6
+    assert 0 <= report['infeasible'] <= 1
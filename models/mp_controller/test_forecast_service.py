@@ -0,0 +1,101 @@
+from models.mp_controller.forecast_service import ForecastService, SharedForcaster
+from models.mp_controller.mp_controller import MPController
+from models.mp_controller.opt_models.battery_storage import BES_MILP_model
+from models.mp_controller.opt_models.energy_community import EC__Residual_Load_MILP_model
+from models.mp_controller.opt_models.objective import Objective
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def test_shared_forcaster_ingests_and_computes_once():
+    service = ForecastService()
+    fc_1 = service.forcaster('P_ec', 'generic_single_var_persistence', 'P_ec', init_val=0.)
+    fc_2 = service.forcaster('P_ec', 'generic_single_var_persistence', 'P_ec', init_val=0.)
+    assert isinstance(fc_1, SharedForcaster) and fc_1.inputs == ['P_ec']
+    for fc in [fc_1, fc_2]:
+        fc.set_forcast_length(2)
+
+    for time in range(3):
+        for fc in [fc_1, fc_2]:
+            fc.set_data(time, P_ec=float(time+1))
+        assert fc_1.get_forcast(time) == fc_2.get_forcast(time)
+
+    forc = fc_1.get_forcast(2, copy=False)
+    assert forc is fc_2.get_forcast(2, copy=False) and not forc.flags.writeable
+    assert forc.tolist() == [1., 2.]
+    assert service.statistics() == {'streams': 1, 'forcasters': 1, 'ingested': 3, 'computed': 3, 'served': 8}
+
+
+def test_shared_forcaster_horizons_and_configs():
+    service = ForecastService()
+    fc_1 = service.forcaster('P_ec', 'generic_single_var_persistence', 'P_ec')
+    fc_2 = service.forcaster('P_ec', 'generic_single_var_persistence', 'P_ec')
+    fc_1.set_forcast_length(2)
+    fc_2.set_forcast_length(3)
+    fc_1.set_data(0, P_ec=1.)
+    fc_2.set_data(0, P_ec=1.)
+    assert len(fc_1.get_forcast(0)) == 2 and len(fc_2.get_forcast(0)) == 3
+    assert service.statistics()['forcasters'] == 2
+
+    with pytest.raises(ValueError):
+        service.forcaster('P_ec', 'generic_single_var_persistence', 'P_other')
+
+
+def test_shared_smart_meter_data():
+    service = ForecastService()
+    subscribers = [service.forcaster('P_ec', 'persistence_residual_load_smartmeter', default_val=0) for _ in range(2)]
+    for fc in subscribers:
+        fc.set_delta_t(15*60)
+        fc.set_forcast_length(3)
+
+    index = pd.date_range(start="2020-01-01 00:00", periods=97, freq="15min")
+    for t in index:
+        for fc in subscribers:
+            fc.set_data(t, P_flex_=[0.5]) # the flexible load of every controller, 1 W in total
+    df = pd.DataFrame({'sm1': np.full(96, 10.)}, index=index[:96])
+    for fc in subscribers: # the GridOperator calls every callback with the same data
+        fc.set_smart_meter_data(df)
+
+    assert subscribers[0].get_forcast(index[-1]) == subscribers[1].get_forcast(index[-1]) == [9., 9., 9.]
+    assert service.statistics()['computed'] == 1
+
+
+@pytest.mark.parametrize('method, data', [
+    ('persistence_residual_load', {'P_tot': 10.}),
+    ('persistence_residual_load_smartmeter', {}),
+    ])
+def test_shared_forcaster_merges_flex_inputs(method, data):
+    service = ForecastService()
+    subscribers = [service.forcaster('P_ec', method, 0) for _ in range(2)]
+    for fc in subscribers:
+        fc.set_delta_t(15*60)
+        fc.set_forcast_length(2)
+
+    index = pd.date_range(start="2020-01-01 00:00", periods=97, freq="15min")
+    for t in index:
+        subscribers[0].set_data(t, P_flex_=[1.], **data)
+        subscribers[1].set_data(t, P_flex_=[2., 3.], **data) # another controller with other flexible loads
+    if method == 'persistence_residual_load_smartmeter':
+        subscribers[0].set_smart_meter_data(pd.DataFrame({'sm1': np.full(96, 10.)}, index=index[:96]))
+
+    assert subscribers[0].get_forcast(index[-1]) == subscribers[1].get_forcast(index[-1]) == [4., 4.] # 10 - (1 + 2 + 3)
+    assert service.statistics()['ingested'] == 2*len(index)
+
+def test_shared_forcaster_in_controllers():
+    service = ForecastService()
+    controllers = []
+    for _ in range(2):
+        ctr = MPController('mpc', n_periods=3, delta_t=1, return_forcast=True)
+        ctr.add_model(Objective('objective', objective='self-consumption'))
+        ec = EC__Residual_Load_MILP_model()
+        ctr.add_model(ec)
+        ctr.add_forcaster(service.forcaster('P_ec', 'generic_single_var_persistence', 'P_ec', init_val=0), ec, 'P_resid_ec')
+        ctr.add_model(BES_MILP_model('BES', E_min=0, E_max=5, P_max_cha=1, P_max_dis=1, eta_cha=1, eta_dis=1))
+        controllers += [ctr]
+
+    for time in range(4):
+        outputs = [ctr.step(time, **{'BES.E_BES_0': 2, 'EC.forecast.P_ec': 1}) for ctr in controllers]
+        assert outputs[0] == outputs[1]
+    assert service.statistics()['ingested'] == 4
+    assert service.statistics()['computed'] == 4
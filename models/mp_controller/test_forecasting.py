@@ -1,6 +1,7 @@
-from models.mp_controller.forcasting import Forcasting, GenericPersistenceForcasting
+from models.mp_controller.forcasting import Forcasting, GenericPersistenceForcasting, HistoryStore
 import numpy as np
 import pandas as pd
+import pytest
 
 def test_forecasting_type():
     fc = Forcasting(method='generic_single_var_persistence', inpt='val')
@@ -88,6 +89,38 @@ def test_persistence_smart_meter_set_data():
 
     assert fc.data['P_resid'].to_list() == [20, 19, 18]
 
+def test_history_store_off_grid_times():
+    store = HistoryStore(['P_tot'], resolution=15*60, retention=8)
+    index = pd.date_range(start="2020-01-01 00:00", periods=3, freq="15min")
+    assert store.slots(index).tolist() == [0, 1, 2]
+    # times between two slots are floored, as label slicing of the quarter hours did
+    assert store.slots(pd.Timestamp("2020-01-01 00:07")).tolist() == [0]
+    assert store.slots(pd.DatetimeIndex(["2020-01-01 00:14:59", "2020-01-01 00:29", "2020-01-01 00:30:01"])).tolist() == [0, 1, 2]
+
+def test_persistence_smart_meter_set_data_off_grid():
+    fc = Forcasting('persistence_residual_load_smartmeter')
+
+    index = pd.date_range(start="2020-01-01 00:00", periods=3, freq="15min")
+    for i, t in enumerate(index):
+        fc.set_data(t + pd.Timedelta(5, 'min'), [i]) # controller steps off the quarter hours
+
+    fc.set_smart_meter_data(pd.DataFrame(np.full((3, 2), 10), index=index, columns=['sm1', 'sm2']))
+
+    assert fc.data['P_resid'].to_list() == [20, 19, 18]
+
+def test_persistence_smart_meter_set_meter_data():
+    from models.gridoperator.gridoperator import MeterData
+    fc = Forcasting('persistence_residual_load_smartmeter')
+
+    index = pd.date_range(start="2020-01-01 00:00", periods=3, freq="15min")
+    for i, t in enumerate(index):
+        fc.set_data(t, [i])
+
+    values = np.array([[10., 10., np.nan], [10., 10., 10.]]) # meters x quarter hours, sm1 without data in the last quarter hour
+    fc.set_smart_meter_data(MeterData(index.as_unit('ns').asi8, values, ['sm1', 'sm2']))
+
+    assert fc.data['P_resid'].to_list() == [20, 19, 8]
+
 
 def test_persistence_smart_meter_get_fc_default():
     periods = 3
@@ -132,3 +165,118 @@ def test_persistence_smart_meter_get_fc_valid_index():
 
     assert forc == [20-5, 20-6, 20-7]
 
+
+
+def test_persistence_forecast_view():
+    fc = Forcasting(method='generic_single_var_persistence', inpt='v1')
+    fc.set_forcast_length(n=3)
+    for v in range(1, 6):
+        fc.set_data(1, v1=float(v))
+
+    forc = fc.get_forcast(1, copy=False)
+    assert isinstance(forc, np.ndarray) and not forc.flags.writeable
+    assert forc.tolist() == [2., 3., 4.]
+
+    # the ring buffer wraps around
+    for v in range(6, 12):
+        fc.set_data(1, v1=float(v))
+    assert fc.get_forcast(1) == [8., 9., 10.]
+    assert fc.ser.to_list() == [8., 9., 10., 11.]
+
+
+def test_persistence_residual_load():
+    fc = Forcasting(method='persistence_residual_load', init_val=0.)
+    fc.set_forcast_length(n=2)
+    fc.set_data(1, P_tot=10., P_flex_=[1., 2.])
+    assert fc.get_forcast(1) == [0., 0.]
+    fc.set_data(1, P_tot=5., P_flex_=[1.])
+    assert fc.get_forcast(1) == [0., 7.]
+
+def test_persistence_smart_meter_weekday_and_retention():
+    fc = Forcasting('persistence_residual_load_smartmeter', default_val=0.)
+    fc.set_delta_t(15*60)
+    fc.set_forcast_length(4)
+
+    # two weeks of data, the smart meter data is delivered once a day
+    index = pd.date_range(start="2020-01-01 00:00", end='2020-01-14 23:45', freq="15min", tz='Europe/Berlin')
+    for day in range(14):
+        day_index = index[day*96:(day+1)*96]
+        for t in day_index:
+            fc.set_data(t, [0.])
+        fc.set_smart_meter_data(pd.DataFrame({'sm1': np.arange(day*96, (day+1)*96, dtype=float)}, index=day_index))
+
+    # only one week (plus the horizon) is retained
+    assert len(fc.data) <= 7*96 + 1 + 4 + 1
+    assert fc.last_valid_index == index[-1]
+
+    # day before
+    assert fc.get_forcast(pd.Timestamp('2020-01-15 00:00', tz='Europe/Berlin')) == [13*96+1., 13*96+2., 13*96+3., 13*96+4.]
+    # the day before is not delivered yet, same weekday one week before
+    assert fc.get_forcast(pd.Timestamp('2020-01-16 00:00', tz='Europe/Berlin')) == [8*96+1., 8*96+2., 8*96+3., 8*96+4.]
+    # no data of the day or the week before
+    assert fc.get_forcast(pd.Timestamp('2020-01-23 00:00', tz='Europe/Berlin')) == [0.]*4
+
+
+####################
+# online_regression
+####################
+def test_online_regression_learns_daily_pattern():
+    fc = Forcasting('online_regression', inpt='P', init_val=0.)
+    fc.set_forcast_length(8)
+    fc.set_delta_t(15*60)
+
+    index = pd.date_range(start="2021-01-04 00:00", periods=14*96, freq="15min", tz='Europe/Berlin')
+    pattern = lambda t: 1000 + 500*np.sin(2*np.pi*(t.hour*60 + t.minute)/1440) + 200*(t.dayofweek >= 5)
+    assert fc.get_forcast(index[0]) == [0.]*8
+
+    for t in index:
+        fc.set_data(t, P=pattern(t))
+
+    forc = fc.get_forcast(index[-1], copy=False)
+    assert forc.shape == (8,)
+    assert np.allclose(forc, pattern(index[-1] + pd.to_timedelta(15*60*np.arange(1, 9), unit='s')), atol=1.)
+
+
+def test_online_regression_lags_cover_horizon():
+    fc = Forcasting('online_regression', inpt='P', lags=(3600,))
+    fc.set_forcast_length(8)
+    fc.set_delta_t(15*60)
+    with pytest.raises(ValueError):
+        fc.set_data(0, P=1.)
+
+
+####################
+# perfect_foresight
+####################
+def test_perfect_foresight_views():
+    index = pd.date_range(start="2021-01-01 00:00", periods=4*60, freq="1min", tz='Europe/Berlin')
+    data = pd.Series(np.arange(len(index), dtype=float), index=index)
+
+    fc = Forcasting('perfect_foresight', data)
+    fc.set_forcast_length(3)
+    fc.set_delta_t(15*60)
+    fc.set_data(index[0])
+
+    forc = fc.get_forcast(index[0], copy=False)
+    assert forc.tolist() == [15., 30., 45.]
+    assert np.shares_memory(forc, data.to_numpy()) and not forc.flags.writeable
+    # between two values of the data
+    assert fc.get_forcast(index[1] + pd.Timedelta(30, 's')) == [16., 31., 46.]
+    # the end of the data is held
+    assert fc.get_forcast(index[-20]) == [235., 239., 239.]
+
+
+def test_perfect_foresight_naive_time():
+    index = pd.date_range(start="2021-07-01 00:00", periods=4*60, freq="1min", tz='Europe/Berlin')
+    fc = Forcasting('perfect_foresight', pd.Series(np.arange(len(index), dtype=float), index=index))
+    fc.set_forcast_length(3)
+    fc.set_delta_t(15*60)
+    # a naive time is in the time zone of the data (not utc)
+    assert fc.get_forcast(pd.Timestamp('2021-07-01 00:00')) == fc.get_forcast(index[0]) == [15., 30., 45.]
+
+def test_perfect_foresight_irregular_index():
+    index = pd.DatetimeIndex(['2021-01-01 00:00', '2021-01-01 00:15', '2021-01-01 01:00'])
+    fc = Forcasting('perfect_foresight', pd.Series([1., 2., 3.], index=index))
+    fc.set_forcast_length(4)
+    fc.set_delta_t(15*60)
+    assert fc.get_forcast(index[0]) == [2., 2., 2., 3.]
@@ -0,0 +1,195 @@
+from models.mp_controller.mp_controller import MPController
+from models.mp_controller.matrix_backend import MatrixMPController, MatrixModel, MatrixBlock
+from models.mp_controller.solution_cache import SolutionCache
+from models.mp_controller.opt_models.battery_storage import BES_MILP_model
+from models.mp_controller.opt_models.energy_community import EC__Residual_Load_MILP_model
+from models.mp_controller.opt_models.objective import Objective
+from models.mp_controller.opt_models import dhwh, dhwh_dot_m
+import numpy as np
+import highspy
+import pytest
+
+class ForcastingMock():
+    def __init__(self, profile):
+        self.inputs = []
+        self.profile = profile
+        self.n = 4
+
+    def get_forcast(self, time) -> list:
+        return self.profile[time:time+self.n]
+
+    def set_data(self, time):
+        pass
+    
+    def set_forcast_length(self, n):
+        self.n = n
+
+def setup_controller(ctr_class, comp, states, forecasts, objective='self-consumption', **kwargs):
+    ctr = ctr_class('mpc', n_periods=4, delta_t=1, return_future_state=True, **kwargs)
+    ctr.add_model(Objective('objective', objective=objective))
+    ec = EC__Residual_Load_MILP_model()
+    ctr.add_model(ec)
+    ctr.add_forcaster(ForcastingMock([1, -1, 0, 1, -1, 1, 1, 0, 0, 0]), ec, 'P_resid_ec')
+    ctr.add_model(comp)
+    for for_var, profile in forecasts.items():
+        ctr.add_forcaster(ForcastingMock(profile), comp, for_var)
+    return ctr
+
+components = [
+    (lambda: BES_MILP_model('BES', E_min=0, E_max=5, P_max_cha=1, P_max_dis=1, eta_cha=0.9, eta_dis=0.8),
+     {'BES.E_BES_0': [2, 1, 3]}, {}),
+    (lambda: dhwh.DHW_MILP_model('DHW', eta=1., P_nom=1., E_tes_min=0., E_tes_max=3),
+     {'DHW.E_tes_0': [1, 2, 0.5]}, {'dot_Q_demand': [0, 0.5, 0, 0.2, 0, 0, 0.3, 0, 0, 0]}),
+    (lambda: dhwh.DHW_MILP_model_Temp('DHW', P_nom=1., C_tes=1, T_tes_min=0., T_tes_max=3, eta=1.),
+     {'DHW.T_tes_0': [1, 2, 0.5]}, {'dot_Q_demand': [0, 0.5, 0, 0.2, 0, 0, 0.3, 0, 0, 0]}),
+    (lambda: dhwh_dot_m.DHW_MILP_model_Temp('DHW', P_nom=1000., C_tes=4200*2, T_tes_min=10., T_tes_max=80, T_in=12),
+     {'DHW.T_tes_0': [50, 40, 60]}, {'dot_m_demand': [0, 0.01, 0, 0.02, 0, 0, 0.03, 0, 0, 0]}),
+]
+
+@pytest.mark.parametrize('make_comp, states, forecasts', components)
+def test_matrix_backend_equals_pyomo(make_comp, states, forecasts):
+    ctr_pyo = setup_controller(MPController, make_comp(), states, forecasts)
+    ctr_mat = setup_controller(MatrixMPController, make_comp(), states, forecasts)
+
+    for t in range(3):
+        inputs = {name: values[t] for name, values in states.items()}
+        out_pyo = ctr_pyo.step(t, **inputs)
+        out_mat = ctr_mat.step(t, **inputs)
+        assert out_pyo.keys() == out_mat.keys()
+        # the optimal objective value is unique, compare the resulting residual load
+        assert np.allclose(ctr_pyo._plan['outputs']['objective.P_el'], ctr_mat._plan['outputs']['objective.P_el'], atol=1e-6)
+
+def test_matrix_backend_warm_start():
+    ctr = setup_controller(MatrixMPController, BES_MILP_model('BES', E_min=0, E_max=5, P_max_cha=1, P_max_dis=1, eta_cha=1, eta_dis=1), {}, {}, warm_start=True)
+    assert ctr.step(0, **{'BES.E_BES_0': 2})['BES.P_el'] == -1.
+    assert ctr.step(1, **{'BES.E_BES_0': 1})['BES.P_el'] == 1.
+
+def test_matrix_backend_requires_matrix_rule():
+    class ComponentMock():
+        name = 'comp'
+        state_inputs = []
+        shares = []
+        controll_outputs = []
+        def pyo_block_rule(self, block):
+            pass
+
+    ctr = MatrixMPController('mpc', n_periods=3, delta_t=1)
+    with pytest.raises(TypeError):
+        ctr.add_model(ComponentMock())
+
+def test_matrix_model_assembly():
+    model = MatrixModel(n_periods=3, delta_t=1)
+    block = MatrixBlock(model, 'block')
+    x = block.var('x', 'timepoints', lb=0)
+    a = block.param('a', 'periods')
+    block.constraint([(x[1:], 1.), (x[:-1], -1., a, 2.)], rhs=[(a, 1.)])
+    model.finalize()
+
+    model.param_values[a] = [1., 2., 3.]
+    assert model.A.shape == (3, 4)
+    assert np.array_equal(model.coefficients(), [1., 3., 5.])
+    lb, ub = model.row_bounds()
+    assert np.array_equal(lb, [1., 2., 3.]) and np.array_equal(ub, [1., 2., 3.])
+
+def test_matrix_model_update_changed_coefficients():
+    model = MatrixModel(n_periods=3, delta_t=1)
+    block = MatrixBlock(model, 'block')
+    x = block.var('x', 'timepoints', lb=0, ub=10)
+    a = block.param('a', 'periods')
+    block.constraint([(x[1:], 1.), (x[:-1], -1., a, 2.)], rhs=[(a, 1.)])
+    block.objective(x, 1.)
+    highs = highspy.Highs()
+    highs.setOptionValue('output_flag', False)
+    model.param_values[a] = [0., 0., 0.]
+    model.load(highs)
+
+    for values in ([1., 2., 3.], [1., 0., 3.]):
+        model.param_values[a] = values
+        model.update(highs)
+        model.run(highs)
+        x_ = model.col_values
+        assert np.allclose(x_[1:] + x_[:-1]*(-1. + 2*np.array(values)), values)
+    assert np.array_equal(model._loaded_coefs, [1., -1., 5.])
+
+def test_matrix_backend_solution_cache():
+    cache = SolutionCache(state_resolution=0.1)
+    ctr = setup_controller(MatrixMPController, BES_MILP_model('BES', E_min=0, E_max=5, P_max_cha=1, P_max_dis=1, eta_cha=1, eta_dis=1), {}, {}, solution_cache=cache, return_telemetry=True)
+    ctr.step(0, **{'BES.E_BES_0': 2})
+    outputs = ctr.step(0, **{'BES.E_BES_0': 2.01})
+    assert outputs['telemetry.status'] == 'cached'
+    assert ctr.n_solves == 1
+
+def test_matrix_backend_telemetry():
+    ctr = setup_controller(MatrixMPController, BES_MILP_model('BES', E_min=0, E_max=5, P_max_cha=1, P_max_dis=1, eta_cha=1, eta_dis=1), {}, {}, return_telemetry=True)
+    outputs = ctr.step(0, **{'BES.E_BES_0': 2})
+    assert outputs['telemetry.status'] == 'optimal'
+    assert outputs['telemetry.objective'] == pytest.approx(0.)
+    assert outputs['telemetry.node_count'] >= 0
+    assert ctr.telemetry.summary()['solves'] == 1
+
+def test_matrix_backend_budget_fallback():
+    ctr = setup_controller(MatrixMPController, BES_MILP_model('BES', E_min=0, E_max=5, P_max_cha=1, P_max_dis=1, eta_cha=1, eta_dis=1), {}, {}, time_limit=0.)
+    assert ctr.step(0, **{'BES.E_BES_0': 2})['BES.P_el'] == 0.
+    assert ctr.fallback_counts['safe_default'] == 1
+
+    ctr.solver.setOptionValue('time_limit', 10.)
+    ctr.step(1, **{'BES.E_BES_0': 2})
+    ctr.solver.setOptionValue('time_limit', 0.)
+    ctr.step(2, **{'BES.E_BES_0': 2})
+    assert ctr.fallback_counts == {'optimal': 1, 'incumbent': 0, 'previous_plan': 1, 'safe_default': 1}
+
+def test_matrix_backend_warm_start_without_incumbent():
+    ctr = setup_controller(MatrixMPController, BES_MILP_model('BES', E_min=0, E_max=5, P_max_cha=1, P_max_dis=1, eta_cha=1, eta_dis=1), {}, {}, time_limit=0., warm_start=True)
+    ctr.step(0, **{'BES.E_BES_0': 2})
+    assert ctr.model.col_values is None # stopped without a solution
+
+    ctr.solver.setOptionValue('time_limit', 10.)
+    assert ctr.step(1, **{'BES.E_BES_0': 1})['BES.P_el'] == 1. # solved cold
+    assert ctr.fallback_counts['optimal'] == 1
+
+def test_matrix_backend_period_durations():
+    durations = [1, 1, 2, 3]
+    ctr_pyo = setup_controller(MPController, BES_MILP_model('BES', E_min=0, E_max=5, P_max_cha=1, P_max_dis=1, eta_cha=0.9, eta_dis=0.8), {}, {}, period_durations=durations)
+    ctr_mat = setup_controller(MatrixMPController, BES_MILP_model('BES', E_min=0, E_max=5, P_max_cha=1, P_max_dis=1, eta_cha=0.9, eta_dis=0.8), {}, {}, period_durations=durations)
+    for t in range(3):
+        out_pyo = ctr_pyo.step(t, **{'BES.E_BES_0': 2})
+        out_mat = ctr_mat.step(t, **{'BES.E_BES_0': 2})
+        assert np.allclose(ctr_pyo._plan['outputs']['objective.P_el'], ctr_mat._plan['outputs']['objective.P_el'], atol=1e-6)
+        assert len(out_mat['BES.E_future']) == 8
+
+@pytest.mark.parametrize('ctr_class', [MPController, MatrixMPController])
+def test_relaxed_binary_verified(ctr_class):
+    make_bes = lambda relax_binary: BES_MILP_model('BES', E_min=0, E_max=5, P_max_cha=1, P_max_dis=1, eta_cha=0.9, eta_dis=0.8, relax_binary=relax_binary)
+    relaxed = setup_controller(ctr_class, make_bes(True), {}, {})
+    milp    = setup_controller(ctr_class, make_bes(False), {}, {})
+
+    # t=1, full storage: the LP burns the feed in by charging and discharging at once, which can not be repaired
+    for time, E in [(1, 5), (0, 2), (2, 1)]:
+        outputs = relaxed.step(time, **{'BES.E_BES_0': E})
+        expected = milp.step(time, **{'BES.E_BES_0': E})
+        assert relaxed.telemetry.last()['objective'] == pytest.approx(milp.telemetry.last()['objective'])
+        assert outputs['BES.E_future'] == pytest.approx(expected['BES.E_future'])
+    assert relaxed.relaxation_counts['milp'] == 1
+    assert sum(relaxed.relaxation_counts.values()) == 3
+    assert milp.relaxation_counts == {'valid': 0, 'repaired': 0, 'milp': 0}
+
+@pytest.mark.parametrize('ctr_class', [MPController, MatrixMPController])
+def test_relaxed_binary_fallback_changes_plan(ctr_class):
+    bes_lp  = BES_MILP_model('BES', E_min=0, E_max=5, P_max_cha=1, P_max_dis=1, eta_cha=0.9, eta_dis=0.8, relax_binary=True)
+    bes_lp.repair_relaxation = lambda get_values, set_values, dt: 'valid' # keeps the relaxed solution
+    bes     = BES_MILP_model('BES', E_min=0, E_max=5, P_max_cha=1, P_max_dis=1, eta_cha=0.9, eta_dis=0.8, relax_binary=True)
+    lp      = setup_controller(ctr_class, bes_lp, {}, {})
+    relaxed = setup_controller(ctr_class, bes, {}, {})
+
+    # full storage and feed in: the LP charges and discharges at once in the first period
+    lp.step(1, **{'BES.E_BES_0': 5})
+    get_values, _ = lp._block_accessors(bes_lp)
+    assert get_values('P_el_cha')[0] > 0.1 and get_values('P_el_dis')[0] > 0.1
+
+    # the solution can not be repaired, the MILP exports the feed in instead
+    relaxed.step(1, **{'BES.E_BES_0': 5})
+    get_values, _ = relaxed._block_accessors(bes)
+    assert relaxed.relaxation_counts['milp'] == 1
+    assert not np.any((get_values('P_el_cha') > 1e-6) & (get_values('P_el_dis') > 1e-6))
+    assert relaxed.telemetry.last()['objective'] > lp.telemetry.last()['objective'] + 1e-6
+    assert not np.allclose(relaxed._plan['outputs']['objective.P_el'], lp._plan['outputs']['objective.P_el'])
@@ -1,9 +1,14 @@
+import numpy as np
 from models.mp_controller.mp_controller import MPController
+from models.mp_controller.solution_cache import SolutionCache
 from models.mp_controller.opt_models.battery_storage import BES_MILP_model
+from models.mp_controller.opt_models.dhwh import DHW_MILP_model
 from models.mp_controller.opt_models.energy_community import EC__Residual_Load_MILP_model
 from models.mp_controller.opt_models.objective import Objective
 from models.mp_controller.forcasting import Forcasting
+import pytest
 import pyomo.environ as pyo
+from pyomo.core.expr import identify_variables
 
 def test_MPController_init():
     mpc = MPController('mpc', 3, 60*15)
@@ -167,3 +172,294 @@ def test_complete_scenario():
     outputs = ctr.step(5, **{'BES.E_BES_0':0, 'EC.forecast.P_ec':1})
     assert outputs['BES.P_el'] == 0.
 
+
+def test_persistent_solver_unknown():
+    with pytest.raises(ValueError):
+        MPController('mpc', 3, 60*15, pyo_solver_name='glpk', persistent=True)
+
+def test_persistent_complete_scenario():
+    ctr = MPController('mpc', n_periods=3,
+                       delta_t=1, persistent=True)
+    
+    # objective
+    objective = Objective('objective', objective='self-consumption')
+    ctr.add_model(objective)
+    
+    # EC
+    ec = EC__Residual_Load_MILP_model()
+    ctr.add_model(ec)
+
+    ec_fc = Forcasting(
+        method='generic_single_var_persistence',
+        inpt='P_ec',
+        delay=1,
+        init_val=0)
+    
+    ctr.add_forcaster(ec_fc, ec, 'P_resid_ec')
+
+    # BES
+    bes = BES_MILP_model('BES', 
+                         E_min=0, 
+                         E_max=5,
+                         P_max_cha=1,
+                         P_max_dis=1,
+                         eta_cha=1,
+                         eta_dis=1)
+    ctr.add_model(bes)
+
+    inp = {'BES.E_BES_0':2, 'EC.forecast.P_ec':1}
+    assert ctr.step(1, **inp)['BES.P_el'] == 0.
+    assert ctr.step(2, **inp)['BES.P_el'] == 0.
+    assert ctr.step(3, **inp)['BES.P_el'] == 0.
+    # the load is constant, any periods of the horizon are optimal for discharging the stored energy
+    assert ctr.step(4, **inp)['BES.P_el'] in (0., -1.)
+    assert ctr._plan['outputs']['BES.P_el'].sum() == -2.
+    assert ctr.step(5, **{'BES.E_BES_0':1, 'EC.forecast.P_ec':1})['BES.P_el'] in (0., -1.)
+    assert ctr._plan['outputs']['BES.P_el'].sum() == -1.
+    assert ctr.step(5, **{'BES.E_BES_0':0, 'EC.forecast.P_ec':1})['BES.P_el'] == 0.
+
+def test_shift_solution():
+    ctr = MPController('mpc', n_periods=3, delta_t=1)
+    ctr.model.x = pyo.Var(ctr.model.periods, domain=pyo.Binary)
+    ctr.model.s = pyo.Var(ctr.model.timepoints)
+    for p, val in enumerate([1, 0, 1]):
+        ctr.model.x[p].set_value(val)
+    for t, val in enumerate([0., 1., 2., 3.]):
+        ctr.model.s[t].set_value(val)
+
+    ctr._shift_solution()
+
+    assert [ctr.model.x[p].value for p in ctr.model.periods] == [0, 1, 1]
+    assert [ctr.model.s[t].value for t in ctr.model.timepoints] == [1., 2., 3., 3.]
+
+@pytest.mark.parametrize('persistent', [False, True])
+def test_warm_start_scenario(persistent):
+    ctr = MPController('mpc', n_periods=3,
+                       delta_t=1, persistent=persistent, warm_start=True)
+    
+    objective = Objective('objective', objective='self-consumption')
+    ctr.add_model(objective)
+    
+    ec = EC__Residual_Load_MILP_model()
+    ctr.add_model(ec)
+    ec_fc = Forcasting(
+        method='generic_single_var_persistence',
+        inpt='P_ec',
+        delay=1,
+        init_val=0)
+    ctr.add_forcaster(ec_fc, ec, 'P_resid_ec')
+
+    bes = BES_MILP_model('BES', 
+                         E_min=0, 
+                         E_max=5,
+                         P_max_cha=1,
+                         P_max_dis=1,
+                         eta_cha=1,
+                         eta_dis=1)
+    ctr.add_model(bes)
+
+    inp = {'BES.E_BES_0':2, 'EC.forecast.P_ec':1}
+    assert ctr.step(1, **inp)['BES.P_el'] == 0.
+    assert ctr.step(2, **inp)['BES.P_el'] == 0.
+    assert ctr.step(3, **inp)['BES.P_el'] == 0.
+    # the load is constant, any periods of the horizon are optimal for discharging the stored energy
+    assert ctr.step(4, **inp)['BES.P_el'] in (0., -1.)
+    assert ctr._plan['outputs']['BES.P_el'].sum() == -2.
+    assert ctr.step(5, **{'BES.E_BES_0':1, 'EC.forecast.P_ec':1})['BES.P_el'] in (0., -1.)
+    assert ctr._plan['outputs']['BES.P_el'].sum() == -1.
+    assert ctr.step(5, **{'BES.E_BES_0':0, 'EC.forecast.P_ec':1})['BES.P_el'] == 0.
+
+def make_replan_controller(**kwargs):
+    ctr = MPController('mpc', n_periods=3, delta_t=1, replan_on_event=True, return_future_control_output=True, **kwargs)
+    ctr.add_model(Objective('objective', objective='self-consumption'))
+    ec = EC__Residual_Load_MILP_model()
+    ctr.add_model(ec)
+
+    class ForcastingMock():
+        inputs = []
+        profile = [1, 0, 0, 0, 0, 0, 0, 0]
+        def get_forcast(self, time) -> list:
+            return self.profile[time:time+3]
+        def set_data(self, time):
+            pass
+        def set_forcast_length(self, n):
+            pass
+    ctr.add_forcaster(ForcastingMock(), ec, 'P_resid_ec')
+
+    bes = BES_MILP_model('BES', E_min=0, E_max=5, P_max_cha=1, P_max_dis=1, eta_cha=1, eta_dis=1)
+    ctr.add_model(bes)
+    return ctr
+
+def test_input_and_output_names():
+    ctr = make_replan_controller()
+    assert ctr.state_names() == ['BES.E_BES_0']
+    assert ctr.forecast_names() == ['EC.forecast.P_resid_ec']
+    assert ctr.output_names() == ['objective.P_el', 'BES.P_el']
+    assert ctr.forecast(1, {}) == {'EC.forecast.P_resid_ec': [0, 0, 0]}
+
+def test_forecast_views():
+    ctr = MPController('mpc', n_periods=3, delta_t=1, return_forcast=True)
+    ctr.add_model(Objective('objective', objective='self-consumption'))
+    ec = EC__Residual_Load_MILP_model()
+    ctr.add_model(ec)
+    ctr.add_forcaster(Forcasting('generic_single_var_persistence', inpt='P_resid', init_val=0., delay=0), ec, 'P_resid_ec')
+    ctr.add_model(BES_MILP_model('BES', E_min=0, E_max=5, P_max_cha=1, P_max_dis=1, eta_cha=1, eta_dis=1))
+
+    forecast = ctr.forecast(0, {'EC.forecast.P_resid': 1.})['EC.forecast.P_resid_ec']
+    assert isinstance(forecast, np.ndarray) and not forecast.flags.writeable # view of the forecaster
+
+    outputs = ctr.step(1, **{'BES.E_BES_0': 0, 'EC.forecast.P_resid': 2.})
+    planned = ctr._plan['forecasts']['EC.forecast.P_resid_ec'].copy()
+    ctr.forecast(2, {'EC.forecast.P_resid': 3.})
+    assert isinstance(outputs['EC.forecast.P_resid_ec'], list)
+    assert np.array_equal(ctr._plan['forecasts']['EC.forecast.P_resid_ec'], planned) # the plan keeps a copy
+
+def test_replan_on_event_replays_plan():
+    ctr = make_replan_controller()
+
+    assert ctr.step(0, **{'BES.E_BES_0':2})['BES.P_el'] == -1.
+    outputs = ctr.step(1, **{'BES.E_BES_0':1}) # state as planned, forecast unchanged
+    assert outputs['BES.P_el'] == 0.
+    assert outputs['BES.P_el_future'] == [0., 0., 0.]
+    ctr.step(2, **{'BES.E_BES_0':1})
+    ctr.step(3, **{'BES.E_BES_0':1}) # plan exhausted
+    
+    assert ctr.replan_statistics() == {'steps': 4, 'solves': 2, 'cache_hits': 0, 'skipped': 2, 'skip_ratio': 0.5}
+
+def test_replan_on_event_triggers():
+    ctr = make_replan_controller(max_replan_interval=2, state_tolerance={'BES.E_BES_0': 0.1})
+
+    ctr.step(0, **{'BES.E_BES_0':2})
+    ctr.step(1, **{'BES.E_BES_0':1.05}) # within tolerance
+    assert ctr.n_solves == 1
+    ctr.step(2, **{'BES.E_BES_0':1}) # max replan interval
+    assert ctr.n_solves == 2
+    ctr.step(3, **{'BES.E_BES_0':1.5}) # state drift
+    assert ctr.n_solves == 3
+
+    ctr.forcasters[0][2].profile = [1, 0, 0, 0, 0, 1, 0, 0]
+    ctr.step(4, **{'BES.E_BES_0':1.5}) # forecast change
+    assert ctr.n_solves == 4
+
+@pytest.mark.parametrize('persistent', [False, True])
+def test_telemetry_outputs(persistent):
+    ctr = make_replan_controller(persistent=persistent, return_telemetry=True)
+    assert 'telemetry.solve_time' in ctr.outputs
+
+    outputs = ctr.step(0, **{'BES.E_BES_0':2})
+    assert outputs['telemetry.status'] == 'optimal'
+    assert outputs['telemetry.solve_time'] > 0
+    assert outputs['telemetry.objective'] == pytest.approx(0.)
+    assert outputs['telemetry.mip_gap'] == 0.
+    outputs = ctr.step(1, **{'BES.E_BES_0':1}) # replayed plan
+    assert outputs['telemetry.status'] == 'replayed'
+    assert outputs['telemetry.solve_time'] == 0.
+
+    summary = ctr.telemetry.summary()
+    assert summary['steps'] == 2
+    assert summary['solves'] == 1
+    assert summary['status'] == {'optimal': 1, 'replayed': 1}
+    assert summary['solve_time']['max'] == summary['solve_time']['p95'] > 0
+
+def test_budget_unsupported_solver():
+    with pytest.raises(ValueError):
+        MPController('mpc', 3, 60*15, pyo_solver_name='glpk', time_limit=1.)
+
+@pytest.mark.parametrize('persistent', [False, True])
+def test_budget_fallback(persistent):
+    # a time limit of 0 s stops the solver before a feasible solution is found
+    ctr = make_replan_controller(persistent=persistent, time_limit=0., safe_outputs={'BES.P_el': 0.5})
+    ctr.replan_on_event = False
+
+    outputs = ctr.step(0, **{'BES.E_BES_0':2}) # no previous plan
+    assert outputs['BES.P_el'] == 0.5
+    assert outputs['objective.P_el'] == 0.
+    assert ctr.fallback_counts == {'optimal': 0, 'incumbent': 0, 'previous_plan': 0, 'safe_default': 1}
+
+    ctr.time_limit = ctr.solver.config.time_limit = 10.
+    assert ctr.step(1, **{'BES.E_BES_0':2})['BES.P_el'] == 0. # optimal
+
+    ctr.time_limit = ctr.solver.config.time_limit = 0.
+    outputs = ctr.step(2, **{'BES.E_BES_0':2}) # shifted previous plan
+    assert outputs['BES.P_el_future'] == [0., 0., 0.]
+    assert ctr.fallback_counts == {'optimal': 1, 'incumbent': 0, 'previous_plan': 1, 'safe_default': 1}
+    assert ctr.telemetry.last()['status'] == 'maxTimeLimit'
+
+def test_finalize_shared_sums():
+    ctr = make_replan_controller()
+    assert ctr.model.component('sum_constraint_P_el') is None # deferred until the first solve
+    ctr.finalize()
+    assert len(list(identify_variables(ctr.model.sum_expr_P_el[0]))) == 3
+
+    # models added after the first solve extend the sum
+    ctr.step(0, **{'BES.E_BES_0':2})
+    ctr.add_model(BES_MILP_model('BES2', E_min=0, E_max=5, P_max_cha=1, P_max_dis=1, eta_cha=1, eta_dis=1))
+    ctr.replan_on_event = False
+    outputs = ctr.step(0, **{'BES.E_BES_0':0, 'BES2.E_BES_0':2})
+    assert len(list(identify_variables(ctr.model.sum_expr_P_el[0]))) == 4
+    assert outputs['BES.P_el'] == 0. and outputs['BES2.P_el'] == -1.
+
+def test_period_durations_invalid():
+    with pytest.raises(ValueError):
+        MPController('mpc', 3, 60, period_durations=[60, 120])
+    with pytest.raises(ValueError):
+        MPController('mpc', 2, 60, period_durations=[60, 90])
+
+def test_period_durations_blocked_horizon():
+    ctr = MPController('mpc', n_periods=3, delta_t=1, period_durations=[1, 2, 3], return_future_control_output=True, return_future_state=True)
+    assert ctr.horizon == 6
+    ctr.add_model(Objective('objective', objective='self-consumption'))
+    ec = EC__Residual_Load_MILP_model()
+    ctr.add_model(ec)
+
+    class ForcastingMock():
+        inputs = []
+        def get_forcast(self, time) -> list:
+            return [1, -1, -1, 2, 2, 2]
+        def set_data(self, time):
+            pass
+        def set_forcast_length(self, n):
+            assert n == 6
+    ctr.add_forcaster(ForcastingMock(), ec, 'P_resid_ec')
+    ctr.add_model(BES_MILP_model('BES', E_min=0, E_max=10, P_max_cha=1, P_max_dis=1, eta_cha=1, eta_dis=1))
+
+    outputs = ctr.step(0, **{'BES.E_BES_0':1})
+    # forecasts are averaged over the periods
+    assert [pyo.value(ctr.model.EC.P_resid_ec[p]) for p in ctr.model.periods] == [1., -1., 2.]
+    # the plan has the resolution delta_t
+    assert outputs['BES.P_el'] == -1.
+    assert outputs['BES.P_el_future'] == pytest.approx([-1., 1., 1., -2/3, -2/3, -2/3])
+    assert outputs['BES.E_future'] == pytest.approx([1., 0., 1., 2., 4/3, 2/3, 0.])
+
+def test_solution_cache():
+    cache = SolutionCache(state_resolution=0.1)
+    ctr = make_replan_controller(solution_cache=cache, return_telemetry=True)
+    ctr.replan_on_event = False
+
+    ctr.step(0, **{'BES.E_BES_0':2})
+    outputs = ctr.step(0, **{'BES.E_BES_0':2.01}) # same quantized state and forecast
+    assert outputs['BES.P_el'] == -1.
+    assert outputs['telemetry.status'] == 'cached'
+    assert ctr.n_solves == 1
+    ctr.step(0, **{'BES.E_BES_0':3})
+    assert ctr.n_solves == 2
+    assert cache.statistics()['hits'] == 1
+    assert ctr.replan_statistics()['cache_hits'] == 1
+    assert ctr.replan_statistics()['skipped'] == 0
+
+    # a controller with different parameters does not share the plans
+    other = make_replan_controller(solution_cache=cache)
+    other.components[-1].P_max_dis = 2
+    other.step(0, **{'BES.E_BES_0':2})
+    assert other.n_solves == 1
+
+def test_cache_signature_parameters():
+    def signature(objective='self-consumption', eta=1.):
+        ctr = MPController('mpc', n_periods=3, delta_t=1)
+        ctr.add_model(Objective('objective', objective=objective))
+        ctr.add_model(DHW_MILP_model('DHW', eta=eta, P_nom=1., E_tes_min=0., E_tes_max=3))
+        return ctr._cache_signature()
+
+    assert signature() == signature()
+    assert signature(eta=3.) != signature()
+    assert signature(objective='self-consumption-slack') != signature()
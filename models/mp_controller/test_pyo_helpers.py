@@ -0,0 +1,56 @@
+from models.mp_controller import pyo_helpers as ph
+import numpy as np
+import pyomo.environ as pyo
+import pytest
+
+def make_model():
+    model = pyo.ConcreteModel()
+    model.periods = pyo.RangeSet(0, 2)
+    model.block = pyo.Block()
+    model.block.p = pyo.Param(model.periods, mutable=True, domain=pyo.Reals)
+    model.block.x = pyo.Var(model.periods)
+    return model
+
+def test_binding_set_values():
+    model = make_model()
+    binding = ph.IndexedBinding(model.block.p)
+    binding.set_values(np.array([1., 2., 3.]))
+
+    assert [pyo.value(model.block.p[i]) for i in model.periods] == [1., 2., 3.]
+    assert np.array_equal(binding.get_values(), [1., 2., 3.])
+
+def test_binding_wrong_length():
+    model = make_model()
+    binding = ph.IndexedBinding(model.block.p)
+    with pytest.raises(ValueError):
+        binding.set_values([1., 2.])
+
+def test_binding_get_var_values():
+    model = make_model()
+    binding = ph.IndexedBinding(model.block.x)
+    model.block.x[1].set_value(5.)
+
+    assert np.array_equal(binding.get_values(), [np.nan, 5., np.nan], equal_nan=True)
+
+def test_set_indexed_block_attribute_by_name():
+    model = make_model()
+    ph.set_indexed_block_attribute_by_name(model, 'block', 'p', [4, 5, 6])
+
+    assert ph.get_all_indexed_block_attributes_by_name(model, 'block', 'p') == [4, 5, 6]
+
+def test_binding_keeps_type():
+    model = make_model()
+    binding = ph.IndexedBinding(model.block.p)
+    binding.set_values(np.array([1, 2, 3]))
+
+    assert [type(pyo.value(model.block.p[i])) for i in model.periods] == [int]*3
+
+def test_binding_bulk_set_values():
+    model = make_model()
+    binding = ph.IndexedBinding(model.block.p)
+    assert binding._bulk and not ph.IndexedBinding(model.block.x)._bulk
+    binding.set_values(np.array([4., 5., 6.]))
+    assert np.array_equal(binding.get_values(), [4., 5., 6.])
+
+    with pytest.raises(ValueError):
+        binding.set_values(np.array([1., np.nan, 3.])) # not in the domain Reals (validated like set_value)
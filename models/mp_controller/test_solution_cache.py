@@ -0,0 +1,34 @@
+from models.mp_controller.solution_cache import SolutionCache
+import numpy as np
+
+def test_solution_cache_key_quantization():
+    cache = SolutionCache(state_resolution={'bes.E_BES_0': 10.}, forecast_resolution=1.)
+    key = cache.key('ctr', {'bes.E_BES_0': 101.}, {'EC.forecast.P_resid_ec': [1.2, -0.1]})
+    assert key == cache.key('ctr', {'bes.E_BES_0': 99.}, {'EC.forecast.P_resid_ec': [0.9, 0.]})
+    assert key != cache.key('ctr', {'bes.E_BES_0': 111.}, {'EC.forecast.P_resid_ec': [1.2, -0.1]})
+    assert key != cache.key('ctr', {'bes.E_BES_0': 101.}, {'EC.forecast.P_resid_ec': [1.2, -0.1, 0.]})
+    assert key != cache.key('other', {'bes.E_BES_0': 101.}, {'EC.forecast.P_resid_ec': [1.2, -0.1]})
+
+def test_solution_cache_lru():
+    cache = SolutionCache(max_size=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1 # b is now the least recently used
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('c') == 3
+    assert cache.statistics() == {'size': 2, 'hits': 2, 'misses': 1, 'evictions': 1, 'hit_ratio': 2/3}
+
+def test_solution_cache_persistence(tmp_path):
+    path = tmp_path / 'plans.npz'
+    cache = SolutionCache(path=path)
+    cache.put('a', {'outputs': {}})
+    cache.put('b', {'outputs': {'bes.P_el': np.array([1., -1.])}, 'states': {'bes.E': np.array([0., 1., 0.])}})
+    cache.save()
+
+    loaded = SolutionCache(path=path)
+    assert loaded.get('a') == {'outputs': {}}
+    plan = loaded.get('b')
+    assert np.array_equal(plan['outputs']['bes.P_el'], [1., -1.])
+    assert np.array_equal(plan['states']['bes.E'], [0., 1., 0.])
+    assert len(SolutionCache(max_size=0, path=path)) == 0
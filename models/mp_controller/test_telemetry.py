@@ -0,0 +1,29 @@
+from models.mp_controller.telemetry import SolverTelemetry, mip_gap
+import numpy as np
+
+def test_telemetry_ring_buffer():
+    tel = SolverTelemetry(capacity=3)
+    for i in range(5):
+        tel.record(True, update_time=0.1, solve_time=i, status='optimal', objective=i)
+    tel.record(False)
+
+    assert len(tel) == 3
+    rec = tel.records()
+    assert list(rec['step']) == [3, 4, 5]
+    assert list(rec['solve_time']) == [3., 4., 0.]
+    assert tel.last()['status'] == 'replayed'
+
+    summary = tel.summary()
+    assert summary['solves'] == 2
+    assert summary['solve_time']['max'] == 4.
+    assert summary['solve_time']['p50'] == 3.5
+    assert summary['status'] == {'optimal': 2, 'replayed': 1}
+
+    df = tel.to_frame()
+    assert list(df.index) == [3, 4, 5]
+    assert list(df['status']) == ['optimal', 'optimal', 'replayed']
+
+def test_mip_gap():
+    assert mip_gap(10., 9.) == 0.1
+    assert mip_gap(1., 1.) == 0.
+    assert np.isnan(mip_gap(np.nan, 1.))
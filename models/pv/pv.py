@@ -1,18 +1,29 @@
 import pandas as pd
 from pathlib import Path
+from util.profile_data import ProfileCursor, load_profile, read_synpro
 
 class SynproPV():
-    def __init__(self, name, P_pv_peak=50000):
+    def __init__(self, name, P_pv_peak=50000, start=None, end=None, margin=24*3600):
+        '''PV generation of the synPRO heating profile (only the simulated time range is loaded)
+
+        Parameters
+        ----------
+        name : str, name of the model
+        P_pv_peak : float, W, peak power
+        start : time (str or pd.Timestamp), first simulated time, only the data from start - margin is parsed and cached (None: from the beginning of the profile)
+        end : time (str or pd.Timestamp), last simulated time, only the data until end + margin is parsed and cached (None: to the end of the profile)
+        margin : int, s, data loaded before start and after end (e.g. for forecasts)'''
         self.name = name
         self.delta_t = 60  # s
 
-        self.df = pd.read_csv(Path(r'data/synPro/synPRO_Htg_H_3_1_App_9_Oc_18_MFHkl_MFH_5_Por_1_htg_17033.dat'), header=45, sep=';', index_col=2).drop(['YYYYMMDD', 'hhmmss'], axis=1)
-        self.df.index = pd.to_datetime(self.df.index, unit='s').shift(periods=+4, freq=pd.DateOffset(years = 1)).tz_localize('utc').tz_convert('Europe/Berlin') # shift to 2021, set timezone
+        profile = load_profile(Path(r'data/synPro/synPRO_Htg_H_3_1_App_9_Oc_18_MFHkl_MFH_5_Por_1_htg_17033.dat'), read_synpro, header=45, years=4, # shift to 2021
+                               columns=['P_pvn'], start=start, end=end, margin=margin)
         
-        self.df = (self.df.loc[:, ['P_pvn']]*(-P_pv_peak)).rename({'P_pvn': 'P_pv'}, axis=1)
+        self.df = (profile.frame(['P_pvn'], start, end, margin)*(-P_pv_peak)).rename({'P_pvn': 'P_pv'}, axis=1)
 
         self.inputs = []
         self.outputs = list(self.df.columns)
+        self.cursor = ProfileCursor(self.df)
 
     def step(self, time):
-        return self.df.loc[time].to_dict()
\ No newline at end of file
+        return self.cursor.step(time)
\ No newline at end of file
@@ -1,44 +1,145 @@
+import numpy as np
 import pandas as pd
-from collections import deque
+
+INTERVAL = 15*60 # s, metering interval of the smart meters
+
 
 class SmartMeter():
-    def __init__(self, name):
+    def __init__(self, name, capacity=2*96):
+        '''Smart meter that meters the quarter hourly mean of the grid power (quarter hours of the local wall-clock time).
+        The mean of the running quarter hour is accumulated every step, completed quarter hours are stored
+        in a preallocated numpy buffer until they are retrieved (retrieve_intervals or retrieve_data).
+
+        Parameters
+        ----------
+        name : str, name of the model
+        capacity : int, number of quarter hours the buffer holds initially (it grows if it is not retrieved in time)'''
         self.name = name
         self.delta_t = 60  # s
 
         self.inputs = ['P_'] # P_ as list attribute (endswith '_')
         self.outputs = ['P_grid']
 
-        self.reccords = []
+        self._shape  = () # shape of the metered power (one value)
+        self._times  = np.zeros(capacity, dtype=np.int64) # ns, start of the completed quarter hours
+        self._values = np.zeros(self._shape + (capacity,)) # W, mean power of the completed quarter hours (last axis)
+        self._n      = 0 # number of completed quarter hours in the buffer
+        self._tz     = None
+
+        # running quarter hour
+        self._interval = None # ns, start
+        self._sum      = 0. # W
+        self._count    = 0
 
     def step(self, time, P_):
         P_grid = sum(P_)
-        self.reccords.append((time, P_grid))
+        time = time if isinstance(time, pd.Timestamp) else pd.Timestamp(time)
+        ns = time.value
+        offset = time.utcoffset() # None: naive
+        wall = ns if offset is None else ns + (offset.days*86400 + offset.seconds)*10**9
+        interval = ns - wall % (INTERVAL*10**9) # aligned to the local wall-clock time
+        if interval != self._interval:
+            if self._interval is not None:
+                self._complete()
+            else:
+                self._tz = getattr(time, 'tz', None)
+            self._interval, self._sum, self._count = interval, 0., 0
+        self._sum += P_grid
+        self._count += 1
         return {'P_grid': P_grid}
 
+    def _complete(self) -> None:
+        '''move the running quarter hour into the buffer'''
+        if self._n == len(self._times):
+            self._times  = np.concatenate([self._times, np.zeros_like(self._times)])
+            self._values = np.concatenate([self._values, np.zeros_like(self._values)], axis=-1)
+        self._times[self._n]       = self._interval
+        self._values[..., self._n] = self._sum / self._count
+        self._n += 1
+
+    @property
+    def pending(self) -> int:
+        '''number of quarter hours the next retrieve_intervals returns'''
+        return self._n + int(self._count >= INTERVAL // self.delta_t)
+
+    def retrieve_intervals(self, out=None):
+        '''retrieve the completed quarter hours since the last retrieval (the running quarter hour is included once it has all its steps)
+
+        Parameters
+        ----------
+        out : np.ndarray, optional, preallocated array (last axis >= pending) the mean power is written to
+
+        Returns
+        -------
+        (start of the quarter hours in ns (int64), mean power in W), copies (the power is a view of out if given)'''
+        if self._count >= INTERVAL // self.delta_t:
+            self._complete()
+            self._interval, self._sum, self._count = None, 0., 0
+        times = self._times[:self._n].copy()
+        if out is None:
+            values = self._values[..., :self._n].copy()
+        else:
+            values = out[..., :self._n]
+            values[...] = self._values[..., :self._n]
+        self._n = 0
+        return times, values
+
+    @property
+    def tz(self):
+        '''time zone of the metered times (None: naive)'''
+        return self._tz
+
+    def _index(self, times) -> pd.DatetimeIndex:
+        index = pd.to_datetime(times, unit='ns', utc=self._tz is not None)
+        return index.tz_convert(self._tz) if self._tz is not None else index
+
     def retrieve_data(self) -> pd.Series:
-        '''retrieve the quarter hourly Energy as pd.Series
+        '''retrieve the quarter hourly mean power as pd.Series
         data only contains new values since the last retrieval'''
-
-        if not self.reccords:
+        times, values = self.retrieve_intervals()
+        if not len(times):
             return pd.Series([], name=self.name)
-        
-        df = pd.DataFrame.from_records(
-            self.reccords, 
-            columns=['index', self.name], 
-            index='index'
-            )
-        self.reccords = []
-   
-        if df.shape[0] < 15:
-            return pd.Series([], name=self.name)
-        
-        ser = df.squeeze()
-        # resampled_data = (ser*self.delta_t).resample('15min').sum()
-        resampled_data = ser.resample('15min').mean()
-        
-        return resampled_data
-    
+        return pd.Series(values, index=self._index(times), name=self.name)
+
+    @property
+    def reccords(self) -> list:
+        '''completed quarter hours that are not retrieved yet, as list of (time, P_grid) tuples
+        (start of the quarter hour as pd.Timestamp, mean power), emptied by the retrieval'''
+        return list(zip(self._index(self._times[:self._n]), np.moveaxis(self._values[..., :self._n], -1, 0).tolist()))
+
+
+class SmartMeterFleet(SmartMeter):
+    def __init__(self, name, meter_names:list, capacity=2*96):
+        '''Smart meters of N connections in one model (vectorized SmartMeter for large communities).
+        The connected inputs P_ are arrays with the power of every connection (or scalars for all connections),
+        the completed quarter hours are kept in an (N x quarter hours) matrix.
+        The GridOperator gets all meters as one block (retrieve_intervals / retrieve_data).
+
+        Parameters
+        ----------
+        name : str, name of the model
+        meter_names : list of str, names of the N metered connections (columns of retrieve_data)
+        capacity : int, number of quarter hours the buffer holds initially (it grows if it is not retrieved in time)'''
+        super().__init__(name, capacity)
+        self.meter_names = list(meter_names)
+
+        self.outputs = ['P_grid', 'P_grid_total'] # W, per connection (array) and sum of all connections
+
+        self._shape  = (len(self.meter_names),)
+        self._values = np.zeros(self._shape + (capacity,))
+
+    def step(self, time, P_):
+        P_grid = super().step(time, [np.asarray(sum(P_), dtype=float) * np.ones(self._shape)])['P_grid']
+        return {'P_grid': P_grid, 'P_grid_total': float(P_grid.sum())}
+
+    def retrieve_data(self) -> pd.DataFrame:
+        '''retrieve the quarter hourly mean power of all meters as pd.DataFrame (one column per meter)
+        data only contains new values since the last retrieval'''
+        times, values = self.retrieve_intervals()
+        if not len(times):
+            return pd.DataFrame([], columns=self.meter_names)
+        return pd.DataFrame(values.T, index=self._index(times), columns=self.meter_names)
+
 
 class ElectricityMeter():
     def __init__(self, name):
@@ -2,7 +2,7 @@ import pytest
 import numpy as np
 import pandas as pd
 from unittest.mock import MagicMock, patch
-from models.smart_meter.smart_meter import SmartMeter
+from models.smart_meter.smart_meter import SmartMeter, SmartMeterFleet
 
 
 def test_smartmeter_initialization():
@@ -53,3 +53,62 @@ def test_smart_meter_retrieve_data():
     assert np.isclose(df.loc['2022-01-01 00:30:00'], expected_value1, atol=1e-3), 'aggregation seems to fail'
     assert np.isclose(df.loc['2022-01-01 00:45:00'], expected_value2, atol=1e-3), 'aggregation seems to fail'
     
+
+def test_smart_meter_running_interval_is_kept():
+    smartmeter = SmartMeter('name')
+    times = pd.date_range('2022-01-01 00:00', periods=20, freq='1min', tz='Europe/Berlin')
+    for i, t in enumerate(times):
+        smartmeter.step(t, P_=[float(i)])
+
+    # only the completed quarter hour is retrieved, the running one is kept
+    ser = smartmeter.retrieve_data()
+    assert ser.index.tolist() == [times[0]]
+    assert ser.iloc[0] == np.arange(15).mean()
+
+    for i, t in enumerate(pd.date_range('2022-01-01 00:20', periods=10, freq='1min', tz='Europe/Berlin')):
+        smartmeter.step(t, P_=[float(20+i)])
+    times, values = smartmeter.retrieve_intervals()
+    assert pd.to_datetime(times, unit='ns', utc=True).tz_convert('Europe/Berlin').tolist() == [pd.Timestamp('2022-01-01 00:15', tz='Europe/Berlin')]
+    assert values.tolist() == [np.arange(15, 30).mean()]
+
+
+def test_smart_meter_fleet_matches_single_meters():
+    names = ['sm1', 'sm2', 'sm3']
+    fleet = SmartMeterFleet('fleet', names)
+    meters = [SmartMeter(name) for name in names]
+    P_values = np.random.default_rng(0).random((40, 2, len(names)))*2000 # two inputs per connection
+
+    for i, (p1, p2) in enumerate(P_values):
+        timestamp = pd.to_datetime(i, origin='2022-01-01 00:00', unit='m')
+        outputs = fleet.step(timestamp, P_=[p1, p2])
+        for j, meter in enumerate(meters):
+            meter.step(timestamp, P_=[p1[j], p2[j]])
+    assert np.allclose(outputs['P_grid'], P_values[-1].sum(axis=0))
+    assert np.isclose(outputs['P_grid_total'], P_values[-1].sum())
+
+    df = fleet.retrieve_data()
+    assert df.columns.tolist() == names
+    assert df.shape == (2, 3) # the running quarter hour is kept
+    pd.testing.assert_frame_equal(df, pd.concat([meter.retrieve_data() for meter in meters], axis=1))
+
+def test_smart_meter_fleet_intervals_matrix():
+    fleet = SmartMeterFleet('fleet', ['sm1', 'sm2'], capacity=1)
+    for i, t in enumerate(pd.date_range('2022-01-01 00:00', periods=45, freq='1min', tz='Europe/Berlin')):
+        fleet.step(t, P_=[float(i)]) # scalar input, the same for all connections
+    times, values = fleet.retrieve_intervals()
+    assert values.shape == (2, 3) # meters x quarter hours (the buffer grew)
+    assert values[0].tolist() == values[1].tolist() == [7., 22., 37.]
+    assert fleet.retrieve_data().empty
+
+
+def test_smart_meter_local_intervals(monkeypatch):
+    monkeypatch.setattr('models.smart_meter.smart_meter.INTERVAL', 60*60) # hourly, utc+05:30 is not on the utc grid
+    smartmeter = SmartMeter('name')
+    times = pd.date_range('2022-01-01 00:00', periods=90, freq='1min', tz='Asia/Kolkata')
+    for i, t in enumerate(times):
+        smartmeter.step(t, P_=[float(i)])
+
+    assert smartmeter.reccords == [(pd.Timestamp('2022-01-01 00:00', tz='Asia/Kolkata'), np.arange(60).mean())]
+    ser = smartmeter.retrieve_data()
+    assert ser.index.tolist() == [times[0]]
+    assert not smartmeter.reccords
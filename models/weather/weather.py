@@ -1,20 +1,31 @@
 import pandas as pd
 from pathlib import Path
+from util.profile_data import ProfileCursor, load_profile, read_synpro
 
 
 class SynproWeather():
-    def __init__(self, name):
+    def __init__(self, name, start=None, end=None, margin=24*3600):
+        '''Weather of the synPRO heating profile (only the simulated time range and the used columns are loaded)
+
+        Parameters
+        ----------
+        name : str, name of the model
+        start : time (str or pd.Timestamp), first simulated time, only the data from start - margin is parsed and cached (None: from the beginning of the profile)
+        end : time (str or pd.Timestamp), last simulated time, only the data until end + margin is parsed and cached (None: to the end of the profile)
+        margin : int, s, data loaded before start and after end (e.g. for forecasts)'''
         self.name = name
         self.delta_t = 60  # s
 
-        self.df = pd.read_csv(Path(r'data/synPro/synPRO_Htg_H_3_1_App_9_Oc_18_MFHkl_MFH_5_Por_1_htg_17033.dat'), header=45, sep=';', index_col=2).drop(['YYYYMMDD', 'hhmmss'], axis=1)
-        self.df.index = pd.to_datetime(self.df.index, unit='s').shift(periods=+4, freq=pd.DateOffset(years = 1)).tz_localize('utc').tz_convert('Europe/Berlin') # shift to 2021, set timezone
+        columns = ['t_amb', 'I_dir', 'I_dif', 'I_s', 'I_w', 'I_n', 'I_e']
+        profile = load_profile(Path(r'data/synPro/synPRO_Htg_H_3_1_App_9_Oc_18_MFHkl_MFH_5_Por_1_htg_17033.dat'), read_synpro, header=45, years=4, # shift to 2021
+                               columns=columns, start=start, end=end, margin=margin)
         
-        self.df = self.df.loc[:, ['t_amb', 'I_dir', 'I_dif', 'I_s', 'I_w', 'I_n', 'I_e']].rename({'t_amb': 'T_amb'}, axis=1)
+        self.df = profile.frame(columns, start, end, margin).rename({'t_amb': 'T_amb'}, axis=1)
 
         self.inputs = []
         self.outputs = list(self.df.columns)
+        self.cursor = ProfileCursor(self.df)
 
     def step(self, time):
-        return self.df.loc[time].to_dict()
+        return self.cursor.step(time)
         
\ No newline at end of file
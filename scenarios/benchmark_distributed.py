@@ -0,0 +1,77 @@
+'''Benchmark of the per step latency of the DistributedMPController (ADMM)
+against the monolithic MatrixMPController for energy communities with 10, 50 and 200 battery storages.
+Run from the root directory: python -m scenarios.benchmark_distributed'''
+import os
+import time
+import numpy as np
+import pandas as pd
+
+# Controller
+from models.mp_controller.matrix_backend import MatrixMPController
+from models.mp_controller.distributed import DistributedMPController
+from models.mp_controller.opt_models.battery_storage import BES_MILP_model
+from models.mp_controller.opt_models.energy_community import EC__Residual_Load_MILP_model
+from models.mp_controller.opt_models.objective import Objective
+from models.mp_controller.forcasting import Forcasting
+
+n_steps   = 8 # 2 h @ 15 min
+n_periods = 96
+delta_t   = 60*15 # s
+E_max     = 5_000*3600 # J per member
+
+rng = np.random.default_rng(42)
+
+
+def make_controller(n_members, P_ec, ctr_class=MatrixMPController, **kwargs):
+    mp_contr = ctr_class(name='MPC', n_periods=n_periods, delta_t=delta_t, **kwargs)
+
+    mp_contr.add_model(Objective('objective', objective='self-consumption'))
+
+    milp_ec = EC__Residual_Load_MILP_model()
+    mp_contr.add_model(milp_ec)
+    ec_forcast = Forcasting('generic_single_var_persistence', 'P_ec', init_val=0)
+    mp_contr.add_forcaster(ec_forcast, milp_ec, 'P_resid_ec')
+
+    for m in range(n_members):
+        mp_contr.add_model(BES_MILP_model(
+            name=f'bes_{m}',
+            E_min=0,
+            E_max=E_max,
+            P_max_cha=1000, # W
+            P_max_dis=1000, # W
+            eta_cha=0.9, #
+            eta_dis=0.9 #
+            ))
+    return mp_contr
+
+
+def run(mp_contr, n_members, P_ec):
+    '''steps the controller and returns the latency of every step in s'''
+    latency = np.zeros(n_steps)
+    E_bes = np.full(n_members, E_max/2)
+    for i, t in enumerate(pd.date_range('2021-01-01 00:00', periods=n_steps, freq='15min', tz='Europe/Berlin')):
+        inputs = {f'bes_{m}.E_BES_0': E_bes[m] for m in range(n_members)}
+        start = time.perf_counter()
+        outputs = mp_contr.step(t, **inputs, **{'EC.forecast.P_ec': P_ec[i]})
+        latency[i] = time.perf_counter() - start
+        P_el = np.array([outputs[f'bes_{m}.P_el'] for m in range(n_members)])
+        E_bes = np.clip(E_bes + P_el*delta_t*0.9, 0, E_max) # simple plant
+    return latency
+
+
+def report(label, latency):
+    print(f'{label:<40} mean {latency.mean()*1e3:9.1f} ms | p50 {np.percentile(latency, 50)*1e3:9.1f} ms | p95 {np.percentile(latency, 95)*1e3:9.1f} ms | first {latency[0]*1e3:9.1f} ms')
+
+
+if __name__ == '__main__':
+    n_workers = os.cpu_count()
+    for n_members in [10, 50, 200]:
+        # synthetic residual load of the EC (day/night pattern with pv surplus at noon) in W
+        P_ec = n_members*(500 - 1500*np.clip(np.sin(np.linspace(0, 2*np.pi, n_steps+n_periods)), 0, None)) + rng.normal(0, 300, n_steps+n_periods)
+
+        report(f'{n_members} members, monolithic', run(make_controller(n_members, P_ec), n_members, P_ec))
+
+        mp_contr = make_controller(n_members, P_ec, DistributedMPController, n_workers=n_workers)
+        report(f'{n_members} members, ADMM {n_workers} workers', run(mp_contr, n_members, P_ec))
+        print(f'{"":<40} iterations of the last step {mp_contr.n_iterations}, primal residual {mp_contr.residuals[-1]:.2f} W')
+        mp_contr.close()
@@ -0,0 +1,157 @@
+'''Microbenchmark of the persistence forecasters (set_data + get_forcast every step)
+over one year at minute resolution with a 96 period horizon,
+against the previous implementation that shifted a pandas Series every step.
+And of the smart meter forecaster over one year at 15 min resolution (smart meter data once a day),
+against the previous implementation that grew a pandas DataFrame.
+And the cost per step and the error of the online regression forecaster against the persistence of the day before,
+and the cost per step of the perfect foresight forecaster on a minute resolution profile.
+Run from the root directory: python -m scenarios.benchmark_forecasting'''
+import time
+import numpy as np
+import pandas as pd
+
+from models.mp_controller.forcasting import Forcasting
+
+n_steps   = 365*24*60 # one year @ 1 min
+n_periods = 96
+
+
+class PandasPersistenceForcasting():
+    '''the previous implementation of generic_single_var_persistence (reference)'''
+    def __init__(self, inpt:str, init_val=np.nan, delay=1):
+        self.inputs = [inpt]
+        self.inpt = inpt
+        self.init_val = init_val
+        self.delay = delay
+
+    def get_forcast(self, time) -> list:
+        return self.ser.loc[:self.periods-1].values.tolist()
+
+    def set_data(self, time, **values) -> None:
+        value = values[self.inpt]
+        self.ser = self.ser.shift(-1)
+        self.ser.loc[self.last_index] = value
+
+    def set_forcast_length(self, n:int) -> None:
+        self.periods = n
+        self.ser = pd.Series(data=np.full(self.delay+self.periods, self.init_val), index=range(self.delay+self.periods))
+        self.last_index = self.delay+self.periods-1
+
+
+class PandasSmartmeterForcasting():
+    '''the previous implementation of persistence_residual_load_smartmeter (reference)'''
+    def __init__(self, default_val=np.nan, delay_periods=1):
+        self.inputs = ['P_flex_']
+        self.default_val = default_val
+        self.delay_periods = delay_periods
+        self.data = pd.DataFrame([], columns=['P_tot','P_flex', 'P_resid'])
+        self.last_valid_index = pd.to_datetime('1990-01-01 00:00').tz_localize(tz='Europe/Berlin')
+
+    def get_forcast(self, time) -> list:
+        for days in [1, 7]:
+            start_dt = time + self.timedelta_delay - pd.Timedelta(days, 'day')
+            end_dt = start_dt + self.timedelta_periods
+            if end_dt <= self.last_valid_index and start_dt >= self.first_valid_index:
+                return self.data.loc[start_dt:end_dt, 'P_resid'].to_list()
+        return [self.default_val] * self.periods
+
+    def _valid_range(self):
+        df_usefull = self.data.dropna()
+        if not df_usefull.empty:
+            self.first_valid_index = df_usefull.index[0]
+            self.last_valid_index = df_usefull.index[-1]
+
+    def set_data(self, time, P_flex_) -> None:
+        self.data.at[time, 'P_flex'] = sum(P_flex_)
+        self._valid_range()
+
+    def set_delta_t(self, delta_t:int) -> None:
+        self.delta_t = delta_t
+        self.timedelta_delay = pd.to_timedelta(self.delay_periods*delta_t, unit='s')
+
+    def set_forcast_length(self, n:int) -> None:
+        self.periods = n
+        self.timedelta_periods = pd.Timedelta((n-1)*self.delta_t, unit='s')
+
+    def set_smart_meter_data(self, df_P_daily):
+        P_tot = df_P_daily.sum(axis=1).squeeze()
+        self.data = self.data.reindex(self.data.index.union(P_tot.index))
+        self.data.loc[P_tot.index, 'P_tot'] = P_tot.values
+        self.data['P_resid'] = self.data['P_tot'] - self.data['P_flex']
+        self._valid_range()
+
+
+def run_smartmeter(forecaster, n_days):
+    '''returns the time per step in s of the first and the last day'''
+    forecaster.set_delta_t(15*60)
+    forecaster.set_forcast_length(n_periods)
+    index = pd.date_range('2021-01-01', periods=n_days*96, freq='15min', tz='Europe/Berlin')
+    P = np.random.default_rng(42).normal(0, 1000, len(index))
+    times = []
+    for day in range(n_days):
+        start = time.perf_counter()
+        for t in index[day*96:(day+1)*96]:
+            forecaster.set_data(t, [0.])
+            forecaster.get_forcast(t)
+        forecaster.set_smart_meter_data(pd.DataFrame({'sm': P[day*96:(day+1)*96]}, index=index[day*96:(day+1)*96]))
+        times += [(time.perf_counter() - start) / 96]
+    return times[0], times[-1], sum(times)*96
+
+
+def run(forecaster, values, n_steps, **kwargs):
+    '''returns the time per step in s'''
+    forecaster.set_forcast_length(n_periods)
+    start = time.perf_counter()
+    for t in range(n_steps):
+        forecaster.set_data(t, v=values[t])
+        forecaster.get_forcast(t, **kwargs)
+    return (time.perf_counter() - start) / n_steps
+
+
+if __name__ == '__main__':
+    values = np.random.default_rng(42).normal(0, 1000, n_steps)
+
+    # the pandas reference is too slow for a whole year, it is extrapolated from 10 days
+    n_ref = 10*24*60
+    t_pandas = run(PandasPersistenceForcasting('v', init_val=0), values, n_ref)
+    print(f'pandas Series (previous)  : {t_pandas*1e6:8.2f} us/step | one year (extrapolated) {t_pandas*n_steps:7.1f} s')
+
+    for copy in [True, False]:
+        t_ring = run(Forcasting('generic_single_var_persistence', 'v', init_val=0), values, n_steps, copy=copy)
+        label = 'ring buffer, list' if copy else 'ring buffer, view'
+        print(f'{label:<26}: {t_ring*1e6:8.2f} us/step | one year {t_ring*n_steps:7.1f} s | speedup {t_pandas/t_ring:6.1f}x')
+
+    # the pandas reference grows quadratically, it is only run for 60 days
+    for label, forecaster, n_days in [('pandas DataFrame (previous)', PandasSmartmeterForcasting(default_val=0), 60),
+                                      ('history store', Forcasting('persistence_residual_load_smartmeter', default_val=0), 60),
+                                      ('history store', Forcasting('persistence_residual_load_smartmeter', default_val=0), 365)]:
+        t_first, t_last, t_total = run_smartmeter(forecaster, n_days)
+        print(f'{label:<28} {n_days:3d} days: first day {t_first*1e6:8.1f} us/step | last day {t_last*1e6:8.1f} us/step | total {t_total:6.1f} s')
+
+    # online regression vs. persistence of the day before on a synthetic load (daily pattern, weekend offset, noise) @ 15 min
+    index = pd.date_range('2021-01-01', periods=365*96, freq='15min', tz='Europe/Berlin')
+    load  = 1000 + 500*np.sin(2*np.pi*np.asarray(index.hour*60 + index.minute)/1440) + 300*np.asarray(index.dayofweek >= 5) + np.random.default_rng(1).normal(0, 100, len(index))
+    rls = Forcasting('online_regression', 'P', init_val=0)
+    rls.set_forcast_length(n_periods)
+    rls.set_delta_t(15*60)
+    errors, persistence_errors, start = [], [], time.perf_counter()
+    for i, t in enumerate(index[:-n_periods-1]):
+        rls.set_data(t, P=load[i])
+        forcast = rls.get_forcast(t, copy=False)
+        if i >= 28*96: # after four weeks
+            actual = load[i+1:i+1+n_periods]
+            errors += [np.abs(forcast - actual).mean()]
+            persistence_errors += [np.abs(load[i+1-96:i+1-96+n_periods] - actual).mean()]
+    t_rls = (time.perf_counter() - start) / (len(index)-n_periods-1)
+    print(f'online regression           : {t_rls*1e6:8.1f} us/step | MAE {np.mean(errors):6.1f} W | persistence (day before) MAE {np.mean(persistence_errors):6.1f} W')
+
+    # perfect foresight on a minute resolution profile, forecast every 15 min
+    profile = pd.Series(np.random.default_rng(2).normal(0, 1000, n_steps), index=pd.date_range('2021-01-01', periods=n_steps, freq='1min', tz='Europe/Berlin'))
+    perfect = Forcasting('perfect_foresight', profile)
+    perfect.set_forcast_length(n_periods)
+    perfect.set_delta_t(15*60)
+    times = profile.index[::15]
+    start = time.perf_counter()
+    for t in times:
+        perfect.get_forcast(t, copy=False)
+    print(f'perfect foresight, view     : {(time.perf_counter() - start) / len(times)*1e6:8.2f} us/step')
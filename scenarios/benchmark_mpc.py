@@ -0,0 +1,77 @@
+'''Benchmark of the per step latency of the MPController 
+with the 96 period BES + EC setup of scenarios/scenario.py.
+Run from the root directory: python -m scenarios.benchmark_mpc'''
+import time
+import numpy as np
+import pandas as pd
+
+# Controller
+from models.mp_controller.mp_controller import MPController
+from models.mp_controller.matrix_backend import MatrixMPController
+from models.mp_controller.opt_models.battery_storage import BES_MILP_model
+from models.mp_controller.opt_models.energy_community import EC__Residual_Load_MILP_model
+from models.mp_controller.opt_models.objective import Objective
+from models.mp_controller.forcasting import Forcasting
+
+n_steps   = 96 # one day @ 15 min
+n_periods = 96
+delta_t   = 60*15 # s
+
+# synthetic residual load of the EC (day/night pattern with pv surplus at noon) in W
+rng = np.random.default_rng(42)
+P_ec = 2000 - 6000*np.clip(np.sin(np.linspace(0, 2*np.pi, n_steps+n_periods)), 0, None) + rng.normal(0, 300, n_steps+n_periods)
+
+
+def make_controller(ctr_class=MPController, n_periods=n_periods, **kwargs):
+    mp_contr = ctr_class(name='MPC', n_periods=n_periods, delta_t=delta_t, **kwargs)
+
+    objective = Objective('objective', objective='self-consumption')
+    mp_contr.add_model(objective)
+
+    milp_ec = EC__Residual_Load_MILP_model()
+    mp_contr.add_model(milp_ec)
+    ec_forcast = Forcasting('generic_single_var_persistence', 'P_ec', init_val=0)
+    mp_contr.add_forcaster(ec_forcast, milp_ec, 'P_resid_ec')
+
+    milp_bes = BES_MILP_model(
+        name='bes',
+        E_min=0,
+        E_max=20_000*3600, # J
+        P_max_cha=2000, # W
+        P_max_dis=2000, # W
+        eta_cha=0.9, # 
+        eta_dis=0.9 # 
+        )
+    mp_contr.add_model(milp_bes)
+    return mp_contr
+
+
+def run(mp_contr):
+    '''steps the controller and returns the latency of every step in s'''
+    latency = np.zeros(n_steps)
+    E_bes = 10_000*3600 # J
+    for i, t in enumerate(pd.date_range('2021-01-01 00:00', periods=n_steps, freq='15min', tz='Europe/Berlin')):
+        start = time.perf_counter()
+        outputs = mp_contr.step(t, **{'bes.E_BES_0': E_bes, 'EC.forecast.P_ec': P_ec[i]})
+        latency[i] = time.perf_counter() - start
+        E_bes = np.clip(E_bes + outputs['bes.P_el']*delta_t*0.9, 0, 20_000*3600) # simple plant
+    return latency
+
+
+def report(label, latency):
+    print(f'{label:<30} mean {latency.mean()*1e3:8.2f} ms | p50 {np.percentile(latency, 50)*1e3:8.2f} ms | p95 {np.percentile(latency, 95)*1e3:8.2f} ms | first {latency[0]*1e3:8.2f} ms')
+
+
+if __name__ == '__main__':
+    report('re-solve every step', run(make_controller()))
+    report('persistent solver', run(make_controller(persistent=True)))
+    report('persistent solver, warm start', run(make_controller(persistent=True, warm_start=True)))
+
+    mp_contr = make_controller(persistent=True, replan_on_event=True, state_tolerance=0.01*20_000*3600, max_replan_interval=16)
+    report('event triggered replanning', run(mp_contr))
+    print(mp_contr.replan_statistics())
+
+    report('matrix backend (highspy)', run(make_controller(MatrixMPController)))
+
+    # 15 min for the first 4 h, hourly afterwards: 36 instead of 96 periods for the same 24 h horizon
+    report('blocked horizon (36 periods)', run(make_controller(n_periods=36, period_durations=[delta_t]*16 + [4*delta_t]*20)))
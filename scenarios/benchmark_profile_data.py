@@ -0,0 +1,70 @@
+'''Benchmark of the startup of the profile models: parsing a synPRO .dat file (one year @ 1 min, as read by SynproWeather and SynproPV)
+against loading it from the binary cache (read_cached),
+and the startup time and memory of n models that use the same file with the registry (load_profile) against a cache hit per model,
+the step lookup of a profile model (ProfileCursor) against df.loc[time].to_dict(),
+and the startup of a weather model (PV columns not used) for one simulated week against the whole year (Profile.frame with start and end).
+The file is synthetic and written to a temporary directory.
+Run from the root directory: python -m scenarios.benchmark_profile_data'''
+import time
+import tempfile
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+from util.profile_data import read_cached, read_synpro, ProfileRegistry, ProfileCursor
+
+columns = ['t_amb', 'I_dir', 'I_dif', 'I_s', 'I_w', 'I_n', 'I_e', 'P_pvn']
+
+
+def write_synpro(path, n=365*24*60, header=45):
+    times  = pd.date_range('2017-01-01', periods=n, freq='1min', tz='utc')
+    values = np.random.default_rng(42).normal(0, 100, (n, len(columns))).round(3)
+    df = pd.DataFrame(values, columns=columns)
+    df.insert(0, 'unixtimestamp', times.as_unit('s').asi8)
+    df.insert(0, 'hhmmss', times.strftime('%H%M%S'))
+    df.insert(0, 'YYYYMMDD', times.strftime('%Y%m%d'))
+    with open(path, 'w') as f:
+        f.write('# synPRO\n' * header)
+        df.to_csv(f, sep=';', index=False)
+
+
+def timed(func, *args, **kwargs):
+    '''returns the time of the call in s'''
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as tmp:
+        path, cache_dir = Path(tmp).joinpath('synPRO_Htg.dat'), Path(tmp).joinpath('cache')
+        write_synpro(path)
+
+        t_parse = timed(read_synpro, path, header=45, years=4)
+        t_miss  = timed(read_cached, path, read_synpro, cache_dir=cache_dir, header=45, years=4)
+        t_hit   = min(timed(read_cached, path, read_synpro, cache_dir=cache_dir, header=45, years=4) for _ in range(5))
+        print(f'parse {t_parse*1e3:8.1f} ms | cache miss (parse + store) {t_miss*1e3:8.1f} ms | cache hit {t_hit*1e3:6.1f} ms | speedup {t_parse/t_hit:6.1f}x')
+
+        for n_models in [2, 10, 50]:
+            t_cached = timed(lambda: [read_cached(path, read_synpro, cache_dir=cache_dir, header=45, years=4) for _ in range(n_models)])
+            registry = ProfileRegistry()
+            t_registry = timed(lambda: [registry.load(path, read_synpro, cache_dir=cache_dir, header=45, years=4).frame() for _ in range(n_models)])
+            nbytes = registry.statistics()['nbytes']
+            print(f'{n_models:3d} models | cache hit per model {t_cached*1e3:7.1f} ms, {n_models*nbytes/1e6:7.1f} MB'
+                  f' | registry {t_registry*1e3:7.1f} ms, {nbytes/1e6:7.1f} MB')
+
+        df = registry.load(path, read_synpro, cache_dir=cache_dir, header=45, years=4).frame(columns[:7])
+        times = df.index[:10*24*60] # 10 days
+        t_loc = timed(lambda: [df.loc[t].to_dict() for t in times]) / len(times)
+        cursor = ProfileCursor(df)
+        t_cursor = timed(lambda: [cursor.step(t) for t in times]) / len(times)
+        print(f'step lookup | df.loc {t_loc*1e6:6.1f} us/step, one year {t_loc*len(df):6.1f} s'
+              f' | cursor {t_cursor*1e6:6.2f} us/step, one year {t_cursor*len(df):6.1f} s | speedup {t_loc/t_cursor:6.1f}x')
+
+        for label, start, end in [('one year', None, None), ('one week', '2021-07-01 00:00', '2021-07-07 00:00')]:
+            def startup():
+                frame = ProfileRegistry().load(path, read_synpro, cache_dir=cache_dir, header=45, years=4).frame(columns[:7], start, end, margin=24*3600)
+                return ProfileCursor(frame), frame
+            t_startup = min(timed(startup) for _ in range(5))
+            cursor, frame = startup()
+            print(f'startup {label:<8} | {t_startup*1e3:6.1f} ms | {len(frame):6d} rows | column data {sum(values.nbytes for values in cursor.columns)/1e6:6.1f} MB')
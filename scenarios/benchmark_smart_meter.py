@@ -0,0 +1,44 @@
+'''Microbenchmark of metering N connections over one day at minute resolution (step of every meter + daily retrieval),
+N SmartMeter models against one SmartMeterFleet model with array inputs, for 100 and 1000 meters.
+Only the model calls are measured, the scheduling overhead of the simulation (one model call less per meter) comes on top.
+Run from the root directory: python -m scenarios.benchmark_smart_meter'''
+import time
+import numpy as np
+import pandas as pd
+
+from models.smart_meter.smart_meter import SmartMeter, SmartMeterFleet
+
+n_steps = 24*60 # one day @ 1 min
+
+
+def run_meters(n_meters, times, P):
+    meters = [SmartMeter(f'sm{i}') for i in range(n_meters)]
+    start = time.perf_counter()
+    for k, t in enumerate(times):
+        for i, meter in enumerate(meters):
+            meter.step(t, P_=[P[k, i]])
+    t_step = time.perf_counter() - start
+    df = pd.concat([meter.retrieve_data() for meter in meters], axis=1)
+    return t_step, time.perf_counter() - start - t_step, df
+
+
+def run_fleet(n_meters, times, P):
+    fleet = SmartMeterFleet('fleet', [f'sm{i}' for i in range(n_meters)])
+    start = time.perf_counter()
+    for k, t in enumerate(times):
+        fleet.step(t, P_=[P[k]])
+    t_step = time.perf_counter() - start
+    df = fleet.retrieve_data()
+    return t_step, time.perf_counter() - start - t_step, df
+
+
+if __name__ == '__main__':
+    times = pd.date_range('2021-01-01', periods=n_steps, freq='1min', tz='Europe/Berlin')
+    for n_meters in [100, 1000]:
+        P = np.random.default_rng(42).normal(0, 1000, (n_steps, n_meters))
+        t_meters, r_meters, df_meters = run_meters(n_meters, times, P)
+        t_fleet, r_fleet, df_fleet = run_fleet(n_meters, times, P)
+        assert np.allclose(df_meters.values, df_fleet.values)
+        print(f'{n_meters:5d} meters | SmartMeter: {n_steps/t_meters:9.0f} steps/s ({t_meters/n_steps/n_meters*1e6:5.2f} us/meter), retrieval {r_meters*1e3:7.1f} ms'
+              f' | SmartMeterFleet: {n_steps/t_fleet:9.0f} steps/s ({t_fleet/n_steps/n_meters*1e6:5.2f} us/meter), retrieval {r_fleet*1e3:7.1f} ms'
+              f' | speedup {t_meters/t_fleet:6.1f}x')
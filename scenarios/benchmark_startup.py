@@ -0,0 +1,37 @@
+'''Benchmark of the startup time of the MPController (add_model of all components and finalize,
+for the MatrixMPController including the assembly of the matrix, MatrixModel.finalize) against the number of components (battery storages) for a 96 period horizon.
+Run from the root directory: python -m scenarios.benchmark_startup'''
+import time
+
+# Controller
+from models.mp_controller.mp_controller import MPController
+from models.mp_controller.matrix_backend import MatrixMPController
+from models.mp_controller.opt_models.battery_storage import BES_MILP_model
+from models.mp_controller.opt_models.energy_community import EC__Residual_Load_MILP_model
+from models.mp_controller.opt_models.objective import Objective
+
+n_periods = 96
+delta_t   = 60*15 # s
+
+
+def startup(n_members, ctr_class=MPController):
+    '''returns the time in s to add all models (add_model) and to build the shared sums (finalize, for the matrix backend
+    the assembly of the constraint matrix that is otherwise done when the model is loaded into HiGHS on the first solve)'''
+    start = time.perf_counter()
+    mp_contr = ctr_class(name='MPC', n_periods=n_periods, delta_t=delta_t)
+    mp_contr.add_model(Objective('objective', objective='self-consumption'))
+    mp_contr.add_model(EC__Residual_Load_MILP_model())
+    for m in range(n_members):
+        mp_contr.add_model(BES_MILP_model(name=f'bes_{m}', E_min=0, E_max=5_000*3600, P_max_cha=1000, P_max_dis=1000, eta_cha=0.9, eta_dis=0.9))
+    t_add = time.perf_counter() - start
+    mp_contr.finalize()
+    if isinstance(mp_contr, MatrixMPController):
+        mp_contr.model.finalize()
+    return t_add, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    for ctr_class in [MPController, MatrixMPController]:
+        for n_members in [10, 50, 100, 200]:
+            t_add, t_total = startup(n_members, ctr_class)
+            print(f'{ctr_class.__name__:<20} {n_members:4d} members: add_model {t_add*1e3:9.1f} ms | total {t_total*1e3:9.1f} ms | per component {t_total/(n_members+2)*1e3:7.2f} ms')
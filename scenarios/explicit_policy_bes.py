@@ -0,0 +1,65 @@
+'''Offline training of an explicit policy for the BES + EC controller and its evaluation on held out days
+(policy evaluation latency and optimality gap against the exact MPC).
+Run from the root directory: python -m scenarios.explicit_policy_bes'''
+import time
+import numpy as np
+
+# Controller
+from models.mp_controller.mp_controller import MPController
+from models.mp_controller.explicit_policy import ExplicitPolicy, sample_problems, solve_offline
+from models.mp_controller.opt_models.battery_storage import BES_MILP_model
+from models.mp_controller.opt_models.energy_community import EC__Residual_Load_MILP_model
+from models.mp_controller.opt_models.objective import Objective
+from models.mp_controller.forcasting import Forcasting
+
+n_periods = 24 # 6 h
+delta_t   = 60*15 # s
+E_max     = 10_000*3600 # J
+
+n_train_days = 20
+n_test_days  = 5
+n_samples    = 4000
+n_test       = 200
+
+
+def make_controller():
+    mp_contr = MPController(name='MPC', n_periods=n_periods, delta_t=delta_t, persistent=True)
+    mp_contr.add_model(Objective('objective', objective='self-consumption'))
+    milp_ec = EC__Residual_Load_MILP_model()
+    mp_contr.add_model(milp_ec)
+    mp_contr.add_forcaster(Forcasting('generic_single_var_persistence', 'P_ec', init_val=0), milp_ec, 'P_resid_ec')
+    mp_contr.add_model(BES_MILP_model(name='bes', E_min=0, E_max=E_max, P_max_cha=2000, P_max_dis=2000, eta_cha=0.9, eta_dis=0.9))
+    return mp_contr
+
+
+def synthetic_days(n_days, seed):
+    '''residual load of the EC in W (day/night pattern with a daily varying pv surplus at noon) @ 15 min'''
+    rng = np.random.default_rng(seed)
+    day = np.linspace(0, 2*np.pi, 96, endpoint=False)
+    return np.concatenate([1500 - rng.uniform(2000, 6000)*np.clip(-np.cos(day), 0, None) + rng.normal(0, 300, 96) for _ in range(n_days)])
+
+
+def window_sampler(profile):
+    '''samples forecasts as random windows of the profile'''
+    def sampler(rng):
+        start = rng.integers(0, len(profile)-n_periods)
+        return {'EC.forecast.P_resid_ec': profile[start:start+n_periods]}
+    return sampler
+
+
+if __name__ == '__main__':
+    train_profile = synthetic_days(n_train_days, seed=1)
+    test_profile  = synthetic_days(n_test_days, seed=2)
+    state_ranges  = {'bes.E_BES_0': (0, E_max)}
+
+    samples = sample_problems(n_samples, state_ranges, window_sampler(train_profile), seed=3)
+    start = time.perf_counter()
+    solutions = solve_offline(make_controller, samples)
+    print(f'offline solves: {n_samples} in {time.perf_counter()-start:.1f} s')
+
+    policy = ExplicitPolicy('policy', make_controller).fit(samples, solutions)
+
+    test_samples = sample_problems(n_test, state_ranges, window_sampler(test_profile), seed=4)
+    report = policy.evaluate(test_samples)
+    print(f'policy latency: mean {report["latency"]["mean"]*1e3:.3f} ms | p95 {report["latency"]["p95"]*1e3:.3f} ms | max {report["latency"]["max"]*1e3:.3f} ms')
+    print(f'optimality gap on held out days: mean {report["gap_mean"]:.1f} | relative {report["gap_relative"]*100:.2f} % | infeasible {report["infeasible"]*100:.1f} %')
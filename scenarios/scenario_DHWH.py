@@ -28,10 +28,16 @@ from models.mp_controller.forcasting import Forcasting
 from models.mp_controller.opt_models.dhwh_dot_m import DHW_MILP_model_Temp
 
 
+# the profile models only load the simulated time range
+# times = pd.date_range('2021-01-01 00:00:00', '2021-01-01 23:59:00', freq='1min', tz='Europe/Berlin')
+# times = pd.date_range('2021-01-01 00:00:00', '2021-12-31 23:59:00', freq='1min', tz='Europe/Berlin')
+#times = pd.date_range('2021-01-01 00:00:00', '2021-01-07 00:00:00', freq='1min', tz='Europe/Berlin')
+times = pd.date_range('2021-07-01 00:00:00', '2021-07-07 00:00:00', freq='1min', tz='Europe/Berlin')
+
 sim = Simulation(output_data_path=f'output/output_{datetime.datetime.now().strftime("%Y%m%d_%H%M")}.csv')
 
 # Weather
-weather    = SynproWeather(name='weather')
+weather    = SynproWeather(name='weather', start=times[0], end=times[-1])
 sim.add_model(weather,    watch_values=['T_amb', 'I_dir', 'I_dif'])
 
 # Grid
@@ -51,7 +57,7 @@ sim.add_model(building,   watch_values=['T_building'])
 sim.connect(weather, building, 'T_amb', 'I_dir', 'I_dif', 'I_s', 'I_w', 'I_n', 'I_e')
 sim.connect_constant(0.0, building, 'dot_Q_cool')
 
-pv = SynproPV('pv', 20_000)  #  TODO: Replace PV model!
+pv = SynproPV('pv', 20_000, start=times[0], end=times[-1])  #  TODO: Replace PV model!
 sim.add_model(pv, watch_values=['P_pv'])
 
 # Heat Pump
@@ -115,7 +121,8 @@ sim.connect_nothing(smartmeter_building, gridoperator)
 ###############
 appartment1 = Household(
     name='appartment_1',
-    lpg_dir='data/loadprofilegenerator/CHR41 Family with 3 children, both at work/Results'
+    lpg_dir='data/loadprofilegenerator/CHR41 Family with 3 children, both at work/Results',
+    start=times[0], end=times[-1]
     )
 sim.add_model(appartment1, 
               watch_values=['P_el', 'dot_m_ww', 'dot_Q_gain_int']
@@ -142,7 +149,8 @@ sim.connect_constant(12, dhwh_appartment1, 'T_i_DHW')
 ###############
 appartment2 = Household(
     name='appartment_2',
-    lpg_dir='data/loadprofilegenerator/CHR41 Family with 3 children, both at work/Results'
+    lpg_dir='data/loadprofilegenerator/CHR41 Family with 3 children, both at work/Results',
+    start=times[0], end=times[-1]
     )
 sim.add_model(appartment2, 
               watch_values=['P_el', 'dot_m_ww', 'dot_Q_gain_int']
@@ -243,10 +251,6 @@ sim.connect(mp_contr, dhwh_appartment1, ('on_of_dhwh1', 'state'), time_shifted=T
 
 # sim.connect(mp_contr, dhwh_appartment2, ('on_of_dhwh2', 'state'), time_shifted=True, init_values={'on_of_dhwh2': 0})
 
-# times = pd.date_range('2021-01-01 00:00:00', '2021-01-01 23:59:00', freq='1min', tz='Europe/Berlin')
-# times = pd.date_range('2021-01-01 00:00:00', '2021-12-31 23:59:00', freq='1min', tz='Europe/Berlin')
-#times = pd.date_range('2021-01-01 00:00:00', '2021-01-07 00:00:00', freq='1min', tz='Europe/Berlin')
-times = pd.date_range('2021-07-01 00:00:00', '2021-07-07 00:00:00', freq='1min', tz='Europe/Berlin')
 # sim.draw_exec_graph()
 
 # sim.run(times)
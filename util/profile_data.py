@@ -0,0 +1,302 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+CACHE_DIR = Path(os.environ.get('FLECS_CACHE_DIR', 'data/.cache')) # binary cache of the parsed input files
+NS_PER    = {'s': 10**9, 'ms': 10**6, 'us': 10**3, 'ns': 1} # ns per unit of a DatetimeIndex
+
+
+def epoch_ns(index:pd.DatetimeIndex) -> np.ndarray:
+    '''the times of the index as int64 epoch in ns (utc for time zone aware indexes), faster than index.as_unit('ns')'''
+    return index.asi8 * NS_PER[index.unit]
+
+
+def read_cached(path, parse:callable, cache_dir=CACHE_DIR, **options) -> pd.DataFrame:
+    '''parse(path, **options) of an input file (a pandas.DataFrame with a DatetimeIndex), cached on disk.
+    The cache is keyed on the path, the modification time and size of the file, the parse function and the options,
+    a changed file or changed options are parsed again. Every column is stored as .npy file (memory-mapped on load),
+    the index as int64 epoch (ns, utc) with its time zone. Frames with non-numeric columns are not cached.
+
+    Parameters
+    ----------
+    path : str or Path, input file
+    parse : callable, module level function that parses the file
+    cache_dir : str or Path, directory of the cache (None: no caching)
+    options : keyword arguments of parse (need a stable repr, e.g. numbers and strings)'''
+    if cache_dir is None:
+        return parse(path, **options)
+    ns, meta, columns = _read_columns(_key(path, parse, options), path, parse, cache_dir, options)
+    return pd.DataFrame(columns, index=_index(ns, meta))
+
+
+def _read_columns(key, path, parse, cache_dir, options):
+    '''(index as epoch ns, meta data of the index, dict of the column arrays) of the cache entry key, the file is parsed and stored on a miss'''
+    entry = None if cache_dir is None else Path(cache_dir).joinpath(key)
+    if entry is not None and entry.is_dir():
+        return _load(entry)
+    df = parse(path, **options)
+    if entry is not None:
+        _store(entry, df)
+        if entry.is_dir():
+            return _load(entry) # memory-mapped, the parsed frame is released
+    meta = {'index_name': df.index.name, 'unit': df.index.unit, 'tz': df.index.tz}
+    return epoch_ns(df.index), meta, {name: df[name].to_numpy() for name in df.columns}
+
+
+def _key(path, parse, options) -> str:
+    stat = os.stat(path)
+    h = hashlib.blake2b(digest_size=16)
+    for part in [os.path.abspath(path), stat.st_mtime_ns, stat.st_size, parse.__module__, parse.__qualname__, sorted(options.items())]:
+        h.update(repr(part).encode())
+    return f'{Path(path).stem}.{h.hexdigest()}'
+
+
+def _store(entry:Path, df:pd.DataFrame) -> None:
+    '''writes the frame into a temporary directory that is renamed to entry (concurrent runs write the same entry)'''
+    if not isinstance(df.index, pd.DatetimeIndex) or any(dtype.kind not in 'biuf' for dtype in df.dtypes):
+        return
+    entry.parent.mkdir(parents=True, exist_ok=True)
+    tmp = Path(tempfile.mkdtemp(dir=entry.parent))
+    try:
+        np.save(tmp.joinpath('index.npy'), epoch_ns(df.index))
+        for i, column in enumerate(df.columns):
+            np.save(tmp.joinpath(f'{i}.npy'), np.ascontiguousarray(df[column].values))
+        meta = {'columns': list(df.columns), 'index_name': df.index.name, 'unit': df.index.unit, 'tz': None if df.index.tz is None else str(df.index.tz)}
+        tmp.joinpath('meta.json').write_text(json.dumps(meta))
+        os.rename(tmp, entry)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True) # written by another process in the meantime
+
+
+def _load(entry:Path):
+    meta = json.loads(entry.joinpath('meta.json').read_text())
+    return np.load(entry.joinpath('index.npy'), mmap_mode='r'), meta, {name: np.load(entry.joinpath(f'{i}.npy'), mmap_mode='r') for i, name in enumerate(meta['columns'])}
+
+
+def _index(ns, meta) -> pd.DatetimeIndex:
+    '''DatetimeIndex of the epoch ns in the unit and time zone of meta'''
+    index = pd.DatetimeIndex((np.asarray(ns) // NS_PER[meta['unit']]).astype(f'datetime64[{meta["unit"]}]'), name=meta['index_name'])
+    return index.tz_localize('utc').tz_convert(meta['tz']) if meta['tz'] is not None else index
+
+
+class Profile():
+    def __init__(self, ns, meta:dict, columns:dict):
+        '''the columns of a parsed input file as read-only arrays, shared by all models that use the file (see ProfileRegistry).
+        The index is only built for the rows that are requested (see frame)
+
+        Parameters
+        ----------
+        ns : np.ndarray, int64, time of the rows as epoch in ns (utc for time zone aware profiles)
+        meta : dict, index_name, unit and tz of the index
+        columns : dict, name: np.ndarray'''
+        self._ns      = ns
+        self._meta    = meta
+        self._indexes = {} # (first, last row): pd.DatetimeIndex, shared by the frames of the same rows
+        self.columns  = {}
+        for name, values in columns.items():
+            values = values if isinstance(values, np.memmap) else np.ascontiguousarray(values)
+            values = values.view()
+            values.flags.writeable = False
+            self.columns[name] = values
+
+    def __getitem__(self, name) -> np.ndarray:
+        return self.columns[name]
+
+    @property
+    def index(self) -> pd.DatetimeIndex:
+        return self._rows_index(slice(0, len(self._ns)))
+
+    def _rows_index(self, rows:slice) -> pd.DatetimeIndex:
+        if (rows.start, rows.stop) not in self._indexes:
+            self._indexes[rows.start, rows.stop] = _index(self._ns[rows], self._meta)
+        return self._indexes[rows.start, rows.stop]
+
+    @property
+    def nbytes(self) -> int:
+        return self._ns.nbytes + sum(values.nbytes for values in self.columns.values())
+
+    def _value(self, time) -> int:
+        return _time_ns(time, self._meta['tz'])
+
+    def rows(self, start=None, end=None, margin=0) -> slice:
+        '''rows from start - margin to end + margin (margin in s, None: from the first / to the last row)'''
+        first = 0 if start is None else int(np.searchsorted(self._ns, self._value(start) - margin*10**9, side='left'))
+        last  = len(self._ns) if end is None else int(np.searchsorted(self._ns, self._value(end) + margin*10**9, side='right'))
+        return slice(first, last)
+
+    def frame(self, columns=None, start=None, end=None, margin=0) -> pd.DataFrame:
+        '''the columns (None: all) from start - margin to end + margin (see rows) as pandas.DataFrame, without copying the data.
+        Only the pages of the memory-mapped columns and rows that are used are read from the cache'''
+        columns = list(self.columns) if columns is None else columns
+        rows = self.rows(start, end, margin)
+        return pd.DataFrame({name: self.columns[name][rows] for name in columns}, index=self._rows_index(rows), copy=False)
+
+
+class ProfileRegistry():
+    def __init__(self):
+        '''Process-wide registry of the parsed input files (use the module level REGISTRY or load_profile).
+        Every file is loaded once per parse function and options (from the cache of read_cached if possible),
+        all models that use it get the same Profile with read-only arrays.'''
+        self._profiles = {} # key: Profile
+        self.loads     = 0
+        self.hits      = 0
+
+    def load(self, path, parse:callable, cache_dir=CACHE_DIR, **options) -> Profile:
+        '''the Profile of parse(path, **options), see read_cached for the arguments'''
+        key = _key(path, parse, options)
+        if key in self._profiles:
+            self.hits += 1
+        else:
+            ns, meta, columns = _read_columns(key, path, parse, cache_dir, options)
+            self._profiles[key] = Profile(ns, meta, columns)
+            self.loads += 1
+        return self._profiles[key]
+
+    def clear(self) -> None:
+        self._profiles.clear()
+
+    def statistics(self) -> dict:
+        return {
+            'profiles': len(self._profiles),
+            'loads': self.loads,
+            'hits': self.hits,
+            'nbytes': sum(profile.nbytes for profile in self._profiles.values()),
+            }
+
+
+REGISTRY = ProfileRegistry()
+
+
+def load_profile(path, parse:callable, cache_dir=CACHE_DIR, **options) -> Profile:
+    '''the Profile of parse(path, **options) from the process-wide registry, see read_cached for the arguments'''
+    return REGISTRY.load(path, parse, cache_dir, **options)
+
+
+class ProfileCursor():
+    def __init__(self, df:pd.DataFrame):
+        '''Row lookup of the step function of a profile model (replaces df.loc[time].to_dict()).
+        The columns are held as contiguous arrays, the row of a time is the row after the last step (cursor),
+        or for a regular index computed from the time (otherwise searched), and checked against the index in O(1).
+
+        Parameters
+        ----------
+        df : pd.DataFrame with a DatetimeIndex, the profile of the model'''
+        self.names   = list(df.columns)
+        self.columns = [np.ascontiguousarray(df[name].to_numpy()).view(np.ndarray) for name in self.names] # plain arrays, np.memmap adds overhead to every access
+        self._ns     = epoch_ns(pd.DatetimeIndex(df.index))
+        steps        = np.diff(self._ns)
+        self._step   = int(steps[0]) if len(steps) and np.all(steps == steps[0]) else None # ns, regular index
+        self._next   = 0
+
+    def row(self, time) -> int:
+        '''row of the time, KeyError if the time is not in the index'''
+        ns = time.value if isinstance(time, pd.Timestamp) else pd.Timestamp(time).value
+        row = self._next
+        if row >= len(self._ns) or self._ns[row] != ns:
+            if self._step is not None:
+                row = (ns - int(self._ns[0])) // self._step
+            else:
+                row = int(np.searchsorted(self._ns, ns))
+            if not 0 <= row < len(self._ns) or self._ns[row] != ns:
+                raise KeyError(time)
+        self._next = row + 1
+        return row
+
+    def step(self, time) -> dict:
+        '''the values of all columns at time'''
+        row = self.row(time)
+        return {name: values.item(row) for name, values in zip(self.names, self.columns)}
+
+
+def _time_ns(time, tz) -> int:
+    '''epoch ns of a time, naive times are in the time zone tz'''
+    time = pd.Timestamp(time)
+    if time.tz is None and tz is not None:
+        time = time.tz_localize(tz)
+    return time.value
+
+
+def _read_window(read:callable, header:int, start=None, end=None, margin=0) -> pd.DataFrame:
+    '''the rows from start - margin to end + margin of a csv file with a regular time step.
+    The rows are located from the time step of the first two rows, the rows before the window are skipped
+    without parsing (skiprows) and the parser stops after the window (nrows).
+    If the parsed index is not regular, the whole file is parsed and the window is selected from it.
+
+    Parameters
+    ----------
+    read : callable, read(**kwargs) parses the file with pandas.read_csv(..., **kwargs) into the final frame (time zone aware index)
+    header : int, line of the column names (the data starts in the next line)
+    start, end : time (str or pd.Timestamp), naive times are in the time zone of the index (None: from the beginning / to the end)
+    margin : int, s, rows before start and after end'''
+    if start is None and end is None:
+        return read()
+    head = read(nrows=2).index
+    tz   = head.tz
+    head = epoch_ns(head)
+    lo   = None if start is None else _time_ns(start, tz) - margin*10**9
+    hi   = None if end is None else _time_ns(end, tz) + margin*10**9
+    df   = None
+    if len(head) == 2 and head[1] > head[0]:
+        t0, step = int(head[0]), int(head[1] - head[0])
+        first    = 0 if lo is None else max(0, -((t0 - lo) // step)) # first row at or after lo
+        kwargs   = {'skiprows': range(header + 1, header + 1 + first)}
+        if hi is not None:
+            kwargs['nrows'] = max(0, (hi - t0) // step + 1 - first)
+        df = read(**kwargs)
+        ns = epoch_ns(df.index)
+        if len(ns) and (ns[0] != t0 + first*step or np.any(np.diff(ns) != step)):
+            df = None
+    df = read() if df is None else df
+    ns = epoch_ns(df.index)
+    return df.iloc[np.searchsorted(ns, lo) if lo is not None else 0:np.searchsorted(ns, hi, side='right') if hi is not None else len(ns)]
+
+
+def read_synpro(path, header:int, years=0, columns=None, start=None, end=None, margin=0) -> pd.DataFrame:
+    '''a synPRO profile (.dat), indexed by local time (Europe/Berlin), the date and time columns are dropped.
+    Only the columns and the rows of the time window are parsed, they are part of the cache key (see read_cached, load_profile)
+
+    Parameters
+    ----------
+    path : str or Path, .dat file
+    header : int, line of the column names
+    years : int, the profile is shifted by years (e.g. to simulate 2021 with a 2017 profile)
+    columns : list of str, parsed columns (None: all)
+    start, end, margin : time window of the shifted profile, see _read_window (None: the whole profile)'''
+    names = pd.read_csv(Path(path), header=header, sep=';', nrows=0).columns
+    usecols = None if columns is None else [names[2]] + list(columns)
+
+    def read(**kwargs):
+        df = pd.read_csv(Path(path), header=header, sep=';', index_col=names[2], usecols=usecols, **kwargs)
+        df = df.drop(['YYYYMMDD', 'hhmmss'], axis=1, errors='ignore')
+        index = pd.to_datetime(df.index, unit='s')
+        if years:
+            index = index.shift(periods=years, freq=pd.DateOffset(years=1))
+        df.index = index.tz_localize('utc').tz_convert('Europe/Berlin')
+        return df
+    return _read_window(read, header, start, end, margin)
+
+
+def read_lpg(path, name=None, scale=1., start=None, end=None, margin=0) -> pd.DataFrame:
+    '''a LoadProfileGenerator sum profile (.csv), indexed by local time (Europe/Berlin), the timestep column is dropped.
+    Only the rows of the time window are parsed, it is part of the cache key (see read_cached, load_profile)
+
+    Parameters
+    ----------
+    path : str or Path, .csv file
+    name : str, new name of the sum column (None: keep the name)
+    scale : float, factor of the sum column (e.g. unit conversion)
+    start, end, margin : time window, see _read_window (None: the whole profile)'''
+    def read(**kwargs):
+        df = pd.read_csv(Path(path), sep=';', header=0, index_col=1, **kwargs)
+        df = df.drop([column for column in df.columns if column.endswith('.Timestep')], axis=1)
+        df.index = pd.to_datetime(df.index, format="%d.%m.%Y %H:%M").tz_localize(tz='Etc/GMT-1').tz_convert('Europe/Berlin')
+        return df
+    df = _read_window(read, 0, start, end, margin)
+    if name is not None:
+        df = df.rename({df.columns[0]: name}, axis=1)
+    return df*scale if scale != 1. else df
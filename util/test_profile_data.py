@@ -0,0 +1,163 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import util.profile_data
+from util.profile_data import read_cached, read_synpro, read_lpg, ProfileRegistry, ProfileCursor
+from models.demand.loadprofilegenerator import Household
+
+
+def write_synpro(path, n=120, header=3):
+    '''a synPRO like .dat file with n minutes'''
+    times = pd.date_range('2017-01-01', periods=n, freq='1min', tz='utc')
+    lines = ['# synPRO'] * header + ['YYYYMMDD;hhmmss;unixtimestamp;P_el;t_amb']
+    lines += [f'{t:%Y%m%d};{t:%H%M%S};{t.value // 10**9};{i*1.5};{i % 7}' for i, t in enumerate(times)]
+    path.write_text('\n'.join(lines))
+
+
+def test_read_cached_hit(tmp_path):
+    path = tmp_path.joinpath('profile.dat')
+    write_synpro(path)
+    cache_dir = tmp_path.joinpath('cache')
+
+    parsed = read_synpro(path, header=3, years=4)
+    first  = read_cached(path, read_synpro, cache_dir=cache_dir, header=3, years=4)
+    second = read_cached(path, read_synpro, cache_dir=cache_dir, header=3, years=4)
+    assert len(os.listdir(cache_dir)) == 1
+    pd.testing.assert_frame_equal(first, parsed)
+    pd.testing.assert_frame_equal(second, parsed)
+    assert second.index[0] == pd.Timestamp('2021-01-01 01:00', tz='Europe/Berlin')
+
+    # other options are a new entry
+    read_cached(path, read_synpro, cache_dir=cache_dir, header=3)
+    assert len(os.listdir(cache_dir)) == 2
+
+
+def test_read_cached_changed_file(tmp_path):
+    path = tmp_path.joinpath('profile.dat')
+    write_synpro(path)
+    cache_dir = tmp_path.joinpath('cache')
+    read_cached(path, read_synpro, cache_dir=cache_dir, header=3)
+
+    write_synpro(path, n=60)
+    os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 10**9))
+    assert len(read_cached(path, read_synpro, cache_dir=cache_dir, header=3)) == 60
+
+
+def write_lpg(lpg_dir, kind='Electricity', unit='kWh'):
+    times = pd.date_range('2021-01-01', periods=8, freq='15min')
+    path = lpg_dir.joinpath(f'SumProfiles_900s.{kind}.csv')
+    path.write_text('\n'.join([f'{kind}.Timestep;Time;Sum [{unit}]'] + [f'{i};{t:%d.%m.%Y %H:%M};{i*0.1}' for i, t in enumerate(times)]))
+    return path
+
+
+def test_read_cached_lpg(tmp_path):
+    path = write_lpg(tmp_path)
+
+    df = read_cached(path, read_lpg, cache_dir=tmp_path.joinpath('cache'))
+    df = read_cached(path, read_lpg, cache_dir=tmp_path.joinpath('cache'))
+    assert df.columns.tolist() == ['Sum [kWh]']
+    assert np.allclose(df['Sum [kWh]'].values, np.arange(8)*0.1)
+    assert str(df.index.tz) == 'Europe/Berlin'
+
+
+def test_registry_shares_profiles(tmp_path):
+    path = tmp_path.joinpath('profile.dat')
+    write_synpro(path)
+    registry = ProfileRegistry()
+
+    first  = registry.load(path, read_synpro, cache_dir=tmp_path.joinpath('cache'), header=3)
+    second = registry.load(path, read_synpro, cache_dir=tmp_path.joinpath('cache'), header=3)
+    assert first is second
+    assert registry.statistics()['loads'] == 1 and registry.statistics()['hits'] == 1
+    with pytest.raises(ValueError):
+        first['P_el'][0] = 1. # read-only
+
+    df = first.frame(['P_el'])
+    assert np.shares_memory(df['P_el'].values, first['P_el'])
+    assert np.allclose(df['P_el'].values, np.arange(120)*1.5)
+
+    # a new registry loads the cached entry
+    cached = ProfileRegistry().load(path, read_synpro, cache_dir=tmp_path.joinpath('cache'), header=3)
+    assert cached is not first
+    assert np.array_equal(cached['P_el'], first['P_el'])
+    assert cached.index.equals(first.index)
+
+
+def test_households_share_profiles(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path) # the default cache directory is relative
+    monkeypatch.setattr(util.profile_data, 'REGISTRY', ProfileRegistry())
+    lpg_dir = tmp_path.joinpath('lpg')
+    lpg_dir.mkdir()
+    for kind, unit in [('Electricity', 'kWh'), ('Warm Water', 'L'), ('Inner Device Heat Gains', 'kWh')]:
+        write_lpg(lpg_dir, kind, unit)
+
+    household1, household2 = Household('h1', lpg_dir), Household('h2', lpg_dir)
+    assert util.profile_data.REGISTRY.statistics()['profiles'] == 3
+    assert household1.outputs == ['P_el', 'dot_m_ww', 'dot_Q_gain_int']
+    assert np.shares_memory(household1.df['P_el'].values, household2.df['P_el'].values)
+    assert np.allclose(household1.df['P_el'].values, np.arange(8)*0.1/0.25*1000)
+    assert np.allclose(household1.df['dot_m_ww'].values, np.arange(8)*0.1/900)
+    assert household1.step(pd.Timestamp('2021-01-01 00:15', tz='Etc/GMT-1')) == household1.df.iloc[1].to_dict()
+
+
+@pytest.mark.parametrize('index', [
+    pd.date_range('2021-03-28 00:00', periods=300, freq='1min', tz='Europe/Berlin'), # regular, over the change to daylight saving time
+    pd.DatetimeIndex(['2021-01-01 00:00', '2021-01-01 00:01', '2021-01-01 00:05', '2021-01-01 00:06']).tz_localize('Europe/Berlin'), # irregular
+    ])
+def test_profile_cursor_matches_loc(index):
+    df = pd.DataFrame({'a': np.arange(len(index), dtype=float), 'b': np.arange(len(index))*2.}, index=index)
+    cursor = ProfileCursor(df)
+    for row in list(range(len(index))) + [2, 0, len(index)-1]: # in order, then jumps
+        assert cursor.step(index[row]) == df.loc[index[row]].to_dict()
+
+    with pytest.raises(KeyError):
+        cursor.step(index[0] - pd.Timedelta(60, 's'))
+    with pytest.raises(KeyError):
+        cursor.step(index[1] + pd.Timedelta(1, 's')) # not on the grid
+
+
+def test_profile_window(tmp_path):
+    path = tmp_path.joinpath('profile.dat')
+    write_synpro(path)
+    profile = ProfileRegistry().load(path, read_synpro, cache_dir=tmp_path.joinpath('cache'), header=3)
+    index = profile.index
+
+    df = profile.frame(['P_el'], start='2017-01-01 01:30', end=index[40], margin=5*60) # naive start in the time zone of the profile
+    assert df.columns.tolist() == ['P_el']
+    assert df.index[0] == index[25] and df.index[-1] == index[45]
+    assert np.shares_memory(df['P_el'].values, profile['P_el'])
+
+    assert profile.rows(end=index[-1] + pd.Timedelta(1, 'day')) == slice(0, len(index))
+    assert len(profile.frame(start=index[-1] + pd.Timedelta(1, 'day'))) == 0
+
+
+def test_household_window(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(util.profile_data, 'REGISTRY', ProfileRegistry())
+    for kind, unit in [('Electricity', 'kWh'), ('Warm Water', 'L'), ('Inner Device Heat Gains', 'kWh')]:
+        write_lpg(tmp_path, kind, unit)
+
+    household = Household('h1', tmp_path, start='2021-01-01 00:30', end='2021-01-01 00:45', margin=0)
+    assert len(household.df) == 2
+    assert household.step(pd.Timestamp('2021-01-01 00:45', tz='Europe/Berlin'))['P_el'] == household.df['P_el'].iloc[1]
+
+
+def test_read_window(tmp_path):
+    path = tmp_path.joinpath('profile.dat')
+    write_synpro(path)
+    cache_dir = tmp_path.joinpath('cache')
+    full = read_synpro(path, header=3, years=4)
+
+    window = dict(columns=['P_el'], start='2021-01-01 01:30', end=full.index[40], margin=5*60) # naive start in the time zone of the profile
+    df = read_cached(path, read_synpro, cache_dir=cache_dir, header=3, years=4, **window)
+    pd.testing.assert_frame_equal(df, full[['P_el']].iloc[25:46])
+    assert len(read_cached(path, read_synpro, cache_dir=cache_dir, header=3, years=4, **dict(window, margin=0))) == 11
+    assert len(os.listdir(cache_dir)) == 2 # the window is part of the key
+
+    # irregular rows are parsed completely and the window is selected
+    lines = path.read_text().split('\n')
+    path.write_text('\n'.join(lines[:10] + lines[12:]))
+    irregular = read_synpro(path, header=3)
+    df = read_synpro(path, header=3, start=irregular.index[8], end=irregular.index[20])
+    pd.testing.assert_frame_equal(df, irregular.iloc[8:21])